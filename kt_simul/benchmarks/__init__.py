@@ -0,0 +1,15 @@
+"""
+Benchmarks of the simulation
+
+Run the whole suite with::
+
+    python -m kt_simul.benchmarks -o results.json
+
+The accuracy of the integrators versus the time step is checked with::
+
+    python -m kt_simul.benchmarks.convergence
+
+and the reduced model against the full model with::
+
+    python -m kt_simul.benchmarks.reduced_model
+"""
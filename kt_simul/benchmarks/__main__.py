@@ -0,0 +1,72 @@
+"""
+Runs the benchmark suite::
+
+    python -m kt_simul.benchmarks -o results.json
+    python -m kt_simul.benchmarks --quick --only one_step pool
+    python -m kt_simul.benchmarks -o new.json --compare old.json
+"""
+
+from __future__ import unicode_literals
+from __future__ import division
+from __future__ import absolute_import
+from __future__ import print_function
+
+import sys
+import argparse
+
+from kt_simul.benchmarks import suite
+
+
+def main(argv=None):
+
+    parser = argparse.ArgumentParser(
+        prog="python -m kt_simul.benchmarks",
+        description="Benchmarks of the simulation core, I/O and pools")
+    parser.add_argument('-o', '--output',
+                        help="Save the results to this JSON file")
+    parser.add_argument('--quick', action='store_true',
+                        help="Smaller problem sizes")
+    parser.add_argument('--only', nargs='+', metavar='NAME',
+                        help="Only run those benchmarks (%s)" %
+                        ", ".join(b.__name__[len('bench_'):]
+                                  for b in suite.BENCHMARKS))
+    parser.add_argument('--compare', metavar='OLD',
+                        help="Compare with previous results")
+    parser.add_argument('--threshold', type=float, default=0.1,
+                        help="Relative change reported as a regression")
+    args = parser.parse_args(argv)
+
+    results = suite.run(names=args.only, quick=args.quick)
+
+    for r in results['results']:
+        params = ", ".join("%s=%s" % item
+                           for item in sorted(r['params'].items()))
+        print("%-18s %-40s %12.4g %s" % (r['name'], params,
+                                         r['value'], r['unit']))
+    for name, error in results['errors'].items():
+        print("%-18s failed: %s" % (name, error))
+
+    if any(r['name'] == 'one_step' for r in results['results']):
+        print()
+        print(suite.scaling_report(results))
+
+    if args.output:
+        suite.save(results, args.output)
+
+    if args.compare:
+        comparison = suite.compare(suite.load(args.compare), results,
+                                   threshold=args.threshold)
+        print()
+        for c in comparison:
+            params = ", ".join("%s=%s" % item
+                               for item in sorted(c['params'].items()))
+            print("%-18s %-40s %+7.1f%% %s" % (c['name'], params,
+                                               100 * c['change'],
+                                               c['status']))
+        if any(c['status'] == 'regression' for c in comparison):
+            return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
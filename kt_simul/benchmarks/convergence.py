@@ -0,0 +1,209 @@
+"""
+Convergence of the simulation statistics with the time step.
+
+Run it with::
+
+    python -m kt_simul.benchmarks.convergence
+
+For each integrator (see
+:class:`~kt_simul.core.spindle_dynamics.KinetoDynamics`) and time step,
+a set of seeded simulations is run and the mean anaphase delay and
+metaphase kinetochore pair distance are compared to the ones of the
+smallest time step with the explicit integrator.
+
+:func:`trajectory_convergence` checks the integration error itself: with
+no attachment changes, the simulation is deterministic and its spindle
+length converges to the one of a small reference time step linearly with
+`dt`, for both integrators.
+
+With the default parameters, the explicit integrator is close to its
+stability limit at the default time step of 10 s: the spindle length of
+a deterministic run is off by 0.2 micron after 40 s, thirty times more
+than with the implicit integrator, and the statistics drift further with the reduced parameters (see
+:func:`~kt_simul.core.parameters.reduce_params`). Use a smaller `dt` or
+``integrator='implicit'`` when accuracy matters; the default is kept so
+that existing results are unchanged.
+"""
+
+from __future__ import unicode_literals
+from __future__ import division
+from __future__ import absolute_import
+from __future__ import print_function
+
+import numpy as np
+
+from kt_simul.io.xml_handler import ParamTree
+from kt_simul.core.simul_spindle import Metaphase
+from kt_simul.core.spindle_dynamics import INTEGRATORS
+from kt_simul.core import parameters
+
+__all__ = ["dt_convergence", "max_dt", "trajectory_convergence"]
+
+
+def _statistics(integrator, dt, n_simu, span, t_A, seed):
+    delays = []
+    distances = []
+    for i in range(n_simu):
+        paramtree = ParamTree(parameters.PARAMFILE)
+        paramtree.update(dt=dt, span=span, t_A=t_A)
+        meta = Metaphase(paramtree=paramtree, seed=seed + i,
+                         integrator=integrator)
+        meta.simul()
+        metaphase = meta.timelapse < t_A
+        distance = np.mean([np.abs(ch.cen_A.traj - ch.cen_B.traj)[metaphase]
+                            for ch in meta.KD.chromosomes])
+        delays.append(meta.delay)
+        distances.append(distance)
+    return np.array(delays), np.array(distances)
+
+
+def _sem(values):
+    if len(values) < 2:
+        return 0.
+    return values.std(ddof=1) / np.sqrt(len(values))
+
+
+def dt_convergence(dts=(0.5, 1, 2, 5, 10, 20), integrators=INTEGRATORS,
+                   n_simu=10, span=1000., t_A=750., seed=0,
+                   delay_tolerance=10., distance_tolerance=0.1):
+    """
+    Runs `n_simu` simulations for each integrator and time step.
+
+    The reference is the smallest time step with the explicit integrator.
+    A statistic is within tolerance when its difference to the reference
+    is smaller than the tolerance plus twice the standard error of the
+    difference, the simulations being stochastic.
+
+    Parameters
+    ----------
+    dts : list of float
+        Time steps, in seconds
+    integrators : list of str
+    n_simu : int
+        Simulations per integrator and time step, with seeds `seed` to
+        `seed + n_simu - 1`
+    span, t_A : float
+        Duration of the simulations and anaphase onset, in seconds
+    delay_tolerance : float
+        Absolute tolerance on the mean anaphase delay, in seconds
+    distance_tolerance : float
+        Relative tolerance on the mean metaphase kinetochore pair distance
+
+    Returns
+    -------
+    list of dict
+        One record per integrator and time step, with the mean `delay`
+        and kinetochore pair `distance`, their standard errors, their
+        differences to the reference and a `converged` flag.
+    """
+    dts = sorted(dts)
+    ref_delays, ref_distances = _statistics('euler', dts[0], n_simu,
+                                            span, t_A, seed)
+    ref_delay = ref_delays.mean()
+    ref_distance = ref_distances.mean()
+
+    records = []
+    for integrator in integrators:
+        for dt in dts:
+            if integrator == 'euler' and dt == dts[0]:
+                delays, distances = ref_delays, ref_distances
+            else:
+                delays, distances = _statistics(integrator, dt, n_simu,
+                                                span, t_A, seed)
+            delay_error = delays.mean() - ref_delay
+            distance_error = distances.mean() - ref_distance
+            delay_noise = 2 * np.hypot(_sem(delays), _sem(ref_delays))
+            distance_noise = 2 * np.hypot(_sem(distances),
+                                          _sem(ref_distances))
+            converged = (
+                np.isfinite(distances).all() and
+                abs(delay_error) <= delay_tolerance + delay_noise and
+                abs(distance_error) <= (distance_tolerance * ref_distance +
+                                        distance_noise))
+            records.append({'integrator': integrator,
+                            'dt': dt,
+                            'delay': delays.mean(),
+                            'delay_sem': _sem(delays),
+                            'delay_error': delay_error,
+                            'distance': distances.mean(),
+                            'distance_sem': _sem(distances),
+                            'distance_error': distance_error / ref_distance,
+                            'converged': bool(converged)})
+    return records
+
+
+def max_dt(records, integrator):
+    """
+    Returns the largest time step up to which all the statistics of
+    `integrator` are within tolerance, None if even the smallest is not.
+    """
+    best = None
+    for record in sorted(records, key=lambda r: r['dt']):
+        if record['integrator'] != integrator:
+            continue
+        if not record['converged']:
+            break
+        best = record['dt']
+    return best
+
+
+def _spindle_length(integrator, dt, times, span):
+    paramtree = ParamTree(parameters.PARAMFILE)
+    paramtree.update(dt=dt, span=span, t_A=2 * span, k_a=0)
+    meta = Metaphase(paramtree=paramtree, seed=0, initial_plug='amphitelic',
+                     integrator=integrator, reduce_p=False, verbose=False)
+    meta.simul()
+    traj = meta.KD.spbR.traj - meta.KD.spbL.traj
+    return np.array([traj[int(round(t / dt))] for t in times])
+
+
+def trajectory_convergence(dts=(0.5, 1, 2, 5, 10), integrator='euler',
+                           ref_dt=1 / 64., times=(10., 20., 40.), span=50.):
+    """
+    Returns the integration error of the spindle length for each time step.
+
+    The simulations have no attachment rate (`k_a` = 0) and start with
+    amphitelic attachments, so they are deterministic, and the error is
+    the largest difference to the run with time step `ref_dt` at `times`.
+    Past about 90 s the spindle length turns back, at a time which
+    depends on `dt`, so `span` should stay below that.
+
+    Parameters
+    ----------
+    dts : list of float
+        Time steps, in seconds, dividing the `times`
+    integrator : {'euler', 'implicit'}
+    ref_dt : float
+        Time step of the reference run
+    times : list of float
+        Times at which the spindle lengths are compared, in seconds
+    span : float
+        Duration of the simulations, in seconds
+
+    Returns
+    -------
+    errors : np.ndarray
+        The errors, in microns, in the order of `dts`
+    """
+    ref = _spindle_length(integrator, ref_dt, times, span)
+    return np.array([np.abs(_spindle_length(integrator, dt, times, span) -
+                            ref).max() for dt in dts])
+
+
+if __name__ == '__main__':
+
+    records = dt_convergence()
+    print("%10s %6s %12s %12s %10s" % ('integrator', 'dt', 'delay (s)',
+                                        'kt dist', 'converged'))
+    for r in records:
+        print("%10s %6.1f %6.1f+-%-5.1f %6.3f+-%-5.3f %10s" %
+              (r['integrator'], r['dt'], r['delay'], r['delay_sem'],
+               r['distance'], r['distance_sem'], r['converged']))
+    for integrator in sorted(set(r['integrator'] for r in records)):
+        print("Largest time step for %s: %s s" %
+              (integrator, max_dt(records, integrator)))
+    dts = (0.5, 1, 2, 5, 10)
+    print("Spindle length error (microns) for dt = %s s" % (dts, ))
+    for integrator in INTEGRATORS:
+        print("%10s %s" % (integrator,
+                           trajectory_convergence(dts, integrator)))
@@ -0,0 +1,66 @@
+"""
+Import time benchmark. Each module is imported in a fresh interpreter so
+the measures include everything a worker process or a command line
+invocation pays at startup.
+
+Run it with::
+
+    python -m kt_simul.benchmarks.imports
+"""
+
+from __future__ import unicode_literals
+from __future__ import division
+from __future__ import absolute_import
+from __future__ import print_function
+
+import os
+import sys
+import subprocess
+
+__all__ = ["import_time", "MODULES"]
+
+MODULES = ["kt_simul",
+           "kt_simul.io.xml_handler",
+           "kt_simul.core.parameters",
+           "kt_simul.core.simul_spindle",
+           "kt_simul.io.simuio",
+           "kt_simul.pool"]
+
+_SCRIPT = """
+import time
+start = time.time()
+import %s
+elapsed = time.time() - start
+import sys
+heavy = [name for name in ('pandas', 'tables', 'matplotlib', 'PyQt4',
+                           'pyximport') if name in sys.modules]
+print(elapsed)
+print(' '.join(heavy))
+"""
+
+
+def import_time(module, repeat=3):
+    """
+    Returns the best wall time (in seconds) of `import module` in a fresh
+    interpreter and the list of heavy optional dependencies it loaded.
+    """
+    best = None
+    heavy = []
+    for _ in range(repeat):
+        with open(os.devnull, 'w') as devnull:
+            out = subprocess.check_output([sys.executable, "-c",
+                                           _SCRIPT % module],
+                                          stderr=devnull)
+        lines = out.decode('utf-8').splitlines()
+        elapsed = float(lines[-2])
+        heavy = lines[-1].split()
+        if best is None or elapsed < best:
+            best = elapsed
+    return best, heavy
+
+
+if __name__ == '__main__':
+
+    for module in MODULES:
+        elapsed, heavy = import_time(module)
+        print("%-30s %8.1f ms  %s" % (module, elapsed * 1e3, ' '.join(heavy)))
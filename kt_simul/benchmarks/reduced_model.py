@@ -0,0 +1,167 @@
+"""
+Validation of the reduced model against the full model.
+
+Run it with::
+
+    python -m kt_simul.benchmarks.reduced_model
+
+The same seeded simulations are run with the full model and with the
+reduced model (see :mod:`~kt_simul.core.reduced_dynamics`), and their
+summary statistics are compared, to check that the reduced model can be
+used for a screening sweep before running it.
+"""
+
+from __future__ import unicode_literals
+from __future__ import division
+from __future__ import absolute_import
+from __future__ import print_function
+
+import time
+
+import numpy as np
+
+from kt_simul.io.xml_handler import ParamTree
+from kt_simul.core.simul_spindle import Metaphase
+from kt_simul.core import parameters
+from kt_simul.core.reduced_dynamics import ReducedModelBreakdown
+
+__all__ = ["validate_reduced", "STATISTICS"]
+
+# Metaphase means of each simulation, and the spindle length at the end
+STATISTICS = ('delay', 'kt_distance', 'spindle_length', 'attached',
+              'correct', 'erroneous', 'final_length')
+
+
+def _summary(meta):
+    KD = meta.KD
+    Mk = KD.params.Mk
+    metaphase = meta.timelapse < KD.params.t_A
+    if not metaphase.any():
+        metaphase[:] = True
+    chromosomes = KD.chromosomes
+    attached = np.mean([plugsite.state_hist[metaphase] != 0
+                        for plugsite in KD.all_plugsites])
+    correct = np.mean([ch.correct_history[metaphase].sum(axis=1)
+                       for ch in chromosomes]) / (2 * Mk)
+    erroneous = np.mean([ch.erroneous_history[metaphase].sum(axis=1)
+                         for ch in chromosomes]) / (2 * Mk)
+    return {'delay': meta.delay,
+            'kt_distance': np.mean([np.abs(ch.cen_A.traj -
+                                           ch.cen_B.traj)[metaphase]
+                                    for ch in chromosomes]),
+            'spindle_length': np.mean((KD.spbR.traj -
+                                       KD.spbL.traj)[metaphase]),
+            'attached': attached,
+            'correct': correct,
+            'erroneous': erroneous,
+            'final_length': KD.spbR.traj[-1] - KD.spbL.traj[-1]}
+
+
+def _run(model, paramtree, measuretree, n_simu, seed, integrator):
+    summaries = []
+    start = time.time()
+    for i in range(n_simu):
+        meta = Metaphase(paramtree=paramtree, measuretree=measuretree,
+                         seed=seed + i, integrator=integrator, model=model)
+        try:
+            meta.simul()
+        except ReducedModelBreakdown:
+            # Counted as a disagreement
+            summaries.append(dict.fromkeys(STATISTICS, np.nan))
+            continue
+        summaries.append(_summary(meta))
+    duration = time.time() - start
+    return {name: np.array([s[name] for s in summaries])
+            for name in STATISTICS}, duration
+
+
+def _sem(values):
+    if len(values) < 2:
+        return 0.
+    return values.std(ddof=1) / np.sqrt(len(values))
+
+
+def validate_reduced(paramtree=None, measuretree=None, n_simu=20, seed=0,
+                     integrator='implicit', tolerance=0.1,
+                     delay_tolerance=10.):
+    """
+    Runs `n_simu` simulations with the full and the reduced model, with
+    the same seeds, and compares their summary statistics.
+
+    A statistic agrees when the difference of its means is smaller than
+    the tolerance plus twice the standard error of the difference, the
+    two models not drawing the same random numbers. The standard error
+    term is bounded by the tolerance, so that a few diverging runs, which
+    widen the standard error, can't make a statistic agree. No statistic
+    agrees if a reduced run raised a
+    :class:`~kt_simul.core.reduced_dynamics.ReducedModelBreakdown`.
+
+    Parameters
+    ----------
+    paramtree, measuretree : :class:`~kt_simul.io.xml_handler.ParamTree`
+        Default parameters and measures if None
+    n_simu : int
+        Simulations per model, with seeds `seed` to `seed + n_simu - 1`
+    integrator : {'euler', 'implicit'}
+    tolerance : float
+        Relative tolerance on the statistics other than the delay
+    delay_tolerance : float
+        Absolute tolerance on the mean anaphase delay, in seconds
+
+    Returns
+    -------
+    records : list of dict
+        One record per statistic (see `STATISTICS`), with the means of
+        the `full` and the `reduced` model, their standard errors, the
+        `error` (relative but for the delay) and an `agrees` flag
+    speedup : float
+        Ratio of the run times of the full and the reduced model
+    """
+    if paramtree is None:
+        paramtree = ParamTree(parameters.PARAMFILE)
+    if measuretree is None:
+        measuretree = ParamTree(parameters.MEASUREFILE,
+                                adimentionalized=False)
+    full, full_time = _run('full', paramtree, measuretree, n_simu, seed,
+                           integrator)
+    reduced, reduced_time = _run('reduced', paramtree, measuretree, n_simu,
+                                 seed, integrator)
+
+    records = []
+    for name in STATISTICS:
+        difference = reduced[name].mean() - full[name].mean()
+        noise = 2 * np.hypot(_sem(full[name]), _sem(reduced[name]))
+        reference = full[name].mean()
+        if name == 'delay':
+            allowed = delay_tolerance
+            error = difference
+        else:
+            allowed = tolerance * abs(reference)
+            error = difference / reference if reference else difference
+        noise = min(noise, allowed)
+        records.append({'statistic': name,
+                        'full': full[name].mean(),
+                        'full_sem': _sem(full[name]),
+                        'reduced': reduced[name].mean(),
+                        'reduced_sem': _sem(reduced[name]),
+                        'error': error,
+                        'agrees': bool(np.isfinite(reduced[name]).all() and
+                                       abs(difference) <= allowed + noise)})
+    return records, full_time / reduced_time
+
+
+if __name__ == '__main__':
+
+    # The reduced model pays off with many attachment sites
+    for Mk in (4, 12, 30, 100):
+        paramtree = ParamTree(parameters.PARAMFILE)
+        paramtree.update(Mk=Mk)
+        records, speedup = validate_reduced(paramtree=paramtree)
+        print("Mk = %i" % Mk)
+        print("%15s %16s %16s %8s %7s" % ('statistic', 'full', 'reduced',
+                                          'error', 'agrees'))
+        for r in records:
+            print("%15s %7.3f+-%-7.3f %7.3f+-%-7.3f %8.3f %7s" %
+                  (r['statistic'], r['full'], r['full_sem'], r['reduced'],
+                   r['reduced_sem'], r['error'], r['agrees']))
+        print("Speedup of the reduced model: %.1f" % speedup)
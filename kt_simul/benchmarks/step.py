@@ -0,0 +1,71 @@
+"""
+Micro-benchmark of the simulation step throughput.
+
+Run it with::
+
+    python -m kt_simul.benchmarks.step
+"""
+
+from __future__ import unicode_literals
+from __future__ import division
+from __future__ import absolute_import
+from __future__ import print_function
+
+import time
+
+from kt_simul.io.xml_handler import ParamTree
+from kt_simul.core.simul_spindle import Metaphase
+from kt_simul.core import parameters
+
+__all__ = ["step_throughput"]
+
+
+def step_throughput(N=3, Mk=3, n_steps=1000, repeat=3, seed=0):
+    """
+    Measures how many :meth:`KinetoDynamics.one_step` calls are done per
+    second for a system of `N` chromosomes with `Mk` attachment sites.
+
+    Parameters
+    ----------
+    N : int
+    Mk : int
+    n_steps : int
+        Number of steps of each timed run
+    repeat : int
+        The best of `repeat` runs is kept
+
+    Returns
+    -------
+    float
+        Steps per second
+    """
+
+    best = None
+    for _ in range(repeat):
+        paramtree = ParamTree(parameters.PARAMFILE)
+        dt = paramtree.absolute_dic['dt']
+        paramtree.change_dic('N', N)
+        paramtree.change_dic('Mk', Mk)
+        paramtree.change_dic('span', (n_steps + 1) * dt)
+        # No anaphase during the benchmark
+        paramtree.change_dic('t_A', (n_steps + 1) * dt)
+
+        meta = Metaphase(paramtree=paramtree, seed=seed)
+        KD = meta.KD
+
+        start = time.time()
+        for time_point in range(1, KD.num_steps):
+            KD.one_step(time_point)
+        elapsed = time.time() - start
+
+        if best is None or elapsed < best:
+            best = elapsed
+
+    return (KD.num_steps - 1) / best
+
+
+if __name__ == '__main__':
+
+    for N, Mk in [(3, 3), (3, 10), (10, 10)]:
+        print("N = %3i, Mk = %3i : %10.1f steps/s" %
+              (N, Mk, step_throughput(N=N, Mk=Mk)))
@@ -0,0 +1,312 @@
+"""
+Offline benchmark suite of the simulation core, the I/O and the pools.
+
+Each benchmark returns a list of records::
+
+    {'name': 'one_step', 'params': {'N': 3, 'Mk': 3}, 'value': 5012.3,
+     'unit': 'steps/s'}
+
+which are gathered with some metadata in a JSON document by :func:`run`.
+Two documents can be compared with :func:`compare` to spot regressions
+between commits.
+"""
+
+from __future__ import unicode_literals
+from __future__ import division
+from __future__ import absolute_import
+from __future__ import print_function
+
+import os
+import sys
+import json
+import time
+import shutil
+import platform
+import datetime
+import tempfile
+import subprocess
+import multiprocessing
+
+import kt_simul
+from kt_simul.io.xml_handler import ParamTree
+from kt_simul.core import parameters
+from kt_simul.benchmarks.step import step_throughput
+
+__all__ = ["run", "save", "load", "compare", "scaling_report",
+           "BENCHMARKS"]
+
+# Units where a larger value is better
+HIGHER_IS_BETTER = set(['steps/s', 'simus/s'])
+
+
+def _best_time(func, repeat):
+    best = None
+    for _ in range(repeat):
+        start = time.time()
+        func()
+        elapsed = time.time() - start
+        if best is None or elapsed < best:
+            best = elapsed
+    return best
+
+
+def _paramtree(N=3, Mk=3, span=None, dt=None):
+    paramtree = ParamTree(parameters.PARAMFILE)
+    changes = {'N': N, 'Mk': Mk}
+    if dt is not None:
+        changes['dt'] = dt
+    if span is not None:
+        changes['span'] = span
+    paramtree.update(**changes)
+    return paramtree
+
+
+def _record(name, value, unit, **params):
+    return {'name': name, 'params': params, 'value': value, 'unit': unit}
+
+
+def bench_one_step(quick=False):
+    """
+    :meth:`KinetoDynamics.one_step` throughput over a grid of N and Mk.
+    """
+    if quick:
+        grid = [(1, 1), (3, 3), (3, 10)]
+        n_steps, repeat = 200, 1
+    else:
+        grid = [(N, Mk) for N in (1, 3, 10) for Mk in (1, 3, 10, 30)]
+        n_steps, repeat = 1000, 3
+
+    records = []
+    for N, Mk in grid:
+        rate = step_throughput(N=N, Mk=Mk, n_steps=n_steps, repeat=repeat)
+        records.append(_record('one_step', rate, 'steps/s', N=N, Mk=Mk,
+                               dim=1 + 2 * N * (Mk + 1)))
+    return records
+
+
+def bench_simul(quick=False):
+    """
+    A full :meth:`Metaphase.simul` with default parameters.
+    """
+    from kt_simul.core.simul_spindle import Metaphase
+
+    span = 200 if quick else 1000
+    repeat = 1 if quick else 3
+
+    def simul():
+        paramtree = _paramtree(span=span, dt=1)
+        meta = Metaphase(paramtree=paramtree, seed=0)
+        meta.simul()
+
+    return [_record('simul', _best_time(simul, repeat), 's',
+                    span=span, dt=1)]
+
+
+def bench_simuio(quick=False):
+    """
+    :meth:`SimuIO.save` and :meth:`SimuIO.read` of a simulation.
+    """
+    from kt_simul.core.simul_spindle import Metaphase
+    from kt_simul.io.simuio import SimuIO
+
+    span = 200 if quick else 1000
+    repeat = 1 if quick else 3
+
+    meta = Metaphase(paramtree=_paramtree(span=span, dt=1), seed=0)
+    meta.simul()
+
+    tmpdir = tempfile.mkdtemp()
+    fname = os.path.join(tmpdir, "simu.h5")
+    try:
+        save_time = _best_time(lambda: SimuIO(meta).save(fname), repeat)
+        read_time = _best_time(lambda: SimuIO().read(fname), repeat)
+    finally:
+        shutil.rmtree(tmpdir)
+
+    return [_record('simuio_save', save_time, 's', span=span, dt=1),
+            _record('simuio_read', read_time, 's', span=span, dt=1)]
+
+
+def bench_params(quick=False):
+    """
+    :class:`ParamTree` construction followed by :func:`reduce_params`.
+    """
+    number = 100 if quick else 1000
+
+    measuretree = ParamTree(parameters.MEASUREFILE, adimentionalized=False)
+
+    def build():
+        for _ in range(number):
+            paramtree = ParamTree(parameters.PARAMFILE)
+            parameters.reduce_params(paramtree, measuretree)
+
+    return [_record('paramtree_reduce', _best_time(build, 3) / number, 's')]
+
+
+def bench_pool(quick=False):
+    """
+    :meth:`Pool.run` throughput with 1 to n workers.
+    """
+    from kt_simul.pool import Pool
+
+    n_simu = 4 if quick else 16
+    span = 100 if quick else 500
+    max_workers = 2 if quick else multiprocessing.cpu_count()
+
+    paramtree = _paramtree(span=span, dt=1)
+    measuretree = ParamTree(parameters.MEASUREFILE, adimentionalized=False)
+
+    records = []
+    n_workers = 1
+    while n_workers <= max_workers:
+        tmpdir = tempfile.mkdtemp()
+        try:
+            pool = Pool(os.path.join(tmpdir, "pool"), paramtree=paramtree,
+                        measuretree=measuretree, n_simu=n_simu,
+                        parallel=n_workers > 1, n_workers=n_workers,
+                        verbose=False, seed=0)
+            elapsed = _best_time(pool.run, 1)
+        finally:
+            shutil.rmtree(tmpdir)
+        records.append(_record('pool_run', n_simu / elapsed, 'simus/s',
+                               n_workers=n_workers, n_simu=n_simu,
+                               span=span))
+        n_workers *= 2
+    return records
+
+
+BENCHMARKS = [bench_one_step, bench_simul, bench_simuio, bench_params,
+              bench_pool]
+
+
+def _git_revision():
+    root = os.path.dirname(os.path.dirname(os.path.dirname(
+        os.path.abspath(__file__))))
+    try:
+        with open(os.devnull, 'w') as devnull:
+            out = subprocess.check_output(['git', 'rev-parse', 'HEAD'],
+                                          cwd=root, stderr=devnull)
+        return out.decode('utf-8').strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run(names=None, quick=False, verbose=True):
+    """
+    Runs the benchmarks.
+
+    Parameters
+    ----------
+    names : list of str or None
+        Only run those benchmarks (e.g. ['one_step', 'pool']). All of them
+        if None.
+    quick : bool
+        Smaller problem sizes, for smoke testing.
+
+    Returns
+    -------
+    dict
+        Results and metadata, ready to be dumped to JSON. Benchmarks that
+        fail (e.g. missing optional dependencies) are reported in
+        'errors'.
+    """
+
+    results = {'meta': {'version': kt_simul.__version__,
+                        'git_revision': _git_revision(),
+                        'datetime': str(datetime.datetime.now()),
+                        'python': sys.version.split()[0],
+                        'platform': platform.platform(),
+                        'cpu_count': multiprocessing.cpu_count(),
+                        'quick': quick},
+               'results': [],
+               'errors': {}}
+
+    for bench in BENCHMARKS:
+        name = bench.__name__[len('bench_'):]
+        if names is not None and name not in names:
+            continue
+        if verbose:
+            print("Running %s..." % name)
+        try:
+            results['results'].extend(bench(quick=quick))
+        except Exception as e:
+            results['errors'][name] = "%s: %s" % (e.__class__.__name__, e)
+
+    return results
+
+
+def save(results, fname):
+    with open(fname, 'w') as f:
+        json.dump(results, f, indent=2, sort_keys=True)
+
+
+def load(fname):
+    with open(fname) as f:
+        return json.load(f)
+
+
+def _key(record):
+    return (record['name'], tuple(sorted(record['params'].items())))
+
+
+def compare(old, new, threshold=0.1):
+    """
+    Compares two benchmark results.
+
+    Parameters
+    ----------
+    old, new : dict
+        As returned by :func:`run` or :func:`load`
+    threshold : float
+        Relative change above which a benchmark is reported as a
+        regression or an improvement
+
+    Returns
+    -------
+    list of dict
+        One entry per benchmark present in both results, with the relative
+        change (positive is better) and a 'status' among 'regression',
+        'improvement' and 'same'.
+    """
+
+    old_records = dict((_key(r), r) for r in old['results'])
+    comparison = []
+    for record in new['results']:
+        old_record = old_records.get(_key(record))
+        if old_record is None or not old_record['value']:
+            continue
+        change = (record['value'] - old_record['value']) / old_record['value']
+        if record['unit'] not in HIGHER_IS_BETTER:
+            change = -change
+        if change < -threshold:
+            status = 'regression'
+        elif change > threshold:
+            status = 'improvement'
+        else:
+            status = 'same'
+        comparison.append({'name': record['name'],
+                           'params': record['params'],
+                           'old': old_record['value'],
+                           'new': record['value'],
+                           'unit': record['unit'],
+                           'change': change,
+                           'status': status})
+    return comparison
+
+
+def scaling_report(results):
+    """
+    Returns a text table of the step throughput versus the system
+    dimension `1 + 2N(Mk + 1)`.
+    """
+    records = [r for r in results['results'] if r['name'] == 'one_step']
+    records.sort(key=lambda r: r['params']['dim'])
+
+    lines = ["%6s %4s %4s %12s %14s" % ('dim', 'N', 'Mk', 'steps/s',
+                                        'dim.steps/s')]
+    for r in records:
+        p = r['params']
+        lines.append("%6i %4i %4i %12.1f %14.1f" % (p['dim'], p['N'], p['Mk'],
+                                                   r['value'],
+                                                   p['dim'] * r['value']))
+    return "\n".join(lines)
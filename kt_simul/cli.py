@@ -0,0 +1,724 @@
+"""
+The `kt-simul` command line interface::
+
+    kt-simul run -o simu.h5 --seed 1 --set dt=10 --set span=2000
+    kt-simul run -o long.h5 --seed 1 --checkpoint long.ckpt
+    kt-simul pool pool_dir -n 100 --workers 8 --seed 0 --decimate 10
+    kt-simul multipool manifest.yml scan_dir
+    kt-simul resume pool_dir
+    kt-simul export simu.h5 -o kymograph.png
+    kt-simul summarise pool_dir --json
+    kt-simul benchmark --quick
+
+A multipool manifest is a JSON (or YAML, if PyYAML is installed) document::
+
+    {"n_simu": 10, "seed": 0, "decimate": 10,
+     "set": {"dt": 10, "span": 2000, "t_A": 1750},
+     "scan": [{"name": "Fk", "values": [1, 2, 4], "digits": 1},
+              {"name": "k_d0", "values": {"start": 0, "stop": 1, "num": 5}}]}
+
+`scan` values are either a list or the arguments of `numpy.linspace`.
+Command line options override the manifest.
+
+A run with `--checkpoint` which is interrupted resumes from its last
+checkpoint when the same command is run again.
+
+The exit status tells schedulers what happened, see the `EXIT_*` constants.
+With `--status FILE`, a JSON description of the outcome is also written.
+
+Heavy modules are only imported by the subcommand which needs them so the
+command starts quickly.
+"""
+
+from __future__ import unicode_literals
+from __future__ import division
+from __future__ import absolute_import
+from __future__ import print_function
+
+import os
+import sys
+import json
+import errno
+import time
+import logging
+import argparse
+
+log = logging.getLogger(__name__)
+
+__all__ = ["main"]
+
+EXIT_OK = 0
+EXIT_ERROR = 1  # The simulations or the I/O failed
+EXIT_USAGE = 2  # Invalid arguments or manifest
+EXIT_EXISTS = 3  # The output already exists
+EXIT_NOT_FOUND = 4  # An input doesn't exist
+EXIT_INCOMPLETE = 5  # Some simulations of a pool are missing
+EXIT_REGRESSION = 6  # Benchmark regression
+EXIT_INTERRUPTED = 130
+
+VIDEO_EXTS = ('.mp4', '.avi', '.mov', '.mkv', '.webm', '.gif')
+# Kinds of kt_simul.core.random_source.RandomSource
+RNG_KINDS = ('pcg64', 'philox', 'legacy')
+# kt_simul.core.spindle_dynamics.INTEGRATORS
+INTEGRATORS = ('euler', 'implicit')
+# kt_simul.core.spindle_dynamics.MODELS
+MODELS = ('full', 'reduced')
+# kt_simul.core.spindle_dynamics.ATTACHMENTS
+ATTACHMENTS = ('exact', 'tau_leap')
+
+
+class CommandError(Exception):
+    """
+    Error reported to the user with the exit status `code`.
+    """
+
+    def __init__(self, message, code=EXIT_ERROR):
+        super(CommandError, self).__init__(message)
+        self.code = code
+
+
+def _parse_value(value):
+    for cast in (int, float):
+        try:
+            return cast(value)
+        except ValueError:
+            pass
+    return value
+
+
+def _parse_assignments(assignments):
+    changes = {}
+    for assignment in assignments or []:
+        name, sep, value = assignment.partition('=')
+        if not sep or not name:
+            raise CommandError("Expected NAME=VALUE, got '%s'" % assignment,
+                               EXIT_USAGE)
+        changes[name.strip()] = _parse_value(value.strip())
+    return changes
+
+
+def _check_input(path):
+    if not os.path.exists(path):
+        raise CommandError("%s does not exist" % path, EXIT_NOT_FOUND)
+
+
+def _check_output(path, force=False):
+    if os.path.exists(path) and not force:
+        raise CommandError("%s exists, use --force to overwrite it" % path,
+                           EXIT_EXISTS)
+
+
+def _trees(params=None, measures=None, changes=None):
+    """
+    Returns the parameter and measure trees with `changes` applied, each
+    change going to the tree which defines the parameter.
+    """
+    from kt_simul.io.xml_handler import ParamTree
+    from kt_simul.core import parameters
+
+    for path in (params, measures):
+        if path is not None:
+            _check_input(path)
+    paramtree = ParamTree(params or parameters.PARAMFILE)
+    measuretree = ParamTree(measures or parameters.MEASUREFILE,
+                            adimentionalized=False)
+
+    param_changes = {}
+    measure_changes = {}
+    for name, value in (changes or {}).items():
+        if name in paramtree.absolute_dic:
+            param_changes[name] = value
+        elif name in measuretree.absolute_dic:
+            measure_changes[name] = value
+        else:
+            raise CommandError("Unknown parameter '%s'" % name, EXIT_USAGE)
+    if param_changes:
+        paramtree.update(**param_changes)
+    if measure_changes:
+        measuretree.update(**measure_changes)
+    return paramtree, measuretree
+
+
+def _progress_sinks(args):
+    from kt_simul.utils.progress import TerminalSink, JSONLinesSink
+
+    sinks = [] if args.quiet else [TerminalSink()]
+    if args.progress:
+        sinks.append(JSONLinesSink(args.progress))
+    return sinks
+
+
+def _cache(args):
+    if args.cache is None:
+        return None
+    from kt_simul.io.cache import SimuCache
+    return SimuCache(args.cache)
+
+
+def _path_kind(path):
+    """
+    Returns 'simulation', 'pool' or 'multipool'.
+    """
+    _check_input(path)
+    if os.path.isfile(path):
+        return 'simulation'
+    metadata = os.path.join(path, "metadata.h5")
+    if not os.path.isfile(metadata):
+        raise CommandError("%s is neither a simulation file nor a pool" %
+                           path, EXIT_NOT_FOUND)
+    import pandas as pd
+    with pd.HDFStore(metadata, mode='r') as store:
+        keys = store.keys()
+    return 'multipool' if '/simus_path' in keys else 'pool'
+
+
+def _load(path):
+    kind = _path_kind(path)
+    if kind == 'simulation':
+        from kt_simul.io.simuio import SimuIO
+        return kind, SimuIO().read(path)
+    elif kind == 'pool':
+        from kt_simul.pool import Pool
+        return kind, Pool(path, load=True, verbose=False)
+    from kt_simul.pool import MultiPool
+    return kind, MultiPool(path, load=True, verbose=False)
+
+
+# Subcommands
+# Each returns a (exit status, dict) tuple, the dict being merged in the
+# status document.
+
+def cmd_run(args):
+    from kt_simul.core.simul_spindle import Metaphase
+    from kt_simul.io.simuio import SimuIO
+
+    _check_output(args.output, args.force)
+    paramtree, measuretree = _trees(args.params, args.measures,
+                                    _parse_assignments(args.set))
+    cache = _cache(args)
+    # The cache holds complete recordings, otherwise decimate in memory
+    record_every = args.decimate if cache is None else 1
+    checkpoint = None
+    if args.checkpoint is not None:
+        from kt_simul.io.checkpoint import Checkpointer
+        checkpoint = Checkpointer(args.checkpoint, args.checkpoint_interval)
+    if checkpoint is not None and os.path.isfile(checkpoint.path):
+        # Interrupted run
+        log.info("Resume simulation from %s" % checkpoint.path)
+        meta = Metaphase.resume(checkpoint.path, verbose=False,
+                                progress=_progress_sinks(args))
+        record_every = meta.KD.record_every
+    else:
+        meta = Metaphase(paramtree=paramtree, measuretree=measuretree,
+                         initial_plug=args.initial_plug, seed=args.seed,
+                         verbose=False, progress=_progress_sinks(args),
+                         record_every=record_every, rng=args.rng,
+                         integrator=args.integrator, model=args.model,
+                         attachment=args.attachment)
+        if cache is not None:
+            meta = cache.simul(meta, checkpoint=checkpoint)
+        else:
+            meta.simul(checkpoint=checkpoint)
+    SimuIO(meta).save(args.output, decimate=args.decimate // record_every)
+    log.info("Simulation saved to %s" % args.output)
+    if checkpoint is not None and os.path.isfile(checkpoint.path):
+        os.remove(checkpoint.path)
+    return EXIT_OK, {'outputs': [args.output], 'delay': meta.delay}
+
+
+def cmd_pool(args):
+    from kt_simul.pool import Pool
+
+    _check_output(args.output)
+    paramtree, measuretree = _trees(args.params, args.measures,
+                                    _parse_assignments(args.set))
+    pool = Pool(args.output, paramtree=paramtree, measuretree=measuretree,
+                n_simu=args.n_simu, initial_plug=args.initial_plug,
+                parallel=not args.serial, verbose=not args.quiet,
+                seed=args.seed, rng=args.rng, integrator=args.integrator,
+                model=args.model, attachment=args.attachment,
+                cache=_cache(args),
+                n_workers=args.workers, decimate=args.decimate,
+                memory_budget=_budget(args.memory_budget),
+                threads=args.threads,
+                progress=_progress_sinks(args))
+    pool.run()
+    return EXIT_OK, {'outputs': [args.output], 'n_simu': pool.n_simu}
+
+
+def load_manifest(fname):
+    """
+    Reads a multipool manifest from a JSON or a YAML file.
+    """
+    _check_input(fname)
+    with open(fname) as f:
+        content = f.read()
+    if os.path.splitext(fname)[1].lower() in ('.yml', '.yaml'):
+        try:
+            import yaml
+        except ImportError:
+            raise CommandError("PyYAML is needed to read %s" % fname,
+                               EXIT_USAGE)
+        manifest = yaml.safe_load(content)
+    else:
+        try:
+            manifest = json.loads(content)
+        except ValueError as e:
+            raise CommandError("Invalid manifest %s: %s" % (fname, e),
+                               EXIT_USAGE)
+    if not isinstance(manifest, dict) or not manifest.get('scan'):
+        raise CommandError("The manifest must have a 'scan' list",
+                           EXIT_USAGE)
+    return manifest
+
+
+def _scan(manifest, paramtree, measuretree):
+    """
+    Returns the `parameters` and `trees` arguments of
+    :class:`~kt_simul.pool.MultiPool`.
+    """
+    import numpy as np
+
+    parameters = []
+    trees = []
+    for item in manifest['scan']:
+        try:
+            name = item['name']
+            values = item['values']
+        except (KeyError, TypeError):
+            raise CommandError("Each scan entry needs a name and values",
+                               EXIT_USAGE)
+        if isinstance(values, dict):
+            values = np.linspace(**values).tolist()
+        tree = item.get('tree')
+        if tree is None:
+            if name in paramtree.absolute_dic:
+                tree = 'paramtree'
+            elif name in measuretree.absolute_dic:
+                tree = 'measuretree'
+            else:
+                raise CommandError("Unknown parameter '%s'" % name,
+                                   EXIT_USAGE)
+        parameters.append((name, values, item.get('digits', 2)))
+        trees.append(tree)
+    return parameters, trees
+
+
+def cmd_multipool(args):
+    from kt_simul.pool import MultiPool
+
+    manifest = load_manifest(args.manifest)
+    output = args.output or manifest.get('output')
+    if output is None:
+        raise CommandError("No output folder given", EXIT_USAGE)
+    _check_output(output)
+
+    def option(name, key=None):
+        value = getattr(args, name)
+        return value if value is not None else manifest.get(key or name)
+
+    paramtree, measuretree = _trees(option('params'), option('measures'),
+                                    manifest.get('set'))
+    parameters, trees = _scan(manifest, paramtree, measuretree)
+
+    multipool = MultiPool(output, parameters=parameters, trees=trees,
+                          paramtree=paramtree, measuretree=measuretree,
+                          n_simu=option('n_simu') or 10,
+                          initial_plug=manifest.get('initial_plug', 'random'),
+                          parallel=not (args.serial or
+                                        manifest.get('serial', False)),
+                          verbose=not args.quiet,
+                          progress=_progress_sinks(args),
+                          seed=option('seed'),
+                          rng=option('rng') or 'pcg64',
+                          integrator=option('integrator') or 'euler',
+                          model=option('model') or 'full',
+                          attachment=option('attachment') or 'exact',
+                          n_workers=option('workers'),
+                          decimate=option('decimate') or 1,
+                          memory_budget=_budget(option('memory_budget')),
+                          threads=(args.threads or
+                                   manifest.get('threads', False)))
+    multipool.run()
+    return EXIT_OK, {'outputs': [output],
+                     'n_pools': len(multipool.simus_path)}
+
+
+def cmd_resume(args):
+    kind = _path_kind(args.path)
+    if kind == 'simulation':
+        raise CommandError("%s is a complete simulation" % args.path,
+                           EXIT_USAGE)
+    elif kind == 'pool':
+        from kt_simul.pool import Pool
+        pool = Pool(args.path, load=True, verbose=not args.quiet,
+                    n_workers=args.workers, cache=_cache(args),
+                    memory_budget=_budget(args.memory_budget),
+                    threads=args.threads,
+                    progress=_progress_sinks(args))
+        resumed = pool.resume()
+        return EXIT_OK, {'outputs': [args.path], 'resumed': len(resumed)}
+
+    from kt_simul.pool import MultiPool
+    multipool = MultiPool(args.path, load=True, verbose=not args.quiet,
+                          n_workers=args.workers,
+                          memory_budget=_budget(args.memory_budget),
+                          threads=args.threads)
+    try:
+        resumed = multipool.resume()
+    except ValueError as e:
+        raise CommandError(str(e), EXIT_USAGE)
+    return EXIT_OK, {'outputs': [args.path], 'resumed': resumed}
+
+
+def cmd_export(args):
+    kind, obj = _load(args.path)
+    output = args.output
+    ext = os.path.splitext(output)[1].lower()
+    _check_output(output, args.force)
+
+    if kind == 'simulation':
+        if ext == '.json':
+            times = range(0, len(obj.KD.spbR.traj), args.every)
+            obj.report_engine.to_json(output, times=times)
+        elif ext in VIDEO_EXTS or '%' in output:
+            from kt_simul.gui.video import export_video
+            export_video(obj, output, fps=args.fps,
+                         max_frames=args.max_frames,
+                         n_workers=args.workers or 1)
+        else:
+            from kt_simul.gui.render import render_simulation
+            render_simulation(obj, output)
+        return EXIT_OK, {'outputs': [output]}
+
+    elif kind == 'pool':
+        if ext in ('.png', '.jpg', '.tif', '.tiff'):
+            from kt_simul.gui.render import render_pool
+            render_pool(obj, output, n_workers=args.workers)
+            return EXIT_OK, {'outputs': [output]}
+        from kt_simul.gui.video import export_pool_videos
+        fnames = export_pool_videos(obj, output, ext=args.video_format,
+                                    n_workers=args.workers, fps=args.fps,
+                                    max_frames=args.max_frames)
+        return EXIT_OK, {'outputs': fnames}
+
+    from kt_simul.gui.render import render_multipool
+    fnames = render_multipool(obj, output, n_workers=args.workers)
+    return EXIT_OK, {'outputs': fnames}
+
+
+def _summarise_simulation(meta):
+    import numpy as np
+
+    KD = meta.KD
+    correct = np.array([ch.correct_history for ch in KD.chromosomes])
+    erroneous = np.array([ch.erroneous_history for ch in KD.chromosomes])
+    length = np.asarray(KD.spbR.traj) - np.asarray(KD.spbL.traj)
+    return {'N': len(KD.chromosomes),
+            'Mk': int(KD.params.Mk),
+            'time_points': len(length),
+            'duration': float(meta.timelapse[-1]),
+            'final_spindle_length': float(length[-1]),
+            'mean_spindle_length': float(length.mean()),
+            'final_correct': int(correct[:, -1].sum()),
+            'final_erroneous': int(erroneous[:, -1].sum())}
+
+
+def _summarise_pool(pool):
+    missing = pool.missing()
+    return {'n_simu': int(pool.n_simu),
+            'done': int(pool.n_simu) - len(missing),
+            'missing': missing,
+            'seed': pool.seed,
+            'rng': pool.rng,
+            'integrator': pool.integrator,
+            'model': pool.model,
+            'attachment': pool.attachment,
+            'decimate': pool.decimate}
+
+
+def _summarise_member(multipool, relpath):
+    from kt_simul.pool import Pool
+
+    path = os.path.join(multipool.multi_pool_path, relpath)
+    if os.path.isfile(os.path.join(path, "metadata.h5")):
+        summary = _summarise_pool(Pool(path, load=True, verbose=False))
+    else:
+        n_simu = int(multipool.n_simu)
+        summary = {'n_simu': n_simu, 'done': 0,
+                   'missing': list(range(n_simu)),
+                   'seed': multipool.seed, 'decimate': multipool.decimate}
+    summary['path'] = relpath
+    return summary
+
+
+def cmd_summarise(args):
+    kind, obj = _load(args.path)
+    if kind == 'simulation':
+        summary = _summarise_simulation(obj)
+    elif kind == 'pool':
+        summary = _summarise_pool(obj)
+    else:
+        summary = {'pools': [_summarise_member(obj, rows['relpath'])
+                             for _, rows in obj.simus_path.iterrows()]}
+    summary['kind'] = kind
+
+    if args.json:
+        print(json.dumps(summary, indent=2, sort_keys=True))
+    else:
+        for key in sorted(summary):
+            if key == 'pools':
+                for pool in summary['pools']:
+                    print("%-40s %i/%i" % (pool['path'], pool['done'],
+                                           pool['n_simu']))
+            else:
+                print("%-22s %s" % (key, summary[key]))
+
+    if kind == 'pool':
+        complete = not summary['missing']
+    elif kind == 'multipool':
+        complete = all(not pool['missing'] for pool in summary['pools'])
+    else:
+        complete = True
+    return (EXIT_OK if complete else EXIT_INCOMPLETE), {'summary': summary}
+
+
+def cmd_benchmark(args):
+    from kt_simul.benchmarks.__main__ import main as benchmark_main
+
+    status = benchmark_main(args.extra_args)
+    return (EXIT_REGRESSION if status else EXIT_OK), {}
+
+
+def _memory_budget(value):
+    if value in ('auto', 'none'):
+        return value
+    return float(value)
+
+
+def _budget(value):
+    """
+    Returns the `memory_budget` argument of the pools.
+    """
+    if value is None or value == 'none':
+        return None
+    return value
+
+
+def _add_common(parser, workers=True):
+    parser.add_argument('-q', '--quiet', action='store_true',
+                        help="No log messages nor progress bar")
+    parser.add_argument('--progress', metavar='FILE',
+                        help="Append progress events to a JSON lines file")
+    parser.add_argument('--status', metavar='FILE',
+                        help="Write the outcome of the command as JSON")
+    if workers:
+        parser.add_argument('-w', '--workers', type=int,
+                            help="Number of worker processes")
+        parser.add_argument('--memory-budget', type=_memory_budget,
+                            metavar='MB',
+                            help="Memory the workers may use: a number of "
+                                 "MBytes, 'auto' (a fraction of the "
+                                 "available memory) or 'none' (default)")
+
+
+def _add_simulation(parser):
+    parser.add_argument('--params', metavar='XML',
+                        help="Parameter file (default: bundled params.xml)")
+    parser.add_argument('--measures', metavar='XML',
+                        help="Measure file (default: bundled measures.xml)")
+    parser.add_argument('-s', '--set', action='append', metavar='NAME=VALUE',
+                        help="Change a parameter or a measure, with units")
+    parser.add_argument('--initial-plug', default='random',
+                        help="Initial attachment state (default: random)")
+    parser.add_argument('--seed', type=int,
+                        help="Random seed, for reproducible results")
+    parser.add_argument('--rng', default='pcg64', choices=RNG_KINDS,
+                        help="Random number generator, 'legacy' gives the "
+                             "results of np.random.RandomState "
+                             "(default: pcg64)")
+    parser.add_argument('--integrator', default='euler', choices=INTEGRATORS,
+                        help="Time integration, 'implicit' stays stable "
+                             "with larger time steps (default: euler)")
+    parser.add_argument('--model', default='full', choices=MODELS,
+                        help="'reduced' slaves the attachment sites to "
+                             "their centromere, for fast screening with "
+                             "many sites (default: full)")
+    parser.add_argument('--attachment', default='exact', choices=ATTACHMENTS,
+                        help="'tau_leap' draws the attachments in bulk per "
+                             "centromere (default: exact)")
+    parser.add_argument('--decimate', type=int, default=1, metavar='N',
+                        help="Only record one time point every N")
+    parser.add_argument('--cache', metavar='DIR',
+                        help="Read and store seeded results in a "
+                             "content-addressed cache")
+
+
+def build_parser():
+    import kt_simul
+
+    parser = argparse.ArgumentParser(
+        prog="kt-simul",
+        description="Simulation of chromosome movements during mitosis")
+    parser.add_argument('--version', action='version',
+                        version='%(prog)s ' + kt_simul.__version__)
+    subparsers = parser.add_subparsers(dest='command', metavar='COMMAND')
+    subparsers.required = True
+
+    p = subparsers.add_parser('run', help="Run one simulation")
+    p.add_argument('-o', '--output', default='simu.h5',
+                   help="HDF5 result file (default: simu.h5)")
+    p.add_argument('-f', '--force', action='store_true',
+                   help="Overwrite the output")
+    p.add_argument('--checkpoint', metavar='FILE',
+                   help="Save the state of the simulation in FILE while "
+                        "it runs, and resume from FILE if it exists")
+    p.add_argument('--checkpoint-interval', type=float, default=600.,
+                   metavar='SECONDS',
+                   help="Time between two checkpoints (default: 600)")
+    _add_simulation(p)
+    _add_common(p, workers=False)
+    p.set_defaults(func=cmd_run)
+
+    p = subparsers.add_parser('pool', help="Run a pool of simulations")
+    p.add_argument('output', help="Pool folder, must not exist")
+    p.add_argument('-n', '--n-simu', type=int, default=100,
+                   help="Number of simulations (default: 100)")
+    p.add_argument('--serial', action='store_true',
+                   help="Run in the main process")
+    p.add_argument('--threads', action='store_true',
+                   help="Run the simulations in threads instead of "
+                        "worker processes")
+    _add_simulation(p)
+    _add_common(p)
+    p.set_defaults(func=cmd_pool)
+
+    p = subparsers.add_parser('multipool',
+                              help="Run a parameter scan from a manifest")
+    p.add_argument('manifest', help="JSON or YAML manifest")
+    p.add_argument('output', nargs='?',
+                   help="Multipool folder (default: 'output' of the "
+                        "manifest)")
+    p.add_argument('-n', '--n-simu', type=int,
+                   help="Simulations per parameter set")
+    p.add_argument('--params', metavar='XML')
+    p.add_argument('--measures', metavar='XML')
+    p.add_argument('--seed', type=int)
+    p.add_argument('--rng', choices=RNG_KINDS)
+    p.add_argument('--integrator', choices=INTEGRATORS)
+    p.add_argument('--model', choices=MODELS)
+    p.add_argument('--attachment', choices=ATTACHMENTS)
+    p.add_argument('--decimate', type=int, metavar='N')
+    p.add_argument('--serial', action='store_true')
+    p.add_argument('--threads', action='store_true')
+    _add_common(p)
+    p.set_defaults(func=cmd_multipool)
+
+    p = subparsers.add_parser('resume',
+                              help="Run the missing simulations of a pool "
+                                   "or a multipool")
+    p.add_argument('path')
+    p.add_argument('--cache', metavar='DIR')
+    p.add_argument('--threads', action='store_true')
+    _add_common(p)
+    p.set_defaults(func=cmd_resume)
+
+    p = subparsers.add_parser('export',
+                              help="Export a simulation, a pool or a "
+                                   "multipool to images, movies or JSON")
+    p.add_argument('path', help="Simulation file, pool or multipool folder")
+    p.add_argument('-o', '--output', required=True,
+                   help="Simulation: .json report, movie (%s) or image. "
+                        "Pool: contact sheet image or movie folder. "
+                        "Multipool: folder of contact sheets" %
+                        ", ".join(VIDEO_EXTS))
+    p.add_argument('-f', '--force', action='store_true')
+    p.add_argument('--every', type=int, default=1, metavar='N',
+                   help="JSON report of one time point every N")
+    p.add_argument('--fps', type=int, default=25)
+    p.add_argument('--max-frames', type=int)
+    p.add_argument('--video-format', default='mp4',
+                   help="Movie format of pool exports (default: mp4)")
+    _add_common(p)
+    p.set_defaults(func=cmd_export)
+
+    p = subparsers.add_parser('summarise',
+                              help="Summary of a simulation, a pool or a "
+                                   "multipool")
+    p.add_argument('path')
+    p.add_argument('--json', action='store_true')
+    _add_common(p, workers=False)
+    p.set_defaults(func=cmd_summarise)
+
+    p = subparsers.add_parser('benchmark', add_help=False,
+                              help="Run the benchmark suite (see "
+                                   "python -m kt_simul.benchmarks -h)")
+    p.set_defaults(func=cmd_benchmark, quiet=False, status=None)
+
+    return parser
+
+
+def _exit_code(error):
+    from kt_simul.pool import pool, multi_pool
+
+    if isinstance(error, pool.CanceledByUserException):
+        return EXIT_INTERRUPTED
+    if isinstance(error, (pool.FolderExistException,
+                          multi_pool.FolderExistException)):
+        return EXIT_EXISTS
+    if isinstance(error, (pool.FolderNotExistException,
+                          multi_pool.FolderNotExistException)):
+        return EXIT_NOT_FOUND
+    if isinstance(error, EnvironmentError) and error.errno == errno.ENOENT:
+        return EXIT_NOT_FOUND
+    return EXIT_ERROR
+
+
+def _write_status(fname, status):
+    tmp = fname + ".tmp"
+    with open(tmp, 'w') as f:
+        json.dump(status, f, indent=2, sort_keys=True, default=str)
+    os.replace(tmp, fname)
+
+
+def main(argv=None):
+    """
+    Entry point of the `kt-simul` command. Returns the exit status.
+    """
+    parser = build_parser()
+    # Unknown arguments are those of the benchmark suite
+    args, extra_args = parser.parse_known_args(argv)
+    if extra_args and args.command != 'benchmark':
+        parser.error("unrecognized arguments: %s" % " ".join(extra_args))
+    args.extra_args = extra_args
+
+    if args.quiet:
+        logging.getLogger('kt_simul').setLevel(logging.WARNING)
+
+    start = time.time()
+    info = {}
+    error = None
+    try:
+        code, info = args.func(args)
+    except CommandError as e:
+        code, error = e.code, str(e)
+    except KeyboardInterrupt:
+        code, error = EXIT_INTERRUPTED, "Interrupted"
+    except Exception as e:
+        code = _exit_code(e)
+        error = "%s: %s" % (e.__class__.__name__, e)
+        log.debug("kt-simul %s failed" % args.command, exc_info=True)
+
+    if error is not None:
+        log.error(error)
+
+    if args.status:
+        status = dict(info, command=args.command, exit_code=code,
+                      ok=code == EXIT_OK, error=error,
+                      elapsed=time.time() - start)
+        _write_status(args.status, status)
+    return code
+
+
+if __name__ == '__main__':
+    sys.exit(main())
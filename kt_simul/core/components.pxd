@@ -9,6 +9,9 @@ cimport numpy as np
 cimport cython
 from cpython cimport bool
 
+from .simu_params cimport SimuParams
+from .random_source cimport RandomSource
+
 __all__ = ["Spb", "Chromosome",
            "Centromere", "PlugSite", "Spindle"]
 
@@ -30,9 +33,13 @@ cdef class Spindle(object) :
 
 cdef class Organite(object):
     cdef public int num_steps
+    cdef public int record_every
     cdef public np.ndarray traj
     cdef public float pos
+    cdef public double last_disp
+    cdef double _last_pos
     cdef public object parent, KD
+    cdef readonly SimuParams params
     cdef void set_pos(Organite, float, int time_point=*)
     cdef float get_pos(Organite, int time_point=*)
 
@@ -61,10 +68,12 @@ cdef class Centromere(Organite):
     cdef public unicode tag
     cdef public Chromosome chromosome
     cdef public float toa
-    cdef public np.ndarray plug_vector
+    cdef readonly int n_left, n_right
     cdef public list plugsites
-    cdef void _calc_plug_vector(Centromere)
+    cdef void _count_plugged(Centromere)
+    cdef void _update_counts(Centromere, int, int)
     cdef float P_attachleft(Centromere)
+    cdef void plug_unplug_leap(Centromere, int, double)
     cdef int left_plugged(Centromere)
     cdef int right_plugged(Centromere)
     cdef bool at_rightpole(Centromere, float tol=*)
@@ -73,9 +82,10 @@ cdef class Centromere(Organite):
 cdef class PlugSite(Organite):
     cdef public Centromere centromere
     cdef public unicode tag
-    cdef public int plug_state, plugged
+    cdef public int plug_state, plugged, last_transition
     cdef public np.ndarray state_hist
     cdef public float P_att
+    cdef RandomSource random
     cdef public void set_plug_state(PlugSite, int, int time_point=*)
     cdef public float calc_ldep(PlugSite)
     cdef public void plug_unplug(PlugSite, int)
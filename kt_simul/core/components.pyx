@@ -15,6 +15,8 @@ cimport numpy as np
 cimport cython
 from cpython cimport bool
 
+from .random_source cimport binomial_inversion
+
 __all__ = ["Spb", "Chromosome",
            "Centromere", "PlugSite", "Spindle"]
 
@@ -48,8 +50,11 @@ cdef class Organite(object):
     Attributes
     ----------
     KD : a :class:`~spindle_dynamics.KinetoDynamics` instance
+    params : the :class:`~simu_params.SimuParams` instance of `KD`
     pos : float, the position
-    traj : ndarrat, the trajectory
+    traj : ndarrat, the trajectory, one position every `record_every`
+        time points
+    last_disp : float, displacement during the last time step
 
     Methods
     -------
@@ -60,15 +65,20 @@ cdef class Organite(object):
     def __init__(self, parent, init_pos):
         self.parent = parent
         self.KD = parent.KD
+        self.params = parent.KD.params
         self.num_steps = parent.KD.num_steps
-        self.traj = np.zeros(self.num_steps)
+        self.record_every = parent.KD.record_every
+        self.traj = np.zeros(parent.KD.num_records)
         self.pos = init_pos
         self.traj[0] = init_pos
+        self._last_pos = self.traj[0]
+        self.last_disp = 0
 
     cdef void set_pos(self, float pos, int time_point=-1):
         """
-        Sets the position. If `time_point` is provided, sets
-        the corresponding value in `self.traj[time_point]`
+        Sets the position. If `time_point` is provided, updates
+        `self.last_disp` and, if the time point is recorded, the
+        corresponding value of `self.traj`
         """
         self.pos = pos
         if pos > self.KD.spbR.pos:
@@ -76,7 +86,10 @@ cdef class Organite(object):
         elif self.pos < self.KD.spbL.pos:
             self.pos = self.KD.spbL.pos
         if time_point >= 0:
-            self.traj[time_point] = self.pos
+            self.last_disp = self.pos - self._last_pos
+            self._last_pos = self.pos
+            if time_point % self.record_every == 0:
+                self.traj[time_point // self.record_every] = self.pos
 
     cdef float get_pos(self, int time_point=-1):
         """Returns the position.
@@ -136,11 +149,12 @@ cdef class Chromosome(Organite):
 
         self.pos = center_pos
         self.traj[0] = center_pos
+        self._last_pos = center_pos
         self.cen_A = Centromere(self, 'A')
         self.cen_B = Centromere(self, 'B')
-        self.correct_history = np.zeros((self.KD.num_steps, 2))
+        self.correct_history = np.zeros((self.KD.num_records, 2))
         self.correct_history[0] = self.correct()
-        self.erroneous_history = np.zeros((self.KD.num_steps, 2))
+        self.erroneous_history = np.zeros((self.KD.num_records, 2))
         self.erroneous_history[0] = self.erroneous()
 
     cdef bool is_right_A(self):
@@ -169,8 +183,8 @@ cdef class Chromosome(Organite):
         """
         Change the sense of viscous force depending on relative speeds of centromeres A and B
         """
-        speedA = (self.cen_A.traj[-2]-self.cen_A.traj[-1])/self.KD.params.dt
-        speedB = (self.cen_B.traj[-2]-self.cen_B.traj[-1])/self.KD.params.dt
+        speedA = (self.cen_A.traj[-2]-self.cen_A.traj[-1])/self.params.dt
+        speedB = (self.cen_B.traj[-2]-self.cen_B.traj[-1])/self.params.dt
         
         return 1 if speedA > speedB else -1
 
@@ -206,8 +220,6 @@ cdef class Chromosome(Organite):
         """
         Returns the number of *erroneously* plugged MTs
         """
-        self.cen_A.calc_plug_vector()
-        self.cen_B.calc_plug_vector()
         if self.is_right_A():
             return self.cen_A.left_plugged(), self.cen_B.right_plugged()
         else:
@@ -277,36 +289,56 @@ cdef class Centromere(Organite):
         else:
             raise ValueError("the `tag` attribute must be 'A' or 'B'.")
         Organite.__init__(self, chromosome, init_pos)
-        Mk = int(self.KD.params['Mk'])
+        Mk = self.params.Mk
         self.toa = 0  # time of arrival at pole
-        self.plug_vector = np.zeros(Mk, dtype=np.int)
         self.plugsites = []
         cdef PlugSite ps
         for m in range(Mk):
             ps = PlugSite(self, m)
             self.plugsites.append(ps)
-        self.calc_plug_vector()
+        self.count_plugged()
 
     def is_attached(self):
         """
         Returns True if at least one plugsite is attached
         to at least one SPB
         """
-        cdef PlugSite plugsite
-        for plugsite in self.plugsites:
-            if plugsite.plug_state != 0:
-                return True
-        return False
+        return self.n_left + self.n_right > 0
 
-    def calc_plug_vector(self):
-        self._calc_plug_vector()
+    property plug_vector:
+        """
+        Array of the attachment states of the plugsites
+        """
+        def __get__(self):
+            cdef PlugSite plugsite
+            return np.array([plugsite.plug_state for plugsite
+                             in self.plugsites])
+
+    def count_plugged(self):
+        """
+        Counts the plugsites attached to each pole. The counts `n_left`
+        and `n_right` are then kept up to date by
+        :meth:`PlugSite.set_plug_state`, this is only needed after setting
+        `plug_state` directly.
+        """
+        self._count_plugged()
 
-    cdef void _calc_plug_vector(self):
-        cdef np.ndarray[ITYPE_t] state
+    cdef void _count_plugged(self):
         cdef PlugSite plugsite
-        state = np.array([plugsite.plug_state for plugsite
-                          in self.plugsites])
-        self.plug_vector = state
+        self.n_left = 0
+        self.n_right = 0
+        for plugsite in self.plugsites:
+            self._update_counts(0, plugsite.plug_state)
+
+    cdef void _update_counts(self, int old_state, int new_state):
+        if old_state == -1:
+            self.n_left -= 1
+        elif old_state == 1:
+            self.n_right -= 1
+        if new_state == -1:
+            self.n_left += 1
+        elif new_state == 1:
+            self.n_right += 1
 
     def calc_plug_history(self):
         cdef np.ndarray[ITYPE_t, ndim = 2] state_hist
@@ -319,32 +351,96 @@ cdef class Centromere(Organite):
 
     cdef float P_attachleft(self):
         cdef float orientation
-        orientation = self.KD.params['orientation']
+        orientation = self.params.orientation
         if orientation == 0:
             return 0.5
         cdef int lp, rp
-        self.calc_plug_vector()
-        lp = self.left_plugged()
-        rp = self.right_plugged()
+        lp = self.n_left
+        rp = self.n_right
         if lp + rp == 0:
             return 0.5
         cdef float P_left
         P_left = 0.5 + orientation * (lp - rp) / (2 * (lp + rp))
         return P_left
 
+    @cython.cdivision(True)
+    cdef void plug_unplug_leap(self, int time_point, double tolerance):
+        """
+        Tau-leaping version of :meth:`PlugSite.plug_unplug` for all the
+        plugsites of the centromere.
+
+        The number of detachments from each pole is drawn from a binomial
+        distribution with the mean detachment probability of the
+        plugsites attached to it, and as many of them are chosen at
+        random. If their probabilities differ by more than `tolerance`
+        relative to the largest, e.g. close to the distance singularity of
+        :meth:`PlugSite.P_det`, each plugsite is drawn on its own instead.
+        The attachments of the free plugsites are drawn the same way, each
+        attaching plugsite then choosing its pole as usual.
+        """
+        cdef PlugSite plugsite
+        cdef int side, n, k, remaining
+        cdef double p, total, p_min, p_max
+        cdef float side_dice, P_left
+        cdef RandomSource random = self.KD.prng
+        cdef list before = [plugsite.plug_state for plugsite
+                            in self.plugsites]
+        cdef list probs
+
+        # Detachment, one population per pole
+        for side in range(-1, 2, 2):
+            population = [plugsite for plugsite, state
+                          in zip(self.plugsites, before) if state == side]
+            n = len(population)
+            if n == 0:
+                continue
+            probs = [plugsite.P_det() for plugsite in population]
+            total = sum(probs)
+            p_min = min(probs)
+            p_max = max(probs)
+            if p_max - p_min > tolerance * p_max:
+                # Rates too different for a common draw
+                for plugsite, p in zip(population, probs):
+                    if <float> random.uniform() < <float> p:
+                        plugsite.set_plug_state(0, time_point)
+                continue
+            k = binomial_inversion(n, total / n, random.uniform())
+            remaining = n
+            for plugsite in population:
+                if k == 0:
+                    break
+                if random.uniform() * remaining < k:
+                    plugsite.set_plug_state(0, time_point)
+                    k -= 1
+                remaining -= 1
+
+        # Attachment
+        population = [plugsite for plugsite, state
+                      in zip(self.plugsites, before) if state == 0]
+        n = len(population)
+        if n == 0:
+            return
+        plugsite = population[0]
+        k = binomial_inversion(n, plugsite.P_att, random.uniform())
+        remaining = n
+        for plugsite in population:
+            if k == 0:
+                break
+            if random.uniform() * remaining < k:
+                side_dice = <float> random.uniform()
+                P_left = self.P_attachleft()
+                if side_dice < P_left:
+                    plugsite.set_plug_state(-1, time_point)
+                else:
+                    plugsite.set_plug_state(1, time_point)
+                k -= 1
+            remaining -= 1
+
     cdef int left_plugged(self):
-        cdef int lp
-        cdef np.ndarray[ITYPE_t] left_plugged
-        left_plugged = self.plug_vector * (self.plug_vector - 1) // 2
-        lp = left_plugged.sum()
-        return lp
+        return self.n_left
 
     cdef int right_plugged(self):
-        cdef int rp
-        cdef np.ndarray[ITYPE_t] right_plugged
-        right_plugged = self.plug_vector * (1 + self.plug_vector) // 2
-        rp = right_plugged.sum()
-        return rp
+        return self.n_right
 
     cdef bool at_rightpole(self, float tol=0.01):
         cdef float rightpole_pos
@@ -374,11 +470,11 @@ cdef class Centromere(Organite):
 
         cdef int toa
         cdef float d
-        toa = self.num_steps
+        toa = len(dist_to_pole)
         for d in dist_to_pole[::-1]:
             toa -= 1
             if d > tol:
-                self.toa = toa * self.KD.params['dt']
+                self.toa = toa * self.params.dt * self.record_every
                 return True
 
 
@@ -398,6 +494,7 @@ cdef class PlugSite(Organite):
         self.centromere = centromere
         self.tag = self.centromere.tag
         self.site_id = site_id
+        self.random = self.KD.prng
 
         if initial_plug == None:
             self.plug_state = self.KD.prng.choice([-1,0,1])
@@ -417,13 +514,19 @@ cdef class PlugSite(Organite):
             self.plug_state = initial_plug
 
         self.set_pos(init_pos)
-        self.state_hist = np.zeros(self.KD.num_steps, dtype=np.int)
+        self.state_hist = np.zeros(self.KD.num_records, dtype=np.int)
         self.state_hist[:] = self.plug_state
-        self.P_att = 1 - np.exp(- self.KD.params['k_a'])
+        self.P_att = 1 - np.exp(- self.params.k_a)
 
     cdef void set_plug_state(self, int state, int time_point=-1):
+        self.centromere._update_counts(self.plug_state, state)
         self.plug_state = state
         self.plugged = 0 if state == 0 else 1
+        self.last_transition = max(time_point, 0)
+        if time_point >= 0:
+            # First recorded time point from `time_point` on
+            time_point = ((time_point + self.record_every - 1)
+                          // self.record_every)
         self.state_hist[time_point:] = state
 
     cdef float calc_ldep(self):
@@ -446,8 +549,8 @@ cdef class PlugSite(Organite):
         cdef double pole_pos
         cdef double force_term
 
-        ldep = self.KD.params['ldep']
-        ldep_balance = self.KD.params['ldep_balance']
+        ldep = self.params.ldep
+        ldep_balance = self.params.ldep_balance
 
         # The mean
         lbase = (1 - ldep * ldep_balance)
@@ -466,10 +569,10 @@ cdef class PlugSite(Organite):
 
     cdef void plug_unplug(self, int time_point):
         cdef float dice, side_dice
-        dice = self.KD.prng.rand()
+        dice = self.random.uniform()
         # Attachment
         if self.plug_state == 0 and dice < self.P_att:
-            side_dice = self.KD.prng.rand()
+            side_dice = self.random.uniform()
             P_left = self.centromere.P_attachleft()
             if side_dice < P_left:
                 self.set_plug_state(-1, time_point)
@@ -510,8 +613,8 @@ cdef class PlugSite(Organite):
 
         k_shrink = 0.2
 
-        d_alpha = self.KD.params['d_alpha']
-        k_d0 = self.KD.params['k_a']
+        d_alpha = self.params.d_alpha
+        k_d0 = self.params.k_a
         if d_alpha == 0: return k_d0
         cdef float dist
         dist = abs(self.pos -
@@ -522,13 +625,15 @@ cdef class PlugSite(Organite):
         if k_dc > 1e4: return 1.
 
         if self.KD.time_point > 1:
-            if (np.diff(self.traj[self.KD.time_point - 2:self.KD.time_point])[0] * self.plug_state) > 0:
+            if self.last_disp * self.plug_state > 0:
                 k_dc *= k_shrink
 
         return 1 - np.exp(-k_dc)
 
     cdef double calc_attach_trans(self):
         """
+        Modulation of the force of a kMT which rises with the time since
+        the last attachment or detachment, from `self.last_transition`
         """
         cdef double tau_trans
         cdef double dt
@@ -539,11 +644,8 @@ cdef class PlugSite(Organite):
         tau_trans = 10
 
         current_t_index = self.KD.time_point
-        state = self.state_hist
-        try:
-            index_t0 = np.where(state[:current_t_index] != self.plug_state)[0][-1]
-        except IndexError:
-            index_t0 = 0
+        # Last time point in the previous state
+        index_t0 = max(self.last_transition - 1, 0)
         dt = (current_t_index - index_t0) * self.KD.dt
 
         trans_modulation = 1 - np.exp(-dt * (1 / tau_trans))
@@ -0,0 +1,680 @@
+# -*- coding: utf-8 -*-
+# cython: boundscheck=False, wraparound=False
+"""
+GIL-free time steps of the spindle dynamics.
+
+:class:`FlatDynamics` runs the same steps as
+:meth:`KinetoDynamics.one_step <kt_simul.core.spindle_dynamics.KinetoDynamics.one_step>`
+on flat C arrays indexed like the state vector: the uniform numbers are read
+from the buffer of the simulation
+:class:`~kt_simul.core.random_source.RandomSource` and the linear system is
+solved by an LU decomposition written in C. Nothing in a step
+touches a Python object, so the steps release the GIL and independent
+simulations can run in threads of a single process (see the `threads`
+argument of :class:`~kt_simul.pool.Pool`).
+
+When the simulation has a profiler, the phases of the steps are timed
+with a C clock and the attachment events counted in C, under the names
+used by the object code (see :meth:`FlatDynamics.report`).
+
+The random numbers are drawn in the same order and the arithmetic is done
+with the same precision as in the component objects, so a seeded
+simulation follows the same trajectory whichever path runs it.
+"""
+
+from __future__ import unicode_literals
+from __future__ import division
+from __future__ import absolute_import
+from __future__ import print_function
+
+import numpy as np
+cimport numpy as np
+cimport cython
+from libc.math cimport exp, fabs
+from cpython.mem cimport PyMem_Malloc, PyMem_Free
+
+from .components cimport Organite, Chromosome, Centromere, PlugSite
+from .random_source cimport RandomSource, binomial_inversion
+
+np.import_array()
+
+__all__ = ["FlatDynamics"]
+
+cdef extern from *:
+    """
+    #ifdef _WIN32
+    #include <windows.h>
+    static double kt_clock(void) {
+        LARGE_INTEGER count, freq;
+        QueryPerformanceCounter(&count);
+        QueryPerformanceFrequency(&freq);
+        return (double) count.QuadPart / (double) freq.QuadPart;
+    }
+    #else
+    #include <time.h>
+    static double kt_clock(void) {
+        struct timespec ts;
+        clock_gettime(CLOCK_MONOTONIC, &ts);
+        return ts.tv_sec + 1e-9 * ts.tv_nsec;
+    }
+    #endif
+    """
+    double kt_clock() nogil
+
+# Timed phases of a step, in the order of `FlatDynamics.timers`
+PHASES = ('plug_unplug', 'calc_A', 'calc_C', 'solve', 'position_update')
+cdef enum:
+    PLUG_UNPLUG, CALC_A, CALC_C, SOLVE, POSITION_UPDATE, N_PHASES
+
+
+cdef class FlatDynamics:
+    """
+    Flat copy of the state of a
+    :class:`~kt_simul.core.spindle_dynamics.KinetoDynamics` instance.
+
+    The components remain the reference: :meth:`run` reads their positions
+    and attachment states, runs the steps on the flat arrays and writes the
+    results back, the trajectories and attachment histories being written
+    in place. Between two calls the components can be changed as usual
+    (ablation, anaphase onset, parameter changes).
+
+    Parameters
+    ----------
+    KD : :class:`~kt_simul.core.spindle_dynamics.KinetoDynamics`
+        No other thread may use its random source.
+    """
+    cdef object KD
+    cdef RandomSource source
+    cdef int N, Mk, dim, n_sites, record_every
+    cdef bint anaphase
+
+    # Parameters, with the precision used by the components
+    cdef double dt, Vk, ldep, ldep_balance, sac
+    cdef float Fmz, d0, kappa_c, orientation, d_alpha, k_a
+    cdef long t_A
+
+    # Index `dim` holds the left pole, which is not in the state vector
+    cdef float[::1] pos
+    cdef double[::1] last_pos, last_disp
+    cdef int[::1] state, plugged, last_transition
+    cdef float[::1] P_att
+    # Plugsites attached to each pole per centromere, and centromeres
+    # without attachment, updated with the states
+    cdef int[::1] n_left, n_right
+    cdef int n_unattached
+    # Tau-leaping of the attachments (see KinetoDynamics), with the states
+    # and detachment probabilities of the sites of a centromere before its
+    # leap
+    cdef bint tau_leap
+    cdef double leap_tolerance
+    cdef int[::1] before
+    cdef float[::1] P_leap
+    cdef double[:, ::1] A0, B, A
+    cdef double[::1] X, rhs
+
+    cdef double **traj
+    cdef np.int64_t **hist
+
+    # Time (s) and calls of each phase of the profiled steps, and
+    # attachment events, since the last report
+    cdef bint profiled
+    cdef double timers[N_PHASES]
+    cdef long calls[N_PHASES]
+    cdef long attach_events, detach_events
+    cdef list organites, plugsites, centromeres
+
+    def __cinit__(self):
+        self.traj = NULL
+        self.hist = NULL
+        self._reset_profile()
+
+    def __init__(self, KD):
+        self.KD = KD
+        self.source = KD.prng
+        self.N = KD.params.N
+        self.Mk = KD.params.Mk
+        self.dim = 1 + 2 * self.N * (self.Mk + 1)
+        self.n_sites = 2 * self.N * self.Mk
+        self.record_every = KD.record_every
+
+        # Organites in the order of the state vector, then the left pole
+        cdef Chromosome ch
+        cdef Centromere cen
+        self.organites = [KD.spbR]
+        self.centromeres = []
+        self.plugsites = []
+        for ch in KD.chromosomes:
+            for cen in (ch.cen_A, ch.cen_B):
+                self.centromeres.append(cen)
+                self.organites.append(cen)
+                self.organites.extend(cen.plugsites)
+                self.plugsites.extend(cen.plugsites)
+        self.organites.append(KD.spbL)
+
+        self.pos = np.zeros(self.dim + 1, dtype=np.float32)
+        self.last_pos = np.zeros(self.dim + 1)
+        self.last_disp = np.zeros(self.dim + 1)
+        self.state = np.zeros(self.n_sites, dtype=np.intc)
+        self.plugged = np.zeros(self.n_sites, dtype=np.intc)
+        self.last_transition = np.zeros(self.n_sites, dtype=np.intc)
+        self.P_att = np.zeros(self.n_sites, dtype=np.float32)
+        self.n_left = np.zeros(2 * self.N, dtype=np.intc)
+        self.n_right = np.zeros(2 * self.N, dtype=np.intc)
+        self.before = np.zeros(self.Mk, dtype=np.intc)
+        self.P_leap = np.zeros(self.Mk, dtype=np.float32)
+        self.A = np.zeros((self.dim, self.dim))
+        self.X = np.zeros(self.dim)
+        self.rhs = np.zeros(self.dim)
+        self.traj = <double **> PyMem_Malloc((self.dim + 1) * sizeof(double *))
+        self.hist = <np.int64_t **> PyMem_Malloc(
+            max(self.n_sites, 1) * sizeof(np.int64_t *))
+        if self.traj == NULL or self.hist == NULL:
+            raise MemoryError()
+
+    def __dealloc__(self):
+        PyMem_Free(self.traj)
+        PyMem_Free(self.hist)
+
+    cdef void _load(self) except *:
+        """
+        Reads the parameters and the state of the components. The matrices
+        must be up to date with the parameters.
+        """
+        KD = self.KD
+        params = KD.params
+        self.A0 = KD.A0_step
+        self.B = KD.B_mat
+        self.anaphase = KD.anaphase
+        self.dt = params.dt
+        self.Vk = params.Vk
+        self.ldep = params.ldep
+        self.ldep_balance = params.ldep_balance
+        self.sac = params.sac
+        self.Fmz = params.Fmz
+        self.d0 = params.d0
+        self.kappa_c = params.kappa_c
+        self.orientation = params.orientation
+        self.d_alpha = params.d_alpha
+        self.k_a = params.k_a
+        self.t_A = int(params.t_A)
+        self.tau_leap = KD.attachment == 'tau_leap'
+        self.leap_tolerance = KD.leap_tolerance
+
+        cdef int i, s, c
+        cdef Organite organite
+        cdef PlugSite plugsite
+        cdef Centromere cen
+        cdef np.ndarray traj, hist
+        for i, organite in enumerate(self.organites):
+            self.pos[i] = organite.pos
+            self.last_pos[i] = organite._last_pos
+            self.last_disp[i] = organite.last_disp
+            traj = organite.traj
+            if traj.dtype != np.float64 or not traj.flags.c_contiguous:
+                raise ValueError("Trajectories must be contiguous float64 "
+                                 "arrays")
+            self.traj[i] = <double *> np.PyArray_DATA(traj)
+        for s, plugsite in enumerate(self.plugsites):
+            self.state[s] = plugsite.plug_state
+            self.plugged[s] = plugsite.plugged
+            self.last_transition[s] = plugsite.last_transition
+            self.P_att[s] = plugsite.P_att
+            hist = plugsite.state_hist
+            if hist.dtype != np.int64 or not hist.flags.c_contiguous:
+                raise ValueError("Attachment histories must be contiguous "
+                                 "int64 arrays")
+            self.hist[s] = <np.int64_t *> np.PyArray_DATA(hist)
+        self.n_unattached = 0
+        for c, cen in enumerate(self.centromeres):
+            self.n_left[c] = cen.n_left
+            self.n_right[c] = cen.n_right
+            if cen.n_left + cen.n_right == 0:
+                self.n_unattached += 1
+
+    cdef void _store(self, int time_point) except *:
+        """
+        Writes the state back to the components. The attachment histories
+        after `time_point` are set to the current state, as
+        :meth:`PlugSite.set_plug_state` does.
+        """
+        cdef int i, s, c, state
+        cdef Organite organite
+        cdef PlugSite plugsite
+        cdef Centromere cen
+        cdef int k = self.record_every
+        cdef int nxt = (time_point + k) // k
+        for i, organite in enumerate(self.organites):
+            organite.pos = self.pos[i]
+            organite._last_pos = self.last_pos[i]
+            organite.last_disp = self.last_disp[i]
+        for s, plugsite in enumerate(self.plugsites):
+            state = self.state[s]
+            plugsite.plug_state = state
+            plugsite.plugged = self.plugged[s]
+            plugsite.last_transition = self.last_transition[s]
+            if (nxt < self.KD.num_records and
+                    plugsite.state_hist[nxt] != state):
+                plugsite.state_hist[nxt:] = state
+        for c, cen in enumerate(self.centromeres):
+            cen.n_left = self.n_left[c]
+            cen.n_right = self.n_right[c]
+
+    def run(self, int start, int stop):
+        """
+        Runs the time points from `start` to `stop` (excluded). Before a
+        time point after `start`, stops if the anaphase onset is due, so
+        that it is handled by the caller.
+
+        Returns
+        -------
+        int
+            The first time point which has not been run
+        """
+        cdef int time_point = start
+        cdef int status = 0
+        self._load()
+        self.profiled = self.KD.profiler is not None
+        with self.source.bit_generator.lock:
+            with nogil:
+                while time_point < stop:
+                    if (time_point > start and not self.anaphase and
+                            self._anaphase_due(time_point)):
+                        break
+                    if self.profiled:
+                        status = self._step_profiled(time_point)
+                    else:
+                        status = self._step(time_point)
+                    if status != 0:
+                        break
+                    time_point += 1
+        self.KD.time_point = time_point - 1
+        self._store(time_point - 1)
+        if status != 0:
+            raise np.linalg.LinAlgError("Singular matrix")
+        return time_point
+
+    cdef bint _anaphase_due(self, int time_point) nogil:
+        """
+        Same test as `Metaphase._anaphase_test`, without its side effects
+        """
+        if time_point * self.dt < self.t_A:
+            return False
+        if self.sac == 0:
+            return True
+        return self.n_unattached == 0
+
+    def report(self, profiler):
+        """
+        Adds the phase timers and event counters of the profiled steps
+        since the last report to `profiler` (see
+        :class:`~kt_simul.utils.profiling.Profiler`), then resets them.
+        """
+        cdef int phase
+        for phase in range(N_PHASES):
+            if self.calls[phase] > 0:
+                profiler.add_total(PHASES[phase], self.timers[phase],
+                                   self.calls[phase])
+        if self.calls[PLUG_UNPLUG] > 0:
+            profiler.count('attach_events', self.attach_events)
+            profiler.count('detach_events', self.detach_events)
+        if self.calls[SOLVE] > 0:
+            profiler.count('solves', self.calls[SOLVE])
+        self._reset_profile()
+
+    cdef void _reset_profile(self):
+        cdef int phase
+        for phase in range(N_PHASES):
+            self.timers[phase] = 0
+            self.calls[phase] = 0
+        self.attach_events = 0
+        self.detach_events = 0
+
+    cdef int _step(self, int time_point) nogil:
+        if not self.anaphase:
+            self._plug_unplug(time_point)
+        self._calc_A()
+        self._calc_C()
+        if self._solve() != 0:
+            return -1
+        self._position_update(time_point)
+        return 0
+
+    cdef int _step_profiled(self, int time_point) nogil:
+        """
+        Same as `_step`, timing each phase
+        """
+        cdef double t0 = kt_clock()
+        if not self.anaphase:
+            self._plug_unplug(time_point)
+            t0 = self._lap(PLUG_UNPLUG, t0)
+        self._calc_A()
+        t0 = self._lap(CALC_A, t0)
+        self._calc_C()
+        t0 = self._lap(CALC_C, t0)
+        if self._solve() != 0:
+            return -1
+        t0 = self._lap(SOLVE, t0)
+        self._position_update(time_point)
+        self._lap(POSITION_UPDATE, t0)
+        return 0
+
+    cdef inline double _lap(self, int phase, double t0) nogil:
+        """
+        Adds the time since `t0` to `phase`, and returns the current time
+        """
+        cdef double t1 = kt_clock()
+        self.timers[phase] += t1 - t0
+        self.calls[phase] += 1
+        return t1
+
+    cdef inline int _site_idx(self, int s) nogil:
+        return (s // self.Mk) * (self.Mk + 1) + 2 + s % self.Mk
+
+    cdef inline int _cen_idx(self, int c) nogil:
+        return c * (self.Mk + 1) + 1
+
+    cdef void _plug_unplug(self, int time_point) nogil:
+        cdef int s, c
+        cdef float dice, side_dice, P_left
+        if self.tau_leap:
+            for c in range(2 * self.N):
+                self._leap(c, time_point)
+            return
+        for s in range(self.n_sites):
+            dice = <float> self.source.uniform()
+            # Attachment
+            if self.state[s] == 0:
+                if dice < self.P_att[s]:
+                    side_dice = <float> self.source.uniform()
+                    P_left = self._P_attachleft(s // self.Mk)
+                    self._set_state(s, -1 if side_dice < P_left else 1,
+                                    time_point)
+            # Detachment
+            elif dice < self._P_det(s, time_point):
+                self._set_state(s, 0, time_point)
+
+    @cython.cdivision(True)
+    cdef void _leap(self, int c, int time_point) nogil:
+        """
+        Same as :meth:`Centromere.plug_unplug_leap`
+        """
+        cdef int first = c * self.Mk
+        cdef int m, side, n, k, remaining
+        cdef double p, total, p_min, p_max
+        cdef float side_dice, P_left
+        for m in range(self.Mk):
+            self.before[m] = self.state[first + m]
+
+        # Detachment, one population per pole
+        for side in range(-1, 2, 2):
+            n = 0
+            total = 0
+            p_min = 1
+            p_max = 0
+            for m in range(self.Mk):
+                if self.before[m] == side:
+                    self.P_leap[m] = self._P_det(first + m, time_point)
+                    p = self.P_leap[m]
+                    n += 1
+                    total += p
+                    p_min = min(p_min, p)
+                    p_max = max(p_max, p)
+            if n == 0:
+                continue
+            if p_max - p_min > self.leap_tolerance * p_max:
+                # Rates too different for a common draw
+                for m in range(self.Mk):
+                    if (self.before[m] == side and
+                            <float> self.source.uniform() < self.P_leap[m]):
+                        self._set_state(first + m, 0, time_point)
+                continue
+            k = binomial_inversion(n, total / n, self.source.uniform())
+            remaining = n
+            m = 0
+            while k > 0:
+                if self.before[m] == side:
+                    if self.source.uniform() * remaining < k:
+                        self._set_state(first + m, 0, time_point)
+                        k -= 1
+                    remaining -= 1
+                m += 1
+
+        # Attachment
+        n = 0
+        for m in range(self.Mk):
+            if self.before[m] == 0:
+                n += 1
+        if n == 0:
+            return
+        for m in range(self.Mk):
+            if self.before[m] == 0:
+                p = self.P_att[first + m]
+                break
+        k = binomial_inversion(n, p, self.source.uniform())
+        remaining = n
+        m = 0
+        while k > 0:
+            if self.before[m] == 0:
+                if self.source.uniform() * remaining < k:
+                    side_dice = <float> self.source.uniform()
+                    P_left = self._P_attachleft(c)
+                    self._set_state(first + m, -1 if side_dice < P_left
+                                    else 1, time_point)
+                    k -= 1
+                remaining -= 1
+            m += 1
+
+    cdef inline void _set_state(self, int s, int state,
+                                int time_point) nogil:
+        cdef int c = s // self.Mk
+        cdef int before = self.n_left[c] + self.n_right[c]
+        if self.state[s] == -1:
+            self.n_left[c] -= 1
+        elif self.state[s] == 1:
+            self.n_right[c] -= 1
+        if state == -1:
+            self.n_left[c] += 1
+        elif state == 1:
+            self.n_right[c] += 1
+        if self.state[s] == 0 and state != 0:
+            self.attach_events += 1
+        elif self.state[s] != 0 and state == 0:
+            self.detach_events += 1
+        if before == 0 and state != 0:
+            self.n_unattached -= 1
+        elif before != 0 and self.n_left[c] + self.n_right[c] == 0:
+            self.n_unattached += 1
+        self.state[s] = state
+        self.plugged[s] = 0 if state == 0 else 1
+        self.last_transition[s] = time_point
+
+    @cython.cdivision(True)
+    cdef float _P_attachleft(self, int c) nogil:
+        cdef float orientation = self.orientation
+        if orientation == 0:
+            return 0.5
+        cdef int lp = self.n_left[c], rp = self.n_right[c]
+        if lp + rp == 0:
+            return 0.5
+        cdef float P_left
+        P_left = 0.5 + orientation * (lp - rp) / (2 * (lp + rp))
+        return P_left
+
+    @cython.cdivision(True)
+    cdef float _P_det(self, int s, int time_point) nogil:
+        cdef float d_alpha = self.d_alpha
+        cdef float k_d0 = self.k_a
+        cdef double k_shrink = 0.2
+        if d_alpha == 0:
+            return k_d0
+        cdef int x = self._site_idx(s)
+        cdef int n = s // (2 * self.Mk)
+        cdef int a = self._cen_idx(2 * n)
+        cdef int b = self._cen_idx(2 * n + 1)
+        cdef float dist
+        cdef double k_dc
+        dist = fabs(self.pos[x] -
+                    (<double> (self.pos[a] + self.pos[b])) / 2.)
+        if dist == 0:
+            return 1.
+        k_dc = k_d0 * d_alpha / dist
+        if k_dc > 1e4:
+            return 1.
+        if time_point > 1:
+            if self.last_disp[x] * self.state[s] > 0:
+                k_dc *= k_shrink
+        return <float> (1 - exp(-k_dc))
+
+    @cython.cdivision(True)
+    cdef float _calc_ldep(self, int s) nogil:
+        cdef double ldep = self.ldep
+        cdef double ldep_balance = self.ldep_balance
+        cdef double lbase = 1 - ldep * ldep_balance
+        if ldep > (1 / ldep_balance):
+            return 1
+        cdef double pole_pos = (<double> self.pos[0]) * self.state[s]
+        cdef double mt_length = fabs(pole_pos - self.pos[self._site_idx(s)])
+        return <float> (ldep * mt_length + lbase)
+
+    cdef void _calc_A(self) nogil:
+        """
+        Builds A = A0 + At in `self.A`, A0 including the B term of the
+        implicit integrator. The force terms of the sites, which are also
+        their terms of C, are left in `self.rhs`.
+        """
+        cdef int dim = self.dim
+        cdef int Mk = self.Mk
+        cdef int i, j, n, m, side, s, x
+        cdef int plugged
+        cdef float pi_nm
+        cdef double at00 = 0
+
+        for i in range(dim):
+            for j in range(dim):
+                self.A[i, j] = self.A0[i, j]
+
+        for n in range(self.N):
+            for m in range(Mk):
+                plugged = 0
+                for side in range(2):
+                    s = (2 * n + side) * Mk + m
+                    x = self._site_idx(s)
+                    pi_nm = self.state[s]
+                    if not self.anaphase:
+                        pi_nm *= self._calc_ldep(s)
+                    plugged += self.plugged[s]
+                    self.A[x, x] = self.A0[x, x] - self.plugged[s]
+                    self.A[0, x] = self.A0[0, x] + pi_nm
+                    self.A[x, 0] = self.A0[x, 0] + pi_nm
+                    self.rhs[x] = pi_nm
+                at00 -= plugged
+        self.A[0, 0] = self.A0[0, 0] + at00
+
+    cdef void _calc_C(self) nogil:
+        """
+        Completes C in `self.rhs` after `_calc_A`, then replaces it with
+        -(B.X + C)
+        """
+        cdef int dim = self.dim
+        cdef int Mk = self.Mk
+        cdef int i, j, n, m, a, b, s
+        cdef int delta1
+        cdef double c0, acc
+
+        for i in range(dim):
+            self.X[i] = self.pos[i]
+
+        c0 = 2 * self.Fmz
+        for n in range(self.N):
+            a = self._cen_idx(2 * n)
+            b = self._cen_idx(2 * n + 1)
+            delta1 = 1 if self.pos[a] < self.pos[b] else -1
+            self.rhs[a] = - delta1 * self.kappa_c * self.d0
+            self.rhs[b] = delta1 * self.kappa_c * self.d0
+            for m in range(Mk):
+                s = 2 * n * Mk + m
+                c0 -= self.plugged[s] + self.plugged[s + Mk]
+        self.rhs[0] = c0
+
+        # rhs = -(B.X + C)
+        for i in range(dim):
+            acc = 0
+            for j in range(dim):
+                acc = acc + self.B[i, j] * self.X[j]
+            self.rhs[i] = - (acc + self.rhs[i])
+
+    @cython.cdivision(True)
+    cdef int _solve(self) nogil:
+        """
+        Solves A.speeds = rhs in place by Gaussian elimination with partial
+        pivoting (the unblocked algorithm of LAPACK's dgesv). The speeds
+        are left in `self.rhs`. Returns -1 if A is singular.
+        """
+        cdef int dim = self.dim
+        cdef int i, j, k, p
+        cdef double amax, tmp, l, r
+        for k in range(dim):
+            p = k
+            amax = fabs(self.A[k, k])
+            for i in range(k + 1, dim):
+                if fabs(self.A[i, k]) > amax:
+                    amax = fabs(self.A[i, k])
+                    p = i
+            if amax == 0:
+                return -1
+            if p != k:
+                for j in range(dim):
+                    tmp = self.A[k, j]
+                    self.A[k, j] = self.A[p, j]
+                    self.A[p, j] = tmp
+                tmp = self.rhs[k]
+                self.rhs[k] = self.rhs[p]
+                self.rhs[p] = tmp
+            r = 1 / self.A[k, k]
+            for i in range(k + 1, dim):
+                l = self.A[i, k]
+                if l == 0:
+                    continue
+                l = l * r
+                self.A[i, k] = l
+                for j in range(k + 1, dim):
+                    self.A[i, j] = self.A[i, j] - l * self.A[k, j]
+                self.rhs[i] = self.rhs[i] - l * self.rhs[k]
+        for i in range(dim - 1, -1, -1):
+            tmp = self.rhs[i]
+            for j in range(i + 1, dim):
+                tmp = tmp - self.A[i, j] * self.rhs[j]
+            self.rhs[i] = tmp / self.A[i, i]
+        return 0
+
+    cdef inline void _set_pos(self, int i, float pos, int time_point) nogil:
+        """
+        Same as :meth:`Organite.set_pos`
+        """
+        self.pos[i] = pos
+        if pos > self.pos[0]:
+            self.pos[i] = self.pos[0]
+        elif self.pos[i] < self.pos[self.dim]:
+            self.pos[i] = self.pos[self.dim]
+        pos = self.pos[i]
+        self.last_disp[i] = pos - self.last_pos[i]
+        self.last_pos[i] = pos
+        if time_point % self.record_every == 0:
+            self.traj[i][time_point // self.record_every] = pos
+
+    cdef void _position_update(self, int time_point) nogil:
+        cdef double scale = self.Vk * self.dt
+        cdef int i, s
+        cdef int k = self.record_every
+        cdef float new_pos
+        cdef double speed0 = self.rhs[0] * scale
+        new_pos = self.pos[0] + speed0
+        self._set_pos(0, new_pos, time_point)
+        new_pos = self.pos[self.dim] - speed0
+        self._set_pos(self.dim, new_pos, time_point)
+        for i in range(1, self.dim):
+            new_pos = self.pos[i] + self.rhs[i] * scale
+            self._set_pos(i, new_pos, time_point)
+        if time_point % k == 0:
+            for s in range(self.n_sites):
+                self.hist[s][time_point // k] = self.state[s]
@@ -0,0 +1,331 @@
+"""
+Deterministic mean-field approximation of the metaphase, for fast
+parameter screening before a :class:`~kt_simul.pool.MultiPool` sweep.
+
+The attachment sites of each centromere are replaced by the expected
+fractions attached to the correct and to the wrong pole, which follow the
+same per-step rules as :meth:`PlugSite.plug_unplug
+<kt_simul.core.components.PlugSite.plug_unplug>`: attachment probability
+from `k_a`, pole chosen with the `orientation` rule, distance-dependent
+detachment with `d_alpha`. All the chromosomes being equivalent on
+average, the force balance of
+:class:`~kt_simul.core.spindle_dynamics.KinetoDynamics` is reduced to the
+pole and the two centromeres of a mean chromosome centered in the spindle,
+the sites moving with their centromere as in
+:mod:`~kt_simul.core.reduced_dynamics`. The correct pole is the one of the
+majority of the attachments, as in :meth:`Chromosome.correct
+<kt_simul.core.components.Chromosome.correct>`.
+
+The fluctuations of the attachments are neglected, so the mean field
+underestimates the attachment errors which persist in the stochastic
+model. It is meant to rank parameter points, the retained ones being
+checked with simulations.
+
+Each parameter can be an array, the points being integrated together::
+
+    params = mean_field_params(paramtrees)
+    results = mean_field(params)
+    errors = compare_measures(results)
+
+Only the metaphase, until `t_A`, is integrated.
+"""
+
+from __future__ import unicode_literals
+from __future__ import division
+from __future__ import absolute_import
+from __future__ import print_function
+
+import math
+
+import numpy as np
+
+from kt_simul.core import parameters
+
+__all__ = ["mean_field", "mean_field_params", "compare_measures",
+           "INITIAL_FRACTIONS", "RANDOM_PLUGS"]
+
+# Parameters used by the mean field, with the units of KinetoDynamics
+PARAMS = ('N', 'Mk', 'dt', 't_A', 'Vk', 'L0', 'd0', 'k_a', 'd_alpha',
+          'orientation', 'mus', 'muc', 'muco', 'Fmz', 'Vmz', 'kappa_c',
+          'kappa_k', 'ldep', 'ldep_balance')
+
+# Fractions of the sites of A and B attached to their correct and to
+# their wrong pole, A being on the left, for the deterministic
+# `initial_plug` values
+INITIAL_FRACTIONS = {'null': ((0, 0), (0, 0)),
+                     'amphitelic': ((1, 0), (1, 0)),
+                     'monotelic': ((1, 0), (0, 0)),
+                     'syntelic': ((0, 1), (1, 0))}
+
+# Probabilities of each site to be attached to either pole, for the random
+# `initial_plug` values
+RANDOM_PLUGS = {'random': 1 / 3,
+                'merotelic': 1 / 2}
+
+
+def mean_field_params(paramtrees, measuretree=None, reduce_p=True,
+                      force_parameters=[]):
+    """
+    Returns the parameters of each tree as
+    :class:`~kt_simul.core.simul_spindle.Metaphase` gives them to the
+    simulation, as arrays with one value per tree.
+
+    Parameters
+    ----------
+    paramtrees : list of :class:`~kt_simul.io.xml_handler.ParamTree`
+    measuretree : :class:`~kt_simul.io.xml_handler.ParamTree`
+        Default measures if None
+    reduce_p : bool
+        If True, the parameters are first computed from the measures with
+        :func:`~kt_simul.core.parameters.reduced_params`
+    """
+    if measuretree is None:
+        measuretree = parameters.get_measuretree()
+    values = dict((name, []) for name in PARAMS)
+    for paramtree in paramtrees:
+        if reduce_p:
+            paramtree = parameters.reduced_params(
+                paramtree, measuretree, force_parameters=force_parameters)
+        relative = paramtree.relative_dic
+        absolute = paramtree.absolute_dic
+        for name in PARAMS:
+            # Same units as in Metaphase
+            if name in ('Vk', 'dt'):
+                values[name].append(absolute[name])
+            else:
+                values[name].append(relative[name])
+    return dict((name, np.array(value, dtype=float))
+                for name, value in values.items())
+
+
+def mean_field(params, initial_plug='random', integrator='implicit'):
+    """
+    Integrates the mean-field equations until the anaphase onset.
+
+    Parameters
+    ----------
+    params : dict
+        Parameters as returned by :func:`mean_field_params`, scalars or
+        arrays of the same shape
+    initial_plug : str
+        See :class:`~kt_simul.core.spindle_dynamics.KinetoDynamics`
+    integrator : {'euler', 'implicit'}
+        See :class:`~kt_simul.core.spindle_dynamics.KinetoDynamics`
+
+    Returns
+    -------
+    dict of arrays
+        For each point:
+
+        - `metaph_rate`: mean spindle elongation rate during the
+          metaphase, in µm/s
+        - `mean_metaph_k_dist`: mean kinetochore pair distance during the
+          metaphase, in µm
+        - `spindle_length`: spindle length at `t_A`, in µm
+        - `attached`, `correct`, `erroneous`: expected fractions of the
+          sites attached, attached to their correct pole and attached to
+          the wrong pole at `t_A`
+    """
+    if (initial_plug not in INITIAL_FRACTIONS and
+            initial_plug not in RANDOM_PLUGS):
+        raise ValueError("Unknown initial_plug '%s' for the mean field" %
+                         initial_plug)
+    p = dict((name, np.asarray(params[name], dtype=float))
+             for name in PARAMS)
+    # With random initial attachments, the mean chromosome is integrated
+    # with A attached correctly to the left pole and to the right one, the
+    # two orientations being averaged
+    n_orientations = 2 if initial_plug in RANDOM_PLUGS else 1
+    shape = (n_orientations,) + np.broadcast(*p.values()).shape
+    p = dict((name, np.broadcast_to(value, shape)) for name, value
+             in p.items())
+
+    N = p['N']
+    Mk = p['Mk']
+    h = p['Vk'] * p['dt']
+    kappa_k = p['kappa_k']
+    P_att = 1 - np.exp(-p['k_a'])
+    num_steps = (p['t_A'] / p['dt']).astype(int)
+    # Length dependence of the kMT forces, see PlugSite.calc_ldep
+    no_ldep = p['ldep'] > 1 / p['ldep_balance']
+    lbase = 1 - p['ldep'] * p['ldep_balance']
+
+    # Positions of the right pole and of the centromeres, A on the left
+    x = p['L0'] / 2.
+    X = np.stack([-p['d0'] / 2., p['d0'] / 2.])
+    speeds = np.zeros((3,) + shape)
+    # Attached fractions of each centromere, [A, B] x [correct, wrong].
+    # The initial attachments are not counted as plugged until their
+    # first change, as in the full model.
+    fractions = np.zeros((2, 2) + shape)
+    if initial_plug in RANDOM_PLUGS:
+        stale = _majority_fractions(Mk, RANDOM_PLUGS[initial_plug])
+        stale = np.stack([stale, stale])
+    else:
+        stale = np.array(INITIAL_FRACTIONS[initial_plug], dtype=float)
+        stale = stale.reshape((2, 2) + (1,) * len(shape))
+    stale = np.broadcast_to(stale, fractions.shape).copy()
+    # Pole of the correct and of the wrong attachments of A and B, in
+    # each orientation
+    poles = np.array([[[-1., 1.], [1., -1.]],
+                      [[1., -1.], [-1., 1.]]])[:n_orientations]
+    poles = np.moveaxis(poles, 0, 2).reshape(
+        (2, 2, n_orientations) + (1,) * (len(shape) - 1))
+    sites = X[:, None] + np.zeros((2, 2) + shape)
+    site_disp = np.zeros(sites.shape)
+    # Sites attached at the previous step, which have jumped towards their
+    # pole and are shrinking
+    new = np.zeros(sites.shape)
+    distances = np.zeros(shape)
+    start_x = x
+
+    for time_point in range(1, int(num_steps.max()) + 1):
+        active = time_point <= num_steps
+        distances = distances + np.where(active, np.abs(X[1] - X[0]), 0)
+
+        # Attachments, see PlugSite.plug_unplug and
+        # Centromere.P_attachleft
+        attached = fractions + stale
+        free = 1 - attached.sum(axis=1)
+        left = np.where(poles < 0, attached, 0).sum(axis=1)
+        right = attached.sum(axis=1) - left
+        P_left = np.where(left + right > 0,
+                          0.5 + p['orientation'] * (left - right) /
+                          (2 * np.maximum(left + right, 1e-12)), 0.5)
+        attaching = (free * P_att)[:, None] * np.where(
+            poles < 0, P_left[:, None], 1 - P_left[:, None])
+
+        # Detachments, see PlugSite.P_det. The shrinking kMTs are those
+        # of the sites moving towards their pole relative to the
+        # chromosome: the mean chromosome would otherwise drift to a pole,
+        # stabilizing its wrong attachments, while the chromosomes of the
+        # stochastic model oscillate around the spindle center.
+        center = (X[0] + X[1]) / 2.
+        dist = np.abs(sites - center)
+        k_dc = p['k_a'] * p['d_alpha'] / np.maximum(dist, 1e-300)
+        certain = k_dc > 1e4
+        shrink = k_dc
+        if time_point > 1:
+            shrink = k_dc * 0.2
+            k_dc = np.where(site_disp * poles > 0, shrink, k_dc)
+        P_det = np.where(certain, 1., 1 - np.exp(-k_dc))
+        P_new = np.where(certain, 1., 1 - np.exp(-shrink))
+        P_det = np.where(p['d_alpha'] == 0, p['k_a'], P_det)
+        P_new = np.where(p['d_alpha'] == 0, p['k_a'], P_new)
+
+        fractions = np.where(active, (fractions - new) * (1 - P_det) +
+                             new * (1 - P_new) + attaching, fractions)
+        new = np.where(active, attaching, new)
+        stale = np.where(active, stale * (1 - P_det), stale)
+
+        # Force balance of the pole and of the centromeres
+        ldep = np.where(no_ldep, 1.,
+                        p['ldep'] * np.abs(x * poles - sites) + lbase)
+        pi = Mk * ((fractions + stale) * poles * ldep).sum(axis=1)
+        plugged = Mk * fractions.sum(axis=1)
+        speeds = np.where(active, _solve(p, N, x, X, pi, plugged, h,
+                                         integrator), speeds)
+
+        old_offsets = sites - (X[0] + X[1]) / 2.
+        # The poles can't cross, see ReducedDynamics._step
+        x = np.where(active, np.maximum(x + speeds[0] * h, 0), x)
+        X = np.where(active, X + speeds[1:] * h, X)
+        X = np.minimum(np.maximum(X, -x), x)
+        offset = (poles * ldep * (1 + speeds[0]) -
+                  speeds[1:, None]) / kappa_k
+        sites = np.where(active, np.minimum(np.maximum(X[:, None] + offset,
+                                                       -x), x), sites)
+        site_disp = np.where(active, sites - (X[0] + X[1]) / 2. -
+                             old_offsets, site_disp)
+
+    t_A = num_steps * p['dt']
+    # The correct attachments are those of the orientation of the
+    # majority, see Chromosome.correct
+    per_site = (fractions + stale).mean(axis=0)
+    per_site = np.stack([per_site.max(axis=0), per_site.min(axis=0)])
+    results = {'metaph_rate': 2 * (x - start_x) / t_A,
+               'mean_metaph_k_dist': distances / np.maximum(num_steps, 1),
+               'spindle_length': 2 * x,
+               'attached': per_site.sum(axis=0),
+               'correct': per_site[0],
+               'erroneous': per_site[1]}
+    return dict((name, value.mean(axis=0))
+                for name, value in results.items())
+
+
+def _majority_fractions(Mk, p_plug):
+    """
+    Expected fractions of the sites of a chromosome attached in the
+    orientation of the majority of its attachments and in the other one,
+    as in :meth:`Chromosome.correct
+    <kt_simul.core.components.Chromosome.correct>`, each of its `2 Mk`
+    sites being attached in either orientation with probability `p_plug`.
+    """
+    fractions = np.zeros((2,) + Mk.shape)
+    for n_sites in np.unique(Mk):
+        n = int(2 * n_sites)
+        counts = np.arange(n + 1)
+        # Joint probabilities of the numbers of attachments in each
+        # orientation, trinomial with the free sites
+        a, b = np.meshgrid(counts, counts, indexing='ij')
+        free = n - a - b
+        valid = free >= 0
+        log_coef = (_log_factorial(n) - _log_factorial(a) -
+                    _log_factorial(b) - _log_factorial(np.where(valid,
+                                                                free, 0)))
+        with np.errstate(divide='ignore'):
+            log_p = (a + b) * np.log(p_plug) + np.where(
+                free > 0, free * np.log(1 - 2 * p_plug), 0)
+        prob = np.where(valid, np.exp(log_coef + log_p), 0)
+        point = Mk == n_sites
+        fractions[0] = np.where(point, (prob * np.maximum(a, b)).sum() / n,
+                                fractions[0])
+        fractions[1] = np.where(point, (prob * np.minimum(a, b)).sum() / n,
+                                fractions[1])
+    return fractions
+
+
+def _log_factorial(n):
+    return np.vectorize(math.lgamma, otypes=[float])(np.asarray(n) + 1.)
+
+
+def _solve(p, N, x, X, pi, plugged, h, integrator):
+    """
+    Speeds of the pole and of the centromeres A and B of the mean
+    chromosome, from the equations of the reduced model
+    """
+    kappa_c = p['kappa_c']
+    shape = x.shape
+    A = np.zeros(shape + (3, 3))
+    A[..., 0, 0] = (-2 * p['mus'] - 4 * p['Fmz'] / p['Vmz'] -
+                    N * plugged.sum(axis=0))
+    A[..., 0, 1:] = np.moveaxis(N * pi, 0, -1)
+    A[..., 1:, 0] = np.moveaxis(pi, 0, -1)
+    A[..., 1, 1] = -p['muc'] + p['muco'] - plugged[0]
+    A[..., 2, 2] = -p['muc'] - p['muco'] - plugged[1]
+    B = np.zeros(shape + (3, 3))
+    B[..., 1, 1] = B[..., 2, 2] = -kappa_c
+    B[..., 1, 2] = B[..., 2, 1] = kappa_c
+    if integrator == 'implicit':
+        A = A + h[..., None, None] * B
+
+    delta1 = np.where(X[0] < X[1], 1., -1.)
+    C = np.stack([2 * p['Fmz'] - N * plugged.sum(axis=0),
+                  pi[0] - delta1 * kappa_c * p['d0'],
+                  pi[1] + delta1 * kappa_c * p['d0']], axis=-1)
+    Y = np.stack([x, X[0], X[1]], axis=-1)
+    rhs = -(np.einsum('...ij,...j->...i', B, Y) + C)
+    return np.moveaxis(np.linalg.solve(A, rhs[..., None])[..., 0], -1, 0)
+
+
+def compare_measures(results, measuretree=None):
+    """
+    Returns the relative differences of the mean-field predictions to the
+    measures used by :func:`~kt_simul.core.parameters.reduce_params`,
+    `metaph_rate` and `mean_metaph_k_dist`.
+    """
+    if measuretree is None:
+        measuretree = parameters.get_measuretree()
+    measures = measuretree.absolute_dic
+    return dict((name, (results[name] - measures[name]) / measures[name])
+                for name in ('metaph_rate', 'mean_metaph_k_dist'))
@@ -10,6 +10,7 @@ from __future__ import print_function
 
 import logging
 import os
+import collections
 
 from kt_simul.io.xml_handler import ParamTree
 
@@ -17,17 +18,34 @@ CURRENT_DIR = os.path.abspath(os.path.dirname(__file__))
 ROOT_DIR = os.path.dirname(CURRENT_DIR)
 PARAMFILE = os.path.join(ROOT_DIR, 'data', 'params.xml')
 MEASUREFILE = os.path.join(ROOT_DIR, 'data', 'measures.xml')
-MEASURETREE = ParamTree(MEASUREFILE, adimentionalized=False)
-MEASURES = MEASURETREE.absolute_dic
 
 log = logging.getLogger(__name__)
 
 
+def get_measuretree():
+    """
+    Returns the default measures tree, read from `MEASUREFILE`.
+    """
+    return ParamTree(MEASUREFILE, adimentionalized=False)
+
+
+def __getattr__(name):
+    # MEASURETREE and MEASURES are only parsed when they are used
+    if name == 'MEASURETREE':
+        return get_measuretree()
+    elif name == 'MEASURES':
+        return get_measuretree().absolute_dic
+    raise AttributeError("module %s has no attribute %s" % (__name__, name))
+
+
 def reduce_params(paramtree, measuretree, force_parameters=[]):
     """
     This functions changes the parameters so that
     the dynamical characteristics complies with the measures [1]_.
 
+    See :func:`reduced_params` for a memoized version which doesn't
+    modify `paramtree`.
+
     Parameters
     ----------
 
@@ -41,8 +59,98 @@ def reduce_params(paramtree, measuretree, force_parameters=[]):
            J. Cell Biol 2012 http://dx.doi.org/10.1083/jcb.201107124
 
     """
-    params = paramtree.absolute_dic
-    measures = measuretree.absolute_dic
+    changes = _reduction(paramtree.absolute_dic, measuretree.absolute_dic,
+                         force_parameters)
+    if changes is None:
+        return False
+    paramtree.update(**changes)
+
+
+def reduced_params(paramtree, measuretree, force_parameters=[]):
+    """
+    Side-effect free and memoized version of :func:`reduce_params`.
+
+    Returns
+    -------
+    :class:`~kt_simul.io.xml_handler.ParamTree`
+        A new tree with the reduced parameters. `paramtree` is not modified.
+    """
+    return REDUCED_PARAMS.get(paramtree, measuretree, force_parameters)
+
+
+class ReducedParamsCache(object):
+    """
+    Cache of reduced parameter trees keyed on the absolute values of the
+    parameters, the measures and the forced parameters.
+
+    Pools of simulations share the same inputs, so :func:`reduce_params`
+    only needs to run once per parameter set. The cache can be pre-warmed
+    with :meth:`warm` before launching simulations.
+
+    Parameters
+    ----------
+    max_size : int
+        Maximum number of cached parameter sets. The oldest ones are
+        dropped first.
+    """
+
+    def __init__(self, max_size=256):
+        self.max_size = max_size
+        self._trees = collections.OrderedDict()
+
+    @staticmethod
+    def key(paramtree, measuretree, force_parameters=[]):
+        return (tuple(sorted(paramtree.absolute_dic.items())),
+                tuple(sorted(measuretree.absolute_dic.items())),
+                tuple(sorted(force_parameters)))
+
+    def warm(self, paramtree, measuretree, force_parameters=[]):
+        """
+        Reduces the parameters and stores the result if not already cached.
+        """
+        key = self.key(paramtree, measuretree, force_parameters)
+        if key in self._trees:
+            return self._trees[key]
+
+        reduced = paramtree.copy()
+        changes = _reduction(paramtree.absolute_dic,
+                             measuretree.absolute_dic,
+                             force_parameters)
+        if changes is not None:
+            reduced.update(**changes)
+
+        self._trees[key] = reduced
+        while len(self._trees) > self.max_size:
+            self._trees.popitem(last=False)
+        return reduced
+
+    def get(self, paramtree, measuretree, force_parameters=[]):
+        """
+        Returns a copy of the reduced tree, computing it if needed.
+        """
+        return self.warm(paramtree, measuretree, force_parameters).copy()
+
+    def clear(self):
+        self._trees.clear()
+
+    def __len__(self):
+        return len(self._trees)
+
+
+REDUCED_PARAMS = ReducedParamsCache()
+
+
+def _reduction(params, measures, force_parameters=[]):
+    """
+    Computes the reduced parameters from the absolute parameters and
+    measures dictionnaries.
+
+    Returns
+    -------
+    dict or None
+        The parameters to change (absolute values), None if a measure is
+        missing.
+    """
     try:
         poleward_speed = measures['poleward_speed']
         metaph_rate = measures['metaph_rate']
@@ -58,8 +166,10 @@ def reduce_params(paramtree, measuretree, force_parameters=[]):
     except KeyError:
         log.warning("The measures dictionary should contain"
                        "at least the following keys: ")
-        log.warning(list(MEASURES.keys()))
-        return False
+        log.warning(list(get_measuretree().absolute_dic.keys()))
+        return None
+
+    params = dict(params)
 
     k_a = params['k_a']  # 'free' attachement event frequency
     k_d0 = params['k_d0']  # 'free' detachement event frequency
@@ -112,7 +222,7 @@ def reduce_params(paramtree, measuretree, force_parameters=[]):
     kappa_k = params['kappa_k']
 
     # Ensure we have sufficientely small time steps
-    dt = params['dt']
+    # dt = params['dt']
     # params['dt'] = min(tau_c / 4., tau_k / 4., params['dt'])
     # if params['dt'] != dt:
     #     log.info('Time step changed')
@@ -120,23 +230,21 @@ def reduce_params(paramtree, measuretree, force_parameters=[]):
     mus = params['mus']
     Fmz = (Fk * N * Mk * alpha_mean * (1 + metaph_rate / (2 * Vk))
            + mus * metaph_rate / 2.) / (1 - metaph_rate / Vmz)
-    
+
     if 'Fmz' not in force_parameters:
         params['Fmz'] = Fmz
 
     muc = (tau_c * kappa_c)
     if 'muc' not in force_parameters:
         params['muc'] = muc
-        print(muc)
 
     muk = (tau_k * kappa_k)
     if 'muk' not in force_parameters:
         params['muk'] = muk
-    
+
     muco = (tau_k * kappa_c)
     if 'muco' not in force_parameters:
         params['muco'] = muco
-        
-    for key, val in list(params.items()):
-        if key not in force_parameters:
-            paramtree.change_dic(key, val, verbose=False)
+
+    return dict((key, val) for key, val in params.items()
+                if key not in force_parameters)
@@ -0,0 +1,45 @@
+cimport cython
+from numpy.random cimport bitgen_t
+
+cdef class RandomSource:
+    cdef readonly unicode kind
+    cdef readonly object generator, bit_generator
+    cdef readonly Py_ssize_t buffer_size
+    cdef bitgen_t *rng
+    cdef object _buffer
+    cdef double *buf
+    cdef Py_ssize_t index
+    cdef object _lag
+    cdef bitgen_t *lag_rng
+    cdef Py_ssize_t lag_gap
+    cdef void _refill(RandomSource) nogil
+    cdef _follow(RandomSource)
+
+    cdef inline double uniform(self) nogil:
+        if self.index == self.buffer_size:
+            self._refill()
+        self.index += 1
+        return self.buf[self.index - 1]
+
+
+@cython.cdivision(True)
+cdef inline int binomial_inversion(int n, double p, double u) nogil:
+    """
+    Number of successes among `n` trials of probability `p`, by inversion
+    of the cumulative distribution at the uniform number `u`. Costs one
+    uniform number whatever `n`, and about `n * p` operations.
+    """
+    cdef int k = 0
+    cdef double q, pmf, cdf
+    if p <= 0 or n <= 0:
+        return 0
+    if p >= 1:
+        return n
+    q = 1 - p
+    pmf = q ** n
+    cdf = pmf
+    while u > cdf and k < n:
+        pmf *= (n - k) / (k + 1.) * p / q
+        k += 1
+        cdf += pmf
+    return k
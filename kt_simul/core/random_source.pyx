@@ -0,0 +1,216 @@
+# -*- coding: utf-8 -*-
+"""
+Buffered source of random numbers for the simulation.
+
+:class:`RandomSource` wraps a numpy `Generator` (PCG64 by default, or
+Philox) or, to reproduce the results of earlier versions, a legacy
+`RandomState`. The uniform numbers used at each step are drawn in bulk in
+a preallocated buffer that the Cython code reads through a C pointer,
+without a Python call per number::
+
+    source = RandomSource(seed=42)
+    dice = source.random()
+
+The numbers are the same as the ones the wrapped generator would give
+one call at a time, so a `RandomSource` of kind 'legacy' gives the same
+stream as `np.random.RandomState(seed)`. Binomial numbers are also drawn
+from the buffer, by inversion of one uniform number each.
+"""
+
+from __future__ import unicode_literals
+from __future__ import division
+from __future__ import absolute_import
+from __future__ import print_function
+
+import numpy as np
+cimport numpy as np
+from cpython.pycapsule cimport PyCapsule_GetPointer
+from libc.math cimport log1p
+
+np.import_array()
+
+__all__ = ["RandomSource", "KINDS"]
+
+KINDS = ('pcg64', 'philox', 'legacy')
+
+
+cdef class RandomSource:
+    """
+    Parameters
+    ----------
+    seed : int or None
+        Seed of the generator, None for a random one
+    kind : {'pcg64', 'philox', 'legacy'}
+        'legacy' uses `np.random.RandomState`, the generator of the previous
+        versions, the other kinds a `np.random.Generator` with the
+        corresponding bit generator.
+    buffer_size : int
+        Number of uniform numbers drawn at once
+    generator : `np.random.Generator`, `np.random.RandomState` or None
+        An existing generator to wrap instead of creating one. `seed` and
+        `kind` are then ignored.
+
+    Notes
+    -----
+    Like the numpy generators, a `RandomSource` must not be used by
+    several threads at the same time.
+    """
+
+    def __init__(self, seed=None, kind='pcg64', buffer_size=4096,
+                 generator=None):
+        if generator is None:
+            if kind == 'legacy':
+                generator = np.random.RandomState(seed)
+            elif kind == 'pcg64':
+                generator = np.random.Generator(np.random.PCG64(seed))
+            elif kind == 'philox':
+                generator = np.random.Generator(np.random.Philox(seed))
+            else:
+                raise ValueError("Unknown kind of random source '%s', "
+                                 "expected one of %s" % (kind, KINDS))
+        if isinstance(generator, np.random.RandomState):
+            kind = 'legacy'
+            bit_generator = generator._bit_generator
+        else:
+            bit_generator = generator.bit_generator
+            kind = type(bit_generator).__name__.lower()
+        self.kind = kind
+        self.generator = generator
+        self.bit_generator = bit_generator
+        self.rng = <bitgen_t *> PyCapsule_GetPointer(bit_generator.capsule,
+                                                     b"BitGenerator")
+        # Copy of the bit generator lagging `lag_gap` numbers behind, at the
+        # start of the buffer once it is filled, so that `sync` can put the
+        # generator back without the state having to be saved at each refill
+        self._lag = type(bit_generator)()
+        self._lag.state = bit_generator.state
+        self.lag_rng = <bitgen_t *> PyCapsule_GetPointer(self._lag.capsule,
+                                                         b"BitGenerator")
+        self.lag_gap = 0
+        self.buffer_size = max(int(buffer_size), 1)
+        self._buffer = np.empty(self.buffer_size)
+        self.buf = <double *> np.PyArray_DATA(self._buffer)
+        # The buffer is filled on first use
+        self.index = self.buffer_size
+
+    cdef void _refill(self) nogil:
+        """
+        Draws `buffer_size` uniform numbers, like `Generator.random` and
+        `RandomState.random_sample` do
+        """
+        cdef Py_ssize_t i
+        for i in range(self.lag_gap):
+            self.lag_rng.next_double(self.lag_rng.state)
+        for i in range(self.buffer_size):
+            self.buf[i] = self.rng.next_double(self.rng.state)
+        self.lag_gap = self.buffer_size
+        self.index = 0
+
+    def sync(self):
+        """
+        Puts the generator back just after the last consumed uniform
+        number, dropping the rest of the buffer. Called before any draw
+        which doesn't go through the buffer, so that the order of the
+        numbers doesn't depend on the buffering.
+        """
+        cdef Py_ssize_t i
+        if self.index == self.buffer_size:
+            return
+        for i in range(self.index):
+            self.lag_rng.next_double(self.lag_rng.state)
+        self.bit_generator.state = self._lag.state
+        self.lag_gap = 0
+        self.index = self.buffer_size
+
+    cdef _follow(self):
+        """
+        Moves the lagging copy to the generator after draws which don't go
+        through the buffer
+        """
+        self._lag.state = self.bit_generator.state
+        self.lag_gap = 0
+
+    def random(self, size=None):
+        """
+        Returns uniform numbers in [0, 1), a float if `size` is None.
+        """
+        if size is None:
+            return self.uniform()
+        out = np.empty(size)
+        cdef double[::1] flat = out.reshape(-1)
+        cdef Py_ssize_t i
+        for i in range(flat.shape[0]):
+            flat[i] = self.uniform()
+        return out
+
+    def normal(self, loc=0.0, scale=1.0, size=None):
+        self.sync()
+        draws = self.generator.normal(loc, scale, size)
+        self._follow()
+        return draws
+
+    def binomial(self, n, p, size=None):
+        """
+        Returns binomial numbers of `n` trials of probability `p`, like
+        `Generator.binomial`, each drawn from one uniform number of the
+        buffer (see `binomial_inversion`). The rare draws too large for the
+        inversion, with `(1 - p) ** n` below the smallest double, are left
+        to the generator.
+        """
+        n_arr = np.asarray(n)
+        p_arr = np.asarray(p, dtype=np.double)
+        if (n_arr < 0).any():
+            raise ValueError("n < 0")
+        if not ((p_arr >= 0) & (p_arr <= 1)).all():
+            raise ValueError("p < 0, p > 1 or p is NaN")
+        if size is None:
+            n_arr, p_arr = np.broadcast_arrays(n_arr, p_arr)
+        else:
+            n_arr = np.broadcast_to(n_arr, size)
+            p_arr = np.broadcast_to(p_arr, size)
+        out = np.empty(n_arr.shape, dtype=np.int64)
+        cdef long[::1] trials = np.ascontiguousarray(n_arr,
+                                                     dtype=np.int_).reshape(-1)
+        cdef double[::1] probs = np.ascontiguousarray(p_arr).reshape(-1)
+        cdef np.int64_t[::1] draws = out.reshape(-1)
+        cdef Py_ssize_t i
+        cdef double q
+        for i in range(draws.shape[0]):
+            q = min(probs[i], 1 - probs[i])
+            if q > 0 and trials[i] * log1p(-q) < -700:
+                self.sync()
+                draws[i] = self.generator.binomial(trials[i], probs[i])
+                self._follow()
+            elif probs[i] > 0.5:
+                draws[i] = trials[i] - binomial_inversion(
+                    trials[i], 1 - probs[i], self.uniform())
+            else:
+                draws[i] = binomial_inversion(trials[i], probs[i],
+                                              self.uniform())
+        if out.ndim == 0:
+            return int(out)
+        return out
+
+    def choice(self, a, size=None, replace=True, p=None):
+        self.sync()
+        draws = self.generator.choice(a, size, replace, p)
+        self._follow()
+        return draws
+
+    property state:
+        """
+        State of the bit generator, which can be set back to replay the
+        numbers
+        """
+        def __get__(self):
+            self.sync()
+            return self.bit_generator.state
+
+        def __set__(self, state):
+            self.bit_generator.state = state
+            self._lag.state = state
+            self.lag_gap = 0
+            self.index = self.buffer_size
+
+    def __repr__(self):
+        return "RandomSource(kind='%s')" % self.kind
@@ -0,0 +1,348 @@
+"""
+Reduced model of the spindle, for large numbers of attachment sites.
+
+The attachment sites relax to their centromere with the time scale
+:math:`\\mu_k / \\kappa_k`, much shorter than the attachment dynamics.
+Their equations are eliminated adiabatically: each site moves with its
+centromere, at the offset where its spring balances the force of its
+kMT,
+
+.. math::
+
+    x_{nm} = X_n + \\frac{\\pi_{nm}(1 + \\dot{x}_{spb}) -
+    p_{nm}\\dot{X}_n}{\\kappa_k}
+
+so that the force balance only involves the pole and the centromeres,
+:math:`1 + 2N` degrees of freedom instead of :math:`1 + 2N(M_k + 1)`.
+The sites of a centromere are three populations, unattached, attached to
+the left pole and attached to the right pole, and the attachments and
+detachments of each step are drawn from binomial distributions instead of
+site by site.
+
+The reduced model is chosen with the `model` argument of
+:class:`~kt_simul.core.simul_spindle.Metaphase`. The trajectories and
+attachment histories of the sites are still recorded, so the analysis is
+the same as for the full model. Its accuracy is checked against the full
+model with :mod:`kt_simul.benchmarks.reduced_model`.
+
+The elimination assumes that each site can sit at its offset. When the
+spindle collapses, the sites are pinned between the poles: the full model
+then transmits no spring force through them, while the reduced model still
+transmits the whole kMT force. The reduced model follows the collapses of
+the metaphase of the full model, but with many attachment sites (about
+`Mk` > 50 with the default parameters) it can stay collapsed through the
+anaphase while the full spindle elongates. It then raises
+:class:`ReducedModelBreakdown`, and the full model must be used.
+"""
+
+from __future__ import unicode_literals
+from __future__ import division
+from __future__ import absolute_import
+from __future__ import print_function
+
+import numpy as np
+
+__all__ = ["ReducedDynamics", "ReducedModelBreakdown"]
+
+# Records buffered before being written to the trajectories
+BUFFER_SIZE = 1024
+
+
+class ReducedModelBreakdown(Exception):
+    pass
+
+
+class ReducedDynamics(object):
+    """
+    Runs the steps of a
+    :class:`~kt_simul.core.spindle_dynamics.KinetoDynamics` with the
+    reduced model, reading and writing its state with
+    :meth:`~KinetoDynamics.get_state` and :meth:`~KinetoDynamics.set_state`.
+
+    The state vector holds the right pole then the centromeres, centromere
+    `c = 2 * n + side` at index `c + 1`. The sites are held as arrays of
+    shape `(2N, Mk)`.
+    """
+
+    def __init__(self, KD):
+        self.KD = KD
+        self.N = KD.params.N
+        self.Mk = KD.params.Mk
+        n_cen = 2 * self.N
+        # Sign of the cohesin drag term, + for A and - for B
+        self.side = np.tile([1., -1.], self.N)
+        # Index of the sister centromere
+        self.sister = np.arange(n_cen) ^ 1
+        # Organites: the poles, then each chromosome with its centromeres,
+        # then the sites
+        self.ch_index = 2 + 3 * np.arange(self.N)
+        self.cen_index = np.column_stack((self.ch_index + 1,
+                                          self.ch_index + 2)).ravel()
+        self.site_slice = slice(2 + 3 * self.N, None)
+        self.P_att = np.array([[plugsite.P_att for plugsite in cen.plugsites]
+                               for ch in KD.chromosomes
+                               for cen in (ch.cen_A, ch.cen_B)])
+        # Anaphase steps with a collapsed spindle
+        self.collapsed = 0
+
+    def _load(self):
+        KD = self.KD
+        p = KD.params
+        self.h = p.Vk * p.dt
+        self.kappa_k = p.kappa_k
+        self.kappa_c = p.kappa_c
+        self.mus = p.mus
+        self.muc = p.muc
+        self.muco = p.muco
+        self.Fmz = p.Fmz
+        self.Vmz = p.Vmz
+        self.d0 = p.d0
+        self.k_a = p.k_a
+        self.d_alpha = p.d_alpha
+        self.orientation = p.orientation
+        self.ldep = p.ldep
+        self.ldep_balance = p.ldep_balance
+        self.t_A = p.t_A
+        self.sac = p.sac
+        self.dt = p.dt
+
+        n_cen = 2 * self.N
+        B = np.zeros((n_cen + 1, n_cen + 1))
+        cen = np.arange(n_cen) + 1
+        B[cen, cen] = -self.kappa_c
+        B[cen, self.sister + 1] = self.kappa_c
+        self.B = B
+
+        state = KD.get_state(start=KD.num_records)
+        self.state = state
+        self.pos = state['pos'].astype(float)
+        self.last_disp = state['last_disp'].astype(float)
+        self.states = state['plug_state'].reshape(n_cen, self.Mk).copy()
+        self.last_transition = state['last_transition'].reshape(
+            n_cen, self.Mk).copy()
+        # Not updated with the initial attachment states, as in the full
+        # model
+        self.plugged = state['plugged'].reshape(n_cen, self.Mk).astype(bool)
+        self.anaphase = state['anaphase']
+        self._records = []
+        self._transitions = []
+
+    def _store(self, time_point):
+        KD = self.KD
+        self._flush()
+        k = KD.record_every
+        nxt = (time_point + k) // k
+        plugsites = KD.all_plugsites
+        for sites, t, new in self._transitions:
+            first = (t + k - 1) // k
+            for s, value in zip(sites, new):
+                plugsites[s].state_hist[first:nxt] = value
+        self._transitions = []
+        state = self.state
+        n_sites = len(plugsites)
+        pos = self.pos
+        state.update({
+            'time_point': time_point,
+            'anaphase': self.anaphase,
+            'start': nxt,
+            'pos': pos,
+            'last_pos': pos,
+            'last_disp': self.last_disp,
+            'traj': np.empty((len(pos), 0)),
+            'plug_state': self.states.ravel(),
+            'plugged': self.plugged.astype(int).ravel(),
+            'last_transition': self.last_transition.ravel(),
+            'state_hist': np.empty((n_sites, 0), dtype=int)})
+        KD.set_state(state)
+
+    def _flush(self):
+        if not self._records:
+            return
+        first = self._records[0][0]
+        last = self._records[-1][0] + 1
+        values = np.array([pos for _, pos in self._records])
+        chromosomes = set(self.ch_index)
+        for i, organite in enumerate(self.KD.organites()):
+            # The chromosomes don't move
+            if i not in chromosomes:
+                organite.traj[first:last] = values[:, i]
+        self._records = []
+
+    def _anaphase_due(self, time_point):
+        if time_point * self.dt < self.t_A:
+            return False
+        if self.sac == 0:
+            return True
+        return bool(((self.states != 0).any(axis=1)).all())
+
+    def _site_pos(self):
+        return self.pos[self.site_slice].reshape(self.states.shape)
+
+    def _centers(self):
+        X = self.pos[self.cen_index]
+        return np.repeat((X[0::2] + X[1::2]) / 2., 2)
+
+    def _P_det(self, time_point):
+        """
+        Detachment probability of each site, see :meth:`PlugSite.P_det`
+        """
+        if self.d_alpha == 0:
+            return np.full(self.states.shape, self.k_a)
+        dist = np.abs(self._site_pos() - self._centers()[:, None])
+        # Certain detachment at a null distance
+        k_dc = self.k_a * self.d_alpha / np.maximum(dist, 1e-300)
+        certain = k_dc > 1e4
+        if time_point > 1:
+            shrink = (self.last_disp[self.site_slice].reshape(
+                self.states.shape) * self.states) > 0
+            k_dc[shrink] *= 0.2
+        k_dc[certain] = np.inf
+        return 1 - np.exp(-k_dc)
+
+    def _plug_unplug(self, time_point):
+        states = self.states
+        prng = self.KD.prng
+        left = states == -1
+        right = states == 1
+        free = states == 0
+        n_left = left.sum(axis=1)
+        n_right = right.sum(axis=1)
+        n_free = free.sum(axis=1)
+        n_plugged = n_left + n_right
+
+        P_det = self._P_det(time_point)
+        P_left = (P_det * left).sum(axis=1) / np.maximum(n_left, 1)
+        P_right = (P_det * right).sum(axis=1) / np.maximum(n_right, 1)
+        P_att = (self.P_att * free).sum(axis=1) / np.maximum(n_free, 1)
+        detach_left, detach_right, attach = prng.binomial(
+            [n_left, n_right, n_free], [P_left, P_right, P_att])
+        # Same orientation rule as Centromere.P_attachleft
+        P_attachleft = 0.5 + (self.orientation * (n_left - n_right) /
+                              (2. * np.maximum(n_plugged, 1)))
+        attach_left = prng.binomial(attach, P_attachleft)
+
+        if not (detach_left.any() or detach_right.any() or attach.any()):
+            return
+        # Rank of each site in its population, in a random order
+        keys = prng.random(states.shape) + 2 * left + 4 * right
+        rank = np.argsort(np.argsort(keys, axis=1), axis=1)
+        rank -= np.where(left, n_free[:, None],
+                         np.where(right, (n_free + n_left)[:, None], 0))
+        new = states.copy()
+        new[left & (rank < detach_left[:, None])] = 0
+        new[right & (rank < detach_right[:, None])] = 0
+        new[free & (rank < attach_left[:, None])] = -1
+        new[free & (rank >= attach_left[:, None]) &
+            (rank < attach[:, None])] = 1
+
+        changed = new != states
+        self.last_transition[changed] = max(time_point, 0)
+        self.plugged[changed] = new[changed] != 0
+        self._transitions.append((np.flatnonzero(changed), time_point,
+                                  new[changed]))
+        self.states = new
+
+    def _forces(self):
+        """
+        Returns the kMT force factor `pi` and the plugged flags of each
+        site
+        """
+        states = self.states
+        plugged = self.plugged.astype(float)
+        pi = states.astype(float)
+        if not self.anaphase and self.ldep <= 1 / self.ldep_balance:
+            lbase = 1 - self.ldep * self.ldep_balance
+            mt_length = np.abs(self.pos[0] * states - self._site_pos())
+            pi *= self.ldep * mt_length + lbase
+        return pi, plugged
+
+    def _solve(self, pi, plugged):
+        """
+        Speeds of the pole and the centromeres, the sites moving with their
+        centromere
+        """
+        n_cen = 2 * self.N
+        Pi = pi.sum(axis=1)
+        P = plugged.sum(axis=1)
+        cen = np.arange(n_cen) + 1
+        A = np.zeros((n_cen + 1, n_cen + 1))
+        A[0, 0] = -2 * self.mus - 4 * self.Fmz / self.Vmz - P.sum()
+        A[0, cen] = Pi
+        A[cen, 0] = Pi
+        A[cen, cen] = -self.muc + self.side * self.muco - P
+
+        X = self.pos[self.cen_index]
+        delta1 = np.where(X[0::2] < X[1::2], 1., -1.)
+        C = np.empty(n_cen + 1)
+        C[0] = 2 * self.Fmz - P.sum()
+        C[cen] = Pi + np.repeat(delta1, 2) * self.side * (
+            -self.kappa_c * self.d0)
+
+        Y = np.concatenate(([self.pos[0]], X))
+        if self.KD.integrator == 'implicit':
+            A = A + self.h * self.B
+        return np.linalg.solve(A, -(self.B.dot(Y) + C))
+
+    def _step(self, time_point):
+        if not self.anaphase:
+            self._plug_unplug(time_point)
+        pi, plugged = self._forces()
+        speeds = self._solve(pi, plugged)
+
+        pos = self.pos
+        old = pos.copy()
+        # The poles can't cross, as with Organite.set_pos: a collapsed
+        # spindle stays in place instead of drifting
+        pos[0] = max(pos[0] + speeds[0] * self.h, pos[1])
+        pos[1] = min(pos[1] - speeds[0] * self.h, pos[0])
+        if self.anaphase and pos[0] <= pos[1]:
+            self.collapsed += 1
+            # The spindle may still be collapsed at the anaphase onset
+            if self.collapsed > 1:
+                raise ReducedModelBreakdown(
+                    "The spindle stays collapsed in anaphase at time point "
+                    "%i: the sites are pinned between the poles and can't "
+                    "be slaved to their centromere, use the full model" %
+                    time_point)
+        right, left = pos[0], pos[1]
+        X = pos[self.cen_index] + speeds[1:] * self.h
+        X = np.minimum(np.maximum(X, left), right)
+        pos[self.cen_index] = X
+        offset = (pi * (1 + speeds[0]) -
+                  plugged * speeds[1:, None]) / self.kappa_k
+        sites = np.minimum(np.maximum(X[:, None] + offset, left), right)
+        pos[self.site_slice] = sites.ravel()
+        # Single precision, as the positions of the organites
+        pos[:] = pos.astype(np.float32)
+        disp = pos - old
+        disp[self.ch_index] = self.last_disp[self.ch_index]
+        self.last_disp = disp
+
+        k = self.KD.record_every
+        if time_point % k == 0:
+            self._records.append((time_point // k, pos.copy()))
+            if len(self._records) >= BUFFER_SIZE:
+                self._flush()
+
+    def run(self, start, stop):
+        """
+        Runs the time points from `start` to `stop` (excluded). Before a
+        time point after `start`, stops if the anaphase onset is due, so
+        that it is handled by the caller.
+
+        Returns
+        -------
+        int
+            The first time point which has not been run
+        """
+        self._load()
+        time_point = start
+        while time_point < stop:
+            if (time_point > start and not self.anaphase and
+                    self._anaphase_due(time_point)):
+                break
+            self.KD.time_point = time_point
+            self._step(time_point)
+            time_point += 1
+        self._store(time_point - 1)
+        return time_point
@@ -0,0 +1,182 @@
+"""
+Per time point reports of a simulation.
+
+The layout of the report is formatted once into a template; the values of
+all the time points are gathered in a single array. A text report is then
+a single string formatting operation, and machine-readable records of
+many time points are produced at once::
+
+    engine = ReportEngine(meta)
+    print(engine.text(100))
+    records = engine.records()          # all the time points
+    engine.to_json("report.json", times=range(0, 1000, 10))
+"""
+
+from __future__ import unicode_literals
+from __future__ import division
+from __future__ import absolute_import
+from __future__ import print_function
+
+import json
+import collections
+
+import numpy as np
+
+from kt_simul.utils.format import pretty_dict
+
+__all__ = ["ReportEngine"]
+
+
+class ReportEngine(object):
+    """
+    Reports of a simulated :class:`~kt_simul.core.simul_spindle.Metaphase`
+    at any time point.
+
+    Attributes
+    ----------
+    template : str
+        Text report layout, see :meth:`text`
+    columns : list of str
+        Name of each value of the records, e.g. 'spbR', 'ch0.correct.A',
+        'ch0.A.pos', 'ch0.A.site1.state'
+    values : array of shape (T, len(columns))
+        Value of each column at each time point
+    """
+
+    def __init__(self, meta):
+
+        KD = meta.KD
+        params = meta.paramtree.relative_dic
+        self.dt = float(params["dt"])
+
+        columns = []
+        placeholders = []
+        arrays = []
+        # Columns rounded in text reports
+        rounded = []
+
+        def field(name, array, placeholder, rounding=False):
+            columns.append(name)
+            placeholders.append(placeholder)
+            arrays.append(np.asarray(array, dtype=float))
+            rounded.append(rounding)
+            return placeholder
+
+        def literal(value):
+            return ("%s" % value).replace("%", "%%")
+
+        report = collections.OrderedDict()
+
+        report["Total time (span)"] = literal(params["span"])
+        report["Time precision (dt)"] = literal(params["dt"])
+        report["Chromosomes (N)"] = literal(params["N"])
+        report["Kinetochores (Mk)"] = literal(params["Mk"])
+        report["separate"] = ""
+
+        report["Current time"] = "%i\n"
+
+        report["spbR pos"] = field("spbR", KD.spbR.traj, "%s", True)
+        report["spbL pos"] = field("spbL", KD.spbL.traj, "%s", True)
+
+        for ch in KD.chromosomes:
+            prefix = "ch%i" % ch.ch_id
+            correct = np.asarray(ch.correct_history)
+            erroneous = np.asarray(ch.erroneous_history)
+            chdict = collections.OrderedDict()
+            chdict["correct"] = "[%s %s]" % (
+                field(prefix + ".correct.A", correct[:, 0], "%d"),
+                field(prefix + ".correct.B", correct[:, 1], "%d"))
+            chdict["erroneous"] = "[%s %s]" % (
+                field(prefix + ".erroneous.A", erroneous[:, 0], "%d"),
+                field(prefix + ".erroneous.B", erroneous[:, 1], "%d"))
+            for cent in [ch.cen_A, ch.cen_B]:
+                cen_prefix = "%s.%s" % (prefix, cent.tag)
+                cen_dict = collections.OrderedDict()
+                cen_dict["position"] = field(cen_prefix + ".pos", cent.traj,
+                                             "%s", True)
+                for site in cent.plugsites:
+                    site_prefix = "%s.site%i" % (cen_prefix, site.site_id)
+                    site_dict = collections.OrderedDict()
+                    site_dict['position'] = field(site_prefix + ".pos",
+                                                  site.traj, "%s", True)
+                    site_dict['Plug state'] = field(site_prefix + ".state",
+                                                    site.state_hist, "%d")
+                    cen_dict["PlugSite %i" % site.site_id] = site_dict
+
+                chdict["Centromere %s" % cent.tag] = cen_dict
+
+            report["Chromosome %i" % ch.ch_id] = chdict
+
+        self.template = pretty_dict(report)
+        self.columns = columns
+        self._placeholders = placeholders
+        self.values = np.column_stack(arrays)
+        # Time of each time point, files saved with `decimate` skip some
+        timelapse = np.asarray(meta.timelapse, dtype=float)
+        if len(timelapse) != len(self.values):
+            timelapse = np.arange(len(self.values)) * self.dt
+        self.timelapse = timelapse
+        self._rounded = np.array(rounded)
+
+    def __len__(self):
+        return self.values.shape[0]
+
+    def _times(self, times):
+        if times is None:
+            return np.arange(len(self))
+        return np.atleast_1d(np.asarray(times, dtype=int))
+
+    def texts(self, times=None):
+        """
+        Text reports of several time points (all of them by default).
+
+        Returns
+        -------
+        list of str
+        """
+        times = self._times(times)
+        values = self.values[times]
+        values[:, self._rounded] = np.round(values[:, self._rounded], 3)
+        # "Current time" comes first in the template, the decimated time
+        # points are spaced by `record_every` steps
+        current = self.timelapse[times, None]
+        rows = np.hstack([current, values]).tolist()
+        template = self.template
+        return [template % tuple(row) for row in rows]
+
+    def text(self, time=0):
+        """
+        Text report at `time` (a time point), in the format of
+        :meth:`Metaphase.get_report`.
+        """
+        return self.texts([time])[0]
+
+    def records(self, times=None):
+        """
+        Reports of several time points (all of them by default) as a list
+        of dicts with a 'time_point' and a 'time' key plus one key per
+        column.
+        """
+        times = self._times(times)
+        columns = ['time_point', 'time'] + self.columns
+        table = np.hstack([times[:, None], self.timelapse[times, None],
+                           self.values[times]])
+        records = [dict(zip(columns, row)) for row in table.tolist()]
+        integers = ['time_point'] + [name for name, placeholder
+                                     in zip(self.columns, self._placeholders)
+                                     if placeholder == "%d"]
+        for record in records:
+            for name in integers:
+                record[name] = int(record[name])
+        return records
+
+    def to_json(self, fname=None, times=None):
+        """
+        Dumps :meth:`records` to `fname` as JSON, or returns the JSON
+        string if `fname` is None.
+        """
+        records = self.records(times)
+        if fname is None:
+            return json.dumps(records)
+        with open(fname, 'w') as f:
+            json.dump(records, f)
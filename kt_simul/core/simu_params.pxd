@@ -0,0 +1,12 @@
+cdef class SimuParams:
+    cdef readonly int N, Mk
+    cdef readonly double span, dt, t_A
+    cdef readonly double d_alpha, orientation, sac, ldep, ldep_balance
+    cdef readonly double k_a, k_d0
+    cdef readonly double mus, L0, d0, k_spb
+    cdef readonly double kappa_c, kappa_k
+    cdef readonly double muc, muk, muco
+    cdef readonly double Vk, Vmz, Fk, Fmz
+    cdef readonly unsigned long version
+    cdef dict _values
+    cdef int _assign(SimuParams, object, object) except -1
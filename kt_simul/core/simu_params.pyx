@@ -0,0 +1,141 @@
+# -*- coding: utf-8 -*-
+"""
+Typed, immutable view of the simulation parameters used in the hot loop.
+
+The parameters are compiled once from a :class:`~kt_simul.io.xml_handler.ParamTree`
+dictionnary so the Cython code reads C attributes instead of doing string
+keyed dictionnary lookups. The only way to change a parameter during a
+simulation (anaphase onset, laser ablation) is :meth:`SimuParams.set`, which
+bumps :attr:`SimuParams.version` so cached quantities can be refreshed.
+"""
+
+from __future__ import unicode_literals
+from __future__ import division
+from __future__ import absolute_import
+from __future__ import print_function
+
+__all__ = ["SimuParams"]
+
+
+cdef class SimuParams:
+    """
+    Parameters
+    ----------
+    params : dict
+        A relative parameters dictionnary as obtained from
+        :attr:`ParamTree.relative_dic` (with `Vk`, `Fk` and `dt` reset to
+        their absolute value).
+
+    Attributes
+    ----------
+    version : int
+        Incremented each time a parameter is changed with :meth:`set`
+
+    Parameters are readable both as attributes (`params.Mk`) and as
+    dictionnary items (`params['Mk']`).
+    """
+
+    def __init__(self, params):
+        self._values = {}
+        for key, value in params.items():
+            self._assign(key, value)
+        self.version = 0
+
+    cdef int _assign(self, object key, object value) except -1:
+        self._values[key] = value
+        if key == 'N':
+            self.N = int(value)
+        elif key == 'Mk':
+            self.Mk = int(value)
+        elif key == 'span':
+            self.span = value
+        elif key == 'dt':
+            self.dt = value
+        elif key == 't_A':
+            self.t_A = value
+        elif key == 'd_alpha':
+            self.d_alpha = value
+        elif key == 'orientation':
+            self.orientation = value
+        elif key == 'sac':
+            self.sac = value
+        elif key == 'ldep':
+            self.ldep = value
+        elif key == 'ldep_balance':
+            self.ldep_balance = value
+        elif key == 'k_a':
+            self.k_a = value
+        elif key == 'k_d0':
+            self.k_d0 = value
+        elif key == 'mus':
+            self.mus = value
+        elif key == 'L0':
+            self.L0 = value
+        elif key == 'd0':
+            self.d0 = value
+        elif key == 'k_spb':
+            self.k_spb = value
+        elif key == 'kappa_c':
+            self.kappa_c = value
+        elif key == 'kappa_k':
+            self.kappa_k = value
+        elif key == 'muc':
+            self.muc = value
+        elif key == 'muk':
+            self.muk = value
+        elif key == 'muco':
+            self.muco = value
+        elif key == 'Vk':
+            self.Vk = value
+        elif key == 'Vmz':
+            self.Vmz = value
+        elif key == 'Fk':
+            self.Fk = value
+        elif key == 'Fmz':
+            self.Fmz = value
+        return 0
+
+    def set(self, key, value):
+        """
+        Changes the value of a parameter and increments :attr:`version`.
+        """
+        if key not in self._values:
+            raise KeyError("Unknown parameter %s" % key)
+        self._assign(key, value)
+        self.version += 1
+
+    def __getitem__(self, key):
+        return self._values[key]
+
+    def __contains__(self, key):
+        return key in self._values
+
+    def __iter__(self):
+        return iter(self._values)
+
+    def __len__(self):
+        return len(self._values)
+
+    def get(self, key, default=None):
+        return self._values.get(key, default)
+
+    def keys(self):
+        return self._values.keys()
+
+    def items(self):
+        return self._values.items()
+
+    def to_dict(self):
+        """
+        Returns a copy of the parameters as a dictionnary
+        """
+        return dict(self._values)
+
+    def __reduce__(self):
+        return (SimuParams, (self.to_dict(),), self.version)
+
+    def __setstate__(self, version):
+        self.version = version
+
+    def __repr__(self):
+        return "SimuParams(version=%i, %r)" % (self.version, self._values)
@@ -13,17 +13,31 @@ from __future__ import absolute_import
 from __future__ import print_function
 
 import logging
+import warnings
 import numpy as np
-import collections
 
-import pyximport
-pyximport.install(setup_args={'include_dirs': np.get_include()})
-
-from ..core.spindle_dynamics import KinetoDynamics
+try:
+    from ..core.spindle_dynamics import KinetoDynamics
+    from ..core.simu_params import SimuParams
+    from ..core.random_source import RandomSource
+except ImportError:
+    # Development checkout where `python setup.py build_ext --inplace`
+    # has not been run: compile the extensions on the fly
+    import pyximport
+    pyximport.install(setup_args={'include_dirs': np.get_include()})
+    from ..core.spindle_dynamics import KinetoDynamics
+    from ..core.simu_params import SimuParams
+    from ..core.random_source import RandomSource
+    logging.getLogger(__name__).warning(
+        "Cython extensions compiled with pyximport, build them "
+        "with `python setup.py build_ext --inplace` for a faster startup")
 from ..io.xml_handler import ParamTree
+from ..io.checkpoint import Checkpointer, load_checkpoint
 from ..core import parameters
-from ..utils.progress import pprogress
-from ..utils.format import pretty_dict
+from ..utils.progress import Progress, TerminalSink
+from ..utils.profiling import Profiler
+from ..utils.memory import estimate_memory, available_memory, MB
+from .report import ReportEngine
 
 log = logging.getLogger(__name__)
 
@@ -33,8 +47,18 @@ CURRENT_DIR = parameters.CURRENT_DIR
 ROOT_DIR = parameters.ROOT_DIR
 PARAMFILE = parameters.PARAMFILE
 MEASUREFILE = parameters.MEASUREFILE
-MEASURETREE = parameters.MEASURETREE
-MEASURES = parameters.MEASURES
+
+# Maximum number of steps between two checks of the checkpoint clock
+CHECKPOINT_CHUNK = 10000
+# Maximum number of steps between two calls to the `publish` argument of
+# Metaphase.simul
+PUBLISH_CHUNK = 100
+
+
+def __getattr__(name):
+    if name in ('MEASURETREE', 'MEASURES'):
+        return getattr(parameters, name)
+    raise AttributeError("module %s has no attribute %s" % (__name__, name))
 
 
 class SimulationAlreadyDone(Exception):
@@ -119,11 +143,83 @@ class Metaphase(object):
     reduce_p : bool
         If True, changes the parameters according to the measures
         so that the simulation average behaviour complies with
-        the data in the measures dictionary
+        the data in the measures dictionary. The reduced parameters are
+        memoized (see :func:`~kt_simul.core.parameters.reduced_params`) and
+        the paramtree argument is not modified.
 
     keep_same_random_seed : bool
         To launch simulations with same random state
 
+    seed : int or None
+        Seed of the random number generator. Two simulations with the same
+        parameters, seed and rng give the same results. Ignored if
+        keep_same_random_seed is True.
+
+    rng : {'pcg64', 'philox', 'legacy'}
+        Kind of random number generator (see
+        :class:`~kt_simul.core.random_source.RandomSource`). 'legacy' gives
+        the results of the versions which used `np.random.RandomState`.
+
+    profile : bool, str or :class:`~kt_simul.utils.profiling.Profiler`
+        If True, the steps and the simulation finalization are timed and
+        counted in `self.profiler` (see
+        :meth:`~kt_simul.utils.profiling.Profiler.report`). The steps are
+        profiled on the code which runs them: the phases of each step
+        (attachments, matrices, solve, positions) and the attachment
+        events are counted under the same names with nogil True or False.
+        The reduced model is only timed as a whole. If 'trace', the
+        phases timed on the object code, and the nogil runs as a whole,
+        are also recorded as Chrome trace events. Defaults to False.
+
+    progress : list of callables or None
+        Sinks receiving the progress events of :meth:`simul` (see
+        :mod:`kt_simul.utils.progress`). If None, a progress bar is
+        drawn when verbose is True.
+
+    record_every : int
+        Only keep one time point every `record_every` in the trajectories
+        and the attachment histories, to reduce the memory of long
+        simulations. The dynamics are not affected.
+
+    memory_guard : bool or 'warn'
+        What to do when the estimated memory of the simulation (see
+        :func:`~kt_simul.utils.memory.estimate_memory`) exceeds the
+        available memory: emit a RuntimeWarning with 'warn' (default),
+        raise a MemoryError with True, instead of failing after a long run, or
+        nothing with False.
+
+    nogil : bool
+        If True (default), :meth:`simul` runs the steps on flat arrays
+        without holding the GIL (see :mod:`~kt_simul.core.flat_dynamics`),
+        so simulations can run in parallel threads. The object code is
+        used when a callback is given to :meth:`simul` or when nogil is
+        False. Both give the same results.
+
+    integrator : {'euler', 'implicit'}
+        Time integration of the positions (see
+        :class:`~kt_simul.core.spindle_dynamics.KinetoDynamics`). The
+        implicit integrator stays stable with larger `dt`. The default
+        explicit integrator is close to its stability limit at the default
+        `dt` of 10 s, see :mod:`~kt_simul.benchmarks.convergence` for the
+        accuracy of the trajectories and of the statistics.
+
+    model : {'full', 'reduced'}
+        With 'reduced', the attachment sites are slaved to their
+        centromere and the attachments are drawn per centromere (see
+        :mod:`~kt_simul.core.reduced_dynamics`). It only pays off for large
+        `Mk`: it is about 10 times faster than the full model at `Mk` = 100,
+        but 10 times slower at the default `Mk` = 4. The steps then always
+        run with :meth:`~kt_simul.core.spindle_dynamics.KinetoDynamics.run`,
+        see :func:`~kt_simul.benchmarks.reduced_model.validate_reduced` for
+        the accuracy of the statistics. Where it doesn't hold, :meth:`simul`
+        raises a
+        :class:`~kt_simul.core.reduced_dynamics.ReducedModelBreakdown`.
+
+    attachment : {'exact', 'tau_leap'}
+        With 'tau_leap', the attachments and detachments of each
+        centromere are drawn in bulk rather than site by site (see
+        :class:`~kt_simul.core.spindle_dynamics.KinetoDynamics`).
+
     """
 
     RANDOM_STATE = None
@@ -132,7 +228,10 @@ class Metaphase(object):
                  paramfile=None, measurefile=None,
                  initial_plug='random', reduce_p=True,
                  verbose=False, keep_same_random_seed=False,
-                 force_parameters=[]):
+                 force_parameters=[], seed=None, profile=False,
+                 progress=None, record_every=1, memory_guard='warn',
+                 nogil=True, rng='pcg64', integrator='euler',
+                 model='full', attachment='exact'):
 
         # Enable or disable log console
         self.verbose = verbose
@@ -157,31 +256,75 @@ class Metaphase(object):
             self.measuretree = measuretree
 
         if reduce_p:
-            parameters.reduce_params(self.paramtree, self.measuretree, force_parameters=force_parameters)
+            self.paramtree = parameters.reduced_params(
+                self.paramtree, self.measuretree,
+                force_parameters=force_parameters)
 
         log.info('Parameters loaded')
 
+        self.initial_plug = initial_plug
+        self.seed = seed
+        self.nogil = nogil
+        self.rng = rng
+        self.integrator = integrator
+        self.model = model
+        self.attachment = attachment
         if keep_same_random_seed:
-            self.prng = self.__class__.get_random_state()
+            self.seed = None
+            self.prng = self.__class__.get_random_state(rng)
         else:
-            self.prng = np.random.RandomState()
+            self.prng = RandomSource(seed, kind=rng)
 
-        params = self.paramtree.relative_dic
+        params = dict(self.paramtree.relative_dic)
         # Reset explicitely the unit parameters to their
         # dimentionalized value
         params['Vk'] = self.paramtree.absolute_dic['Vk']
         params['Fk'] = self.paramtree.absolute_dic['Fk']
         params['dt'] = self.paramtree.absolute_dic['dt']
 
-        self.KD = KinetoDynamics(params, initial_plug=initial_plug, prng=self.prng)
+        self.memory_estimate = estimate_memory(self.paramtree.absolute_dic,
+                                               record_every, save=False)
+        if memory_guard:
+            available = available_memory()
+            if (available is not None and
+                    self.memory_estimate['total'] > available):
+                message = ("The simulation needs about %.0f MB but only "
+                           "%.0f MB are available, use a larger "
+                           "record_every" % (self.memory_estimate['total'] / MB,
+                                             available / MB))
+                if memory_guard == 'warn':
+                    # Shown even when the log is disabled
+                    warnings.warn(message, RuntimeWarning)
+                else:
+                    raise MemoryError(message)
+
+        self.KD = KinetoDynamics(SimuParams(params),
+                                 initial_plug=initial_plug, prng=self.prng,
+                                 record_every=record_every,
+                                 integrator=integrator, model=model,
+                                 attachment=attachment)
+
+        if isinstance(profile, Profiler):
+            self.profiler = profile
+        elif profile:
+            self.profiler = Profiler(trace=(profile == 'trace'))
+        else:
+            self.profiler = None
+        self.KD.profiler = self.profiler
+
+        if progress is None:
+            progress = [TerminalSink()] if verbose else []
+        self.progress_sinks = progress
         dt = self.paramtree.absolute_dic['dt']
         duration = self.paramtree.absolute_dic['span']
         self.num_steps = int(duration / dt)
         self.KD.anaphase = False
-        self.timelapse = np.arange(0, duration, dt)
+        self.timelapse = np.arange(0, duration, dt)[::self.KD.record_every]
         self.report = []
         self.delay = -1
+        self._kappa_c = self.KD.params['kappa_c']
         self.observations = {}
+        self._report_engine = None
 
         log.info('Simulation initialized')
         log.disabled = False
@@ -191,14 +334,18 @@ class Metaphase(object):
                              "blue"]
 
     @classmethod
-    def get_random_state(cls):
+    def get_random_state(cls, rng='pcg64'):
         """
+        Returns a :class:`~kt_simul.core.random_source.RandomSource` of kind
+        `rng`, in the same state for all the instances of the class.
         """
-        prng = np.random.RandomState()
-        if not cls.RANDOM_STATE:
-            cls.RANDOM_STATE = prng.get_state()
+        prng = RandomSource(kind=rng)
+        states = cls.RANDOM_STATE or {}
+        if rng in states:
+            prng.state = states[rng]
         else:
-            prng.set_state(cls.RANDOM_STATE)
+            states[rng] = prng.state
+        cls.RANDOM_STATE = states
         return prng
 
     def __str__(self):
@@ -219,7 +366,8 @@ class Metaphase(object):
 
         return '\n'.join(lines)
 
-    def simul(self, ablat=None, ablat_pos=0.):
+    def simul(self, ablat=None, ablat_pos=0., callback=None, until=None,
+              checkpoint=None, publish=None):
         """
         The simulation main loop.
 
@@ -230,6 +378,27 @@ class Metaphase(object):
             Timepoint at which ablation takes place. If None (default)
             no ablation is performed.
 
+        callback : callable, optional
+            Called as `callback(self, time_point)` after each step. The
+            steps then run on the object code.
+
+        publish : callable, optional
+            Called as `publish(self, time_point)` after at most 100 steps
+            and after the last one, e.g. to publish snapshots of the
+            running simulation (see :mod:`kt_simul.gui.stream`). Unlike
+            `callback`, it doesn't stop the steps from running without
+            the GIL.
+
+        until : int, optional
+            Stop after this time point, leaving the simulation unfinished. A
+            later call to `simul` goes on from there, e.g. after a
+            :meth:`snapshot`.
+
+        checkpoint : str or :class:`~kt_simul.io.checkpoint.Checkpointer`, optional
+            File where the state of the simulation is saved every 10
+            minutes (or at the interval of the `Checkpointer`), see
+            :meth:`resume`.
+
         """
 
         # Check is simulation has already be done
@@ -238,20 +407,44 @@ class Metaphase(object):
                 instance. Please create another Metaphase instance
                 to launch a new simulation.""")
 
-        kappa_c = self.KD.params['kappa_c']
+        if self.KD.time_point == 0:
+            # Restored at the end of the simulation
+            self._kappa_c = self.KD.params['kappa_c']
+        end = self.num_steps
+        if until is not None:
+            end = min(end, int(until) + 1)
 
         if self.verbose:
             log.info('Running simulation')
-        bef = 0
-        log_anaphase_onset = False
+        log_anaphase_onset = self.KD.anaphase
+        if self.profiler is not None:
+            loop_start = self.profiler.clock()
+
+        progress = None
+        if self.progress_sinks:
+            progress = Progress(self.num_steps - 1, name='simul',
+                                unit='steps', sinks=self.progress_sinks)
 
-        for time_point in range(1, self.num_steps):
+        flat = callback is None and (self.model == 'reduced' or self.nogil)
+        checkpointer = checkpoint
+        if checkpoint is not None and not isinstance(checkpoint, Checkpointer):
+            checkpointer = Checkpointer(checkpoint)
 
-            progress = int((time_point * 100.0) / self.num_steps)
+        # Steps run without the GIL between two events
+        chunk = max(self.num_steps // 100, 1)
+        if checkpointer is not None:
+            chunk = min(chunk, CHECKPOINT_CHUNK)
+        if publish is not None:
+            chunk = min(chunk, PUBLISH_CHUNK)
 
-            if self.verbose and progress != bef:
-                pprogress(int(progress))
-                bef = progress
+        time_point = self.KD.time_point + 1
+        while time_point < end:
+
+            if progress is not None:
+                progress.update(time_point - 1)
+
+            if checkpointer is not None and checkpointer.due():
+                checkpointer.save(self, ablat=ablat, ablat_pos=ablat_pos)
 
             # Ablation test
             if ablat == time_point:
@@ -262,73 +455,138 @@ class Metaphase(object):
             # Anaphase transition ?
             if self._anaphase_test(time_point):
                 if not log_anaphase_onset:
-                    pprogress(-1)
+                    if progress is not None:
+                        progress.event('anaphase_onset',
+                                       time_point=time_point,
+                                       delay=self.delay)
                     if self.verbose:
                         log.info("Anaphase onset at %i / %i" %
                                    (time_point, self.num_steps))
                     log_anaphase_onset = True
 
+            if flat:
+                stop = end
+                if (progress is not None or checkpointer is not None or
+                        publish is not None):
+                    stop = min(stop, time_point + chunk)
+                if (ablat is not None and time_point < ablat < stop and
+                        ablat == int(ablat)):
+                    stop = int(ablat)
+                time_point = self.KD.run(time_point, stop)
+                if publish is not None:
+                    publish(self, time_point - 1)
+                continue
+
             self.KD.one_step(time_point)
+            if callback is not None:
+                callback(self, time_point)
+            if publish is not None and (time_point % chunk == 0 or
+                                        time_point == end - 1):
+                publish(self, time_point)
             # if time_point % 100 == 0:
                 # print self.KD.At_mat
+            time_point += 1
 
-        if self.verbose:
-            pprogress(-1)
+        if checkpointer is not None:
+            checkpointer.close()
+
+        if self.profiler is not None:
+            self.profiler.add('main_loop', loop_start, self.profiler.clock())
+
+        if end < self.num_steps:
+            return
+
+        if progress is not None:
+            progress.finish()
 
         if self.verbose:
             log.info('Simulation done')
-        self.KD.params['kappa_c'] = kappa_c
+        self.KD.params.set('kappa_c', self._kappa_c)
         delay_str = "delay = %2d seconds" % self.delay
         self.report.append(delay_str)
 
+        if self.profiler is not None:
+            self._profiled_histories()
+            return
+        self._calc_histories()
+
+    def _calc_histories(self):
+        """
+        Computes the attachment histories of the chromosomes and the times
+        of arrival of the centromeres once the simulation is done
+        """
         for ch in self.KD.chromosomes:
             ch.calc_correct_history()
             ch.calc_erroneous_history()
             ch.cen_A.calc_toa()
             ch.cen_B.calc_toa()
 
-    def get_report(self, time=0):
-        """
-        Print simulation state about a specific time point
-
+    @classmethod
+    def resume(cls, checkpoint, **kwargs):
         """
-        params = self.paramtree.relative_dic
+        Resumes the simulation saved in `checkpoint` by the `checkpoint`
+        argument of :meth:`simul`, and runs it to the end, still saving
+        checkpoints. The results are the same as the ones of an
+        uninterrupted simulation.
 
-        report = collections.OrderedDict()
-
-        report["Total time (span)"] = params["span"]
-        report["Time precision (dt)"] = params["dt"]
-        report["Chromosomes (N)"] = params["N"]
-        report["Kinetochores (Mk)"] = params["Mk"]
-        report["separate"] = ""
-
-        report["Current time"] = "%i\n" % ((time + 1) * float(params["dt"]))
+        Parameters
+        ----------
+        checkpoint : str
+            Checkpoint file
+        kwargs :
+            Passed to the constructor, e.g. `verbose` or `progress`
 
-        report["separate"] = ""
-        report["spbR pos"] = round(self.KD.spbR.traj[time], 3)
-        report["spbL pos"] = round(self.KD.spbL.traj[time], 3)
-        report["separate"] = ""
+        Returns
+        -------
+        :class:`Metaphase`
+        """
+        snapshot, simul_args, interval = load_checkpoint(checkpoint)
+        meta = snapshot.fork(**kwargs)
+        log.info("Resume simulation at time point %i" % snapshot.time_point)
+        meta.simul(checkpoint=Checkpointer(checkpoint, interval),
+                   **simul_args)
+        return meta
+
+    def snapshot(self):
+        """
+        Returns a :class:`~kt_simul.core.snapshot.Snapshot` of the
+        simulation as it is, from which continuations can be forked. The
+        simulation is usually stopped with the `until` argument of
+        :meth:`simul` beforehand.
+        """
+        from .snapshot import Snapshot
+        return Snapshot(self)
 
+    def _profiled_histories(self):
+        """
+        Same as :meth:`_calc_histories`, timing each history calculation
+        """
+        prof = self.profiler
         for ch in self.KD.chromosomes:
-            chdict = collections.OrderedDict()
-            chdict["correct"] = ch.correct_history[time]
-            chdict["erroneous"] = ch.erroneous_history[time]
-            for cent in [ch.cen_A, ch.cen_B]:
-                cen_dict = collections.OrderedDict()
-                cen_dict["position"] = round(cent.traj[time], 3)
-                for site in cent.plugsites:
-                    site_dict = collections.OrderedDict()
-                    site_dict['position'] = round(site.traj[time], 3)
-                    site_dict['Plug state'] = site.state_hist[time]
+            with prof.timed('correct_history'):
+                ch.calc_correct_history()
+            with prof.timed('erroneous_history'):
+                ch.calc_erroneous_history()
+            with prof.timed('toa'):
+                ch.cen_A.calc_toa()
+                ch.cen_B.calc_toa()
 
-                    cen_dict["PlugSite %i" % site.site_id] = site_dict
-
-                chdict["Centromere %s" % cent.tag] = cen_dict
+    def get_report(self, time=0):
+        """
+        Print simulation state about a specific time point
 
-            report["Chromosome %i" % ch.ch_id] = chdict
-            report["separate"] = ""
+        """
+        return self.report_engine.text(time)
 
-        return pretty_dict(report)
+    @property
+    def report_engine(self):
+        """
+        :class:`~kt_simul.core.report.ReportEngine` of the simulation,
+        built on first use.
+        """
+        if self._report_engine is None:
+            self._report_engine = ReportEngine(self)
+        return self._report_engine
 
     def _anaphase_test(self, time_point):
         """
@@ -342,16 +600,16 @@ class Metaphase(object):
 
         """
 
-        t_A = int(self.KD.params['t_A'])
-        dt = self.KD.params['dt']
+        t_A = int(self.KD.params.t_A)
+        dt = self.KD.params.dt
         t = time_point * dt
         if self.KD.anaphase:
             return True
         if t >= t_A and self._plug_checkpoint():
             self.delay = t - t_A
-            # Then we just get rid of cohesin
-            self.KD.params['kappa_c'] = 0.
-            self.KD.calc_B()
+            # Then we just get rid of cohesin, B matrix is rebuilt
+            # by KD at the next step
+            self.KD.params.set('kappa_c', 0.)
             nb_mero = self._mero_checkpoint()
             if nb_mero:
                 s = ("There were %d merotelic MT at anaphase onset"
@@ -378,10 +636,10 @@ class Metaphase(object):
         if not self.KD.spbL.pos <= pos <= self.KD.spbR.pos:
             log.warning('Missed shot, same player play again!')
             return
-        self.KD.params['Fmz'] = 0.
-        self.KD.params['k_a'] = 0.
-        self.KD.params['k_d0'] = 0.
-        self.KD.A0_mat = self.KD.time_invariantA()
+        # Matrices are rebuilt by KD at the next step
+        self.KD.params.set('Fmz', 0.)
+        self.KD.params.set('k_a', 0.)
+        self.KD.params.set('k_d0', 0.)
 
         for plugsite in self.KD.spindle.all_plugsites:
             if pos < plugsite.pos and plugsite.plug_state == - 1:
@@ -396,7 +654,7 @@ class Metaphase(object):
         otherwise.
 
         """
-        sac = self.KD.params['sac']
+        sac = self.KD.params.sac
         if sac == 0:
             return True
         for ch in self.KD.chromosomes:
@@ -414,9 +672,7 @@ class Metaphase(object):
         """
         nb_mero = 0
         for ch in self.KD.chromosomes:
-            if np.any(ch.erroneous()):
-                nb_mero += sum(ch.erroneous())
-                # print "active checkpoint"
+            nb_mero += sum(ch.erroneous())
         return nb_mero
 
     def _mplate_checkpoint(self):
@@ -442,10 +698,7 @@ class Metaphase(object):
 
         import matplotlib.pyplot as plt
 
-        duration = self.KD.duration
-        dt = self.KD.dt
-        # steps = self.KD.num_steps
-        times = np.arange(0, duration, dt)
+        times = self.timelapse
         kts = self.KD.chromosomes
 
         h = len(kts) * 2 + 6
@@ -527,47 +780,14 @@ class Metaphase(object):
 
     def get_kymo_plot(self, ax, lims=[-3, 3]):
         """
+        Draws the kymograph on a matplotlib axis. No backend is selected
+        here, see :mod:`kt_simul.gui.render` for headless rendering.
         """
+        from ..gui.render import kymo_data, draw_kymo
 
-        import matplotlib
-        matplotlib.use('Qt4Agg')
-
-        import matplotlib.pyplot as plt
-        import matplotlib.colors as colors
-        import matplotlib.cm as cmx
-
-        dt = self.KD.dt
-        duration = self.KD.duration
-        anaphase = self.KD.params['t_A']
-        times = np.arange(0, duration, dt)
-        spbA = self.KD.spbL.traj
-        spbB = self.KD.spbR.traj
-        kts = self.KD.chromosomes
-
-        ax.plot(times, spbA, color='black')
-        ax.plot(times, spbB, color='black')
-
-        if len(self.chrom_colors) == len(kts):
-            colors = lambda x: self.chrom_colors[x]
-        else:
-            cm = plt.get_cmap('gist_rainbow')
-            norm  = colors.Normalize(vmin=0, vmax=len(kts))
-            sm = cmx.ScalarMappable(norm=norm, cmap=cm)
-            colors = sm.to_rgba
-
-        for i, kt in enumerate(kts):
-            ax.plot(times, kt.cen_A.traj, color=colors(i), alpha=0.8)
-            ax.plot(times, kt.cen_B.traj, color=colors(i), alpha=0.8)
-            #ax.plot(times, (kt.cen_A.traj + kt.cen_B.traj)/2, color=colors(i), alpha=0.8)
-        ax.grid()
-
+        ax = draw_kymo(ax, kymo_data(self), lims=lims)
         for lab in ax.xaxis.get_majorticklabels():
             lab.set_visible(False)
-
-        ax.axvline(anaphase, color='black')
-        if lims:
-            ax.set_ylim(*lims)
-
         return ax
 
     def get_attachment(self, state):
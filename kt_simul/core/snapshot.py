@@ -0,0 +1,180 @@
+"""
+Forks of a running simulation.
+
+A :class:`Snapshot` holds the full state of a stopped
+:class:`~kt_simul.core.simul_spindle.Metaphase`: positions, attachment
+states, state of the random number generator, current parameters and
+anaphase flag. Many continuations can then be run from it, e.g. to
+compare laser ablations at different times or positions without
+simulating the common beginning again::
+
+    meta = Metaphase(seed=42)
+    meta.simul(until=400)
+    snapshot = meta.snapshot()
+    forks = snapshot.run_forks([{'ablat': 450, 'ablat_pos': x}
+                                for x in np.linspace(-1, 1, 11)])
+    full = forks[3].metaphase()
+
+The continuations start from the same state of the random number
+generator, so without perturbation they all give the original simulation.
+Each :class:`Continuation` only stores the records after the snapshot and
+refers to the snapshot for the records before.
+"""
+
+from __future__ import unicode_literals
+from __future__ import division
+from __future__ import absolute_import
+from __future__ import print_function
+
+import logging
+import multiprocessing
+import multiprocessing.pool
+
+log = logging.getLogger(__name__)
+
+__all__ = ["Snapshot", "Continuation"]
+
+
+class Snapshot(object):
+    """
+    State of a :class:`~kt_simul.core.simul_spindle.Metaphase` after its
+    current time point (see :meth:`Metaphase.snapshot`).
+
+    Attributes
+    ----------
+    time_point : int
+        Last simulated time point
+    num_records : int
+        Number of records held by the snapshot, the continuations store
+        the following ones
+    state : dict
+        Returned by :meth:`KinetoDynamics.get_state`
+    """
+
+    def __init__(self, meta):
+        if meta.KD.simulation_done:
+            raise ValueError("The simulation is done, stop it with the "
+                             "`until` argument of `simul` to fork it")
+        self.paramtree = meta.paramtree
+        self.measuretree = meta.measuretree
+        self.initial_plug = meta.initial_plug
+        self.rng = meta.rng
+        self.integrator = meta.integrator
+        self.model = meta.model
+        self.attachment = meta.attachment
+        self.nogil = meta.nogil
+        self.record_every = meta.KD.record_every
+        self.time_point = meta.KD.time_point
+        self.state = meta.KD.get_state()
+        self.num_records = self.state['traj'].shape[1]
+        self.random_state = meta.prng.state
+        self.delay = meta.delay
+        self.report = list(meta.report)
+        self.kappa_c = meta._kappa_c
+
+    def fork(self, **kwargs):
+        """
+        Returns a new :class:`~kt_simul.core.simul_spindle.Metaphase` in the
+        state of the snapshot, whose :meth:`simul` goes on from there.
+        `kwargs` are passed to the constructor, e.g. `verbose`.
+        """
+        from .simul_spindle import Metaphase
+
+        kwargs.setdefault('nogil', self.nogil)
+        kwargs.setdefault('memory_guard', False)
+        meta = Metaphase(paramtree=self.paramtree,
+                         measuretree=self.measuretree,
+                         initial_plug=self.initial_plug, reduce_p=False,
+                         record_every=self.record_every, rng=self.rng,
+                         integrator=self.integrator, model=self.model,
+                         attachment=self.attachment, **kwargs)
+        meta.KD.set_state(self.state)
+        meta.prng.state = self.random_state
+        meta.delay = self.delay
+        meta.report = list(self.report)
+        meta._kappa_c = self.kappa_c
+        return meta
+
+    def run_forks(self, perturbations, n_workers=None):
+        """
+        Runs a continuation of the simulation for each perturbation.
+
+        The continuations run in parallel threads, the steps being run
+        without the GIL (see :mod:`~kt_simul.core.flat_dynamics`).
+
+        Parameters
+        ----------
+        perturbations : list of dict
+            Arguments of :meth:`Metaphase.simul` for each continuation,
+            typically `ablat` and `ablat_pos`. An empty dict continues the
+            simulation unchanged.
+        n_workers : int or None
+            Number of threads, the number of CPUs if None
+
+        Returns
+        -------
+        list of :class:`Continuation`
+            In the order of `perturbations`
+        """
+        perturbations = [dict(p) for p in perturbations]
+        for perturbation in perturbations:
+            ablat = perturbation.get('ablat')
+            if ablat is not None and ablat <= self.time_point:
+                raise ValueError("Ablation at %s, before the end of the "
+                                 "snapshot at %i" % (ablat, self.time_point))
+        n_workers = n_workers or multiprocessing.cpu_count()
+        n_workers = max(min(n_workers, len(perturbations)), 1)
+        log.info("Run %i continuations from time point %i" %
+                 (len(perturbations), self.time_point))
+        if n_workers == 1:
+            return [self._run_fork(p) for p in perturbations]
+        pool = multiprocessing.pool.ThreadPool(processes=n_workers)
+        try:
+            return pool.map(self._run_fork, perturbations)
+        finally:
+            pool.close()
+            pool.join()
+
+    def _run_fork(self, perturbation):
+        meta = self.fork()
+        meta.simul(**perturbation)
+        return Continuation(self, perturbation, meta)
+
+
+class Continuation(object):
+    """
+    Result of a simulation forked from a :class:`Snapshot`.
+
+    Attributes
+    ----------
+    snapshot : :class:`Snapshot`
+        The shared beginning of the simulation
+    perturbation : dict
+        Arguments given to :meth:`Metaphase.simul`
+    suffix : dict
+        State at the end of the simulation with the records after the
+        snapshot, see :meth:`KinetoDynamics.get_state`
+    delay : float
+        Anaphase onset delay
+    report : list of str
+    """
+
+    def __init__(self, snapshot, perturbation, meta):
+        self.snapshot = snapshot
+        self.perturbation = perturbation
+        self.suffix = meta.KD.get_state(start=snapshot.num_records)
+        self.delay = meta.delay
+        self.report = meta.report
+
+    def metaphase(self):
+        """
+        Returns the whole simulation as a
+        :class:`~kt_simul.core.simul_spindle.Metaphase`, the records of
+        the snapshot followed by the ones of the continuation.
+        """
+        meta = self.snapshot.fork()
+        meta.KD.set_state(self.suffix)
+        meta.delay = self.delay
+        meta.report = list(self.report)
+        meta._calc_histories()
+        return meta
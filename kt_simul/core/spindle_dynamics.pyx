@@ -19,10 +19,28 @@ cimport cython
 cimport numpy as np
 from cpython cimport bool
 
-from .components cimport Spindle, Spb, Chromosome, Centromere, PlugSite
+from .components cimport Organite, Spindle, Spb, Chromosome, Centromere, PlugSite
 from .components import Spindle, Spb, Chromosome, Centromere, PlugSite
+from .simu_params cimport SimuParams
+from .simu_params import SimuParams
+from .random_source cimport RandomSource
+from .random_source import RandomSource
+from .flat_dynamics import FlatDynamics
 
-__all__ = ["KinetoDynamics"]
+__all__ = ["KinetoDynamics", "INTEGRATORS", "MODELS", "ATTACHMENTS"]
+
+# Explicit Euler, or implicit Euler for the linear terms
+INTEGRATORS = ('euler', 'implicit')
+
+# All the sites, or the sites slaved to their centromere
+# (see kt_simul.core.reduced_dynamics)
+MODELS = ('full', 'reduced')
+
+# Attachments drawn site by site, or in bulk per centromere and pole
+ATTACHMENTS = ('exact', 'tau_leap')
+# Relative spread of the detachment probabilities of a population of
+# plugsites above which they are drawn site by site
+LEAP_TOLERANCE = 0.1
 
 RIGHT = 1
 LEFT = -1
@@ -40,25 +58,37 @@ cdef class KinetoDynamics(object):
     cdef public Spb spbR, spbL
     cdef public unicode initial_plug
     cdef public bool simulation_done
-    cdef public object params
+    cdef public SimuParams params
+    cdef unsigned long params_version
     cdef public int num_steps
+    cdef public int record_every, num_records
     cdef public float duration
     cdef public float dt
     cdef public list chromosomes
     cdef public np.ndarray B_mat, At_mat, A0_mat
+    cdef readonly np.ndarray A0_step
+    cdef readonly unicode integrator
+    cdef readonly unicode model
+    cdef readonly unicode attachment
+    cdef public double leap_tolerance
     cdef public bool anaphase
     cdef public list all_plugsites
     cdef public int time_point
     cdef public np.ndarray speeds
     cdef public object prng
+    cdef public object profiler
+    cdef object _flat
 
-    def __init__(self, parameters, initial_plug='null', prng=None):
+    def __init__(self, parameters, initial_plug='null', prng=None,
+                 int record_every=1, integrator='euler', model='full',
+                 attachment='exact'):
         """
         KinetoDynamics instenciation method
 
         :param parameters: A dictionnary of parameters as obtained from a
-            xml_handler.ParamTree instance
-        :type parameters: ParamTree instance
+            xml_handler.ParamTree instance. It is compiled once to a
+            :class:`~kt_simul.core.simu_params.SimuParams` instance.
+        :type parameters: dict or SimuParams instance
 
         :param initial_plug: Defines globally the initial attachment states.
             This argument can have the following values:
@@ -70,20 +100,69 @@ cdef class KinetoDynamics(object):
                            left ones are detached
                 * 'syntelic' : all kinetochores are attached to the same pole
         :type initial_plug: string or None
-        """
 
-        if not prng:
-            self.prng = np.random.RandomState()
-        else:
+        :param record_every: Trajectories and attachment histories only
+            keep one time point every `record_every`, to save memory.
+        :type record_every: int
+
+        :param integrator: 'euler' (explicit Euler), or 'implicit', where
+            the linear terms are taken at the end of the step: the speeds
+            solve :math:`(\mathbf{A} + V_k dt \mathbf{B})\dot{X} = -(\mathbf{B}X + C)`,
+            which stays stable at larger time steps. Explicit Euler is
+            close to its stability limit at the default dt of 10 s, see
+            :mod:`kt_simul.benchmarks.convergence`. The attachments
+            change at the beginning of the steps in both cases.
+        :type integrator: string
+
+        :param model: 'full', or 'reduced', where the attachment sites are
+            slaved to their centromere and the steps are always run with
+            :meth:`run` (see :mod:`~kt_simul.core.reduced_dynamics`)
+        :type model: string
+
+        :param attachment: 'exact', or 'tau_leap', where the numbers of
+            attachments and detachments of each centromere are drawn from
+            binomial distributions and the plugsites which change are
+            chosen in bulk, falling back to the exact draws when the
+            detachment probabilities differ by more than `leap_tolerance`
+            (see :meth:`Centromere.plug_unplug_leap`). The reduced model
+            always draws its attachments in bulk.
+        :type attachment: string
+        """
+        if integrator not in INTEGRATORS:
+            raise ValueError("Unknown integrator '%s', expected one of %s" %
+                             (integrator, INTEGRATORS))
+        self.integrator = integrator
+        if model not in MODELS:
+            raise ValueError("Unknown model '%s', expected one of %s" %
+                             (model, MODELS))
+        self.model = model
+        if attachment not in ATTACHMENTS:
+            raise ValueError("Unknown attachment '%s', expected one of %s" %
+                             (attachment, ATTACHMENTS))
+        self.attachment = attachment
+        self.leap_tolerance = LEAP_TOLERANCE
+
+        if prng is None:
+            self.prng = RandomSource()
+        elif isinstance(prng, RandomSource):
             self.prng = prng
+        else:
+            self.prng = RandomSource(generator=prng)
 
-        self.params = parameters
-        L0 = self.params['L0']
-        N = int(self.params['N'])
-        Mk = int(self.params['Mk'])
-        self.duration = self.params['span']
-        self.dt = self.params['dt']
+        if isinstance(parameters, SimuParams):
+            self.params = parameters
+        else:
+            self.params = SimuParams(parameters)
+        self.params_version = self.params.version
+        L0 = self.params.L0
+        N = self.params.N
+        Mk = self.params.Mk
+        self.duration = self.params.span
+        self.dt = self.params.dt
         self.num_steps = int(self.duration / self.dt)
+        self.record_every = max(record_every, 1)
+        self.num_records = ((self.num_steps + self.record_every - 1)
+                            // self.record_every)
         self.spindle = Spindle(self)
         self.spbR = Spb(self.spindle, RIGHT, L0)  # right spb (RIGHT = 1)
         self.spbL = Spb(self.spindle, LEFT, L0)  # left one (LEFT = -1)
@@ -97,19 +176,21 @@ cdef class KinetoDynamics(object):
         self.B_mat = np.zeros((dim, dim), dtype=float)
         self.calc_B()
         self.A0_mat = self.time_invariantA()
+        self._calc_A0_step()
         self.At_mat = np.zeros((dim, dim), dtype=float)
         self.simulation_done = False
         self.anaphase = False
         self.all_plugsites = self.spindle.get_all_plugsites()
         self.speeds = np.zeros(dim)
+        self.profiler = None
+        self._flat = None
 
-    cdef _idx(self, int side, int n, int m=-1):
+    cdef inline int _idx(self, int side, int n, int m=-1):
         """
         :return: The index dictionnary
         """
-        cdef int Mk, N, idx
-        Mk = int(self.params['Mk'])
-        N = int(self.params['N'])
+        cdef int Mk, idx
+        Mk = self.params.Mk
         if m == -1:
             idx = (2 * n + side) * (Mk + 1) + 1
         else:
@@ -123,23 +204,244 @@ cdef class KinetoDynamics(object):
             1. Solving the equation for this time point (solve()).
             2. Updating position according to new speeds (position_update())
         """
+        if self.model == 'reduced':
+            self.run(time_point, time_point + 1)
+            return
         self.time_point = time_point
         self._one_step(time_point)
         if time_point == (self.num_steps - 1):
             self.simulation_done = True
             self.reset_positions()
 
+    def run(self, int start, int stop):
+        """
+        Runs the time points from `start` to `stop` (excluded) like
+        :meth:`one_step`, on flat arrays and without holding the GIL (see
+        :class:`~kt_simul.core.flat_dynamics.FlatDynamics`).
+
+        Returns before a time point after `start` at which the anaphase
+        onset is due, so that the caller can handle it. The reduced model
+        runs with :class:`~kt_simul.core.reduced_dynamics.ReducedDynamics`.
+
+        With a profiler, the whole run is timed as 'run' and its time
+        points counted as 'steps'. The phases of the steps and the
+        attachment events are reported under the names used by
+        :meth:`one_step`, except with the reduced model.
+
+        :return: the first time point which has not been run
+        """
+        prof = self.profiler
+        if prof is not None:
+            t0 = prof.clock()
+        if self.params.version != self.params_version:
+            self.refresh_params()
+            if prof is not None:
+                t1 = prof.clock()
+                prof.add('refresh_params', t0, t1)
+                prof.count('matrix_rebuilds')
+                t0 = t1
+        if self._flat is None and self.model == 'reduced':
+            from .reduced_dynamics import ReducedDynamics
+            self._flat = ReducedDynamics(self)
+        elif self._flat is None:
+            self._flat = FlatDynamics(self)
+        time_point = self._flat.run(start, stop)
+        if prof is not None:
+            prof.add('run', t0, prof.clock())
+            prof.count('steps', time_point - start)
+            if self.model != 'reduced':
+                self._flat.report(prof)
+        if time_point == self.num_steps:
+            self.simulation_done = True
+            self.reset_positions()
+        return time_point
+
+    def organites(self):
+        """
+        :return: the list of all the components with a trajectory: the
+            poles, then each chromosome with its centromeres, then the
+            attachment sites in the order of `all_plugsites`
+        """
+        organites = [self.spbR, self.spbL]
+        cdef Chromosome ch
+        for ch in self.chromosomes:
+            organites.extend([ch, ch.cen_A, ch.cen_B])
+        return organites + self.all_plugsites
+
+    def get_state(self, int start=0):
+        """
+        Returns the state of the simulation after `self.time_point`: the
+        positions, the attachment states, the parameters and the records
+        from `start` to the last recorded time point.
+
+        :param start: first record to return, to only keep what changed
+            after an earlier state
+        :return: a dictionnary of arrays, see :meth:`set_state`
+        """
+        cdef Organite organite
+        cdef PlugSite plugsite
+        cdef int stop = self.time_point // self.record_every + 1
+        organites = self.organites()
+        return {'time_point': self.time_point,
+                'anaphase': bool(self.anaphase),
+                'simulation_done': bool(self.simulation_done),
+                'params': self.params.to_dict(),
+                'start': start,
+                'pos': np.array([organite.pos for organite in organites]),
+                'last_pos': np.array([organite._last_pos
+                                      for organite in organites]),
+                'last_disp': np.array([organite.last_disp
+                                       for organite in organites]),
+                'traj': np.array([organite.traj[start:stop]
+                                  for organite in organites]),
+                'plug_state': np.array([plugsite.plug_state for plugsite
+                                        in self.all_plugsites]),
+                'plugged': np.array([plugsite.plugged for plugsite
+                                     in self.all_plugsites]),
+                'last_transition': np.array([plugsite.last_transition
+                                             for plugsite
+                                             in self.all_plugsites]),
+                'state_hist': np.array([plugsite.state_hist[start:stop]
+                                        for plugsite in self.all_plugsites])}
+
+    def set_state(self, state):
+        """
+        Puts the simulation in a state returned by :meth:`get_state` for
+        the same parameters. Records before `state['start']` are left
+        unchanged. Changed parameters are set with :meth:`SimuParams.set`.
+        """
+        cdef Organite organite
+        cdef PlugSite plugsite
+        cdef Chromosome ch
+        cdef int i, start = state['start']
+        cdef int stop = start + state['traj'].shape[1]
+        for key, value in state['params'].items():
+            if self.params[key] != value:
+                self.params.set(key, value)
+        for i, organite in enumerate(self.organites()):
+            organite.pos = state['pos'][i]
+            organite._last_pos = state['last_pos'][i]
+            organite.last_disp = state['last_disp'][i]
+            organite.traj[start:stop] = state['traj'][i]
+        for i, plugsite in enumerate(self.all_plugsites):
+            plugsite.plug_state = state['plug_state'][i]
+            plugsite.plugged = state['plugged'][i]
+            plugsite.last_transition = state['last_transition'][i]
+            plugsite.state_hist[start:stop] = state['state_hist'][i]
+            plugsite.state_hist[stop:] = plugsite.plug_state
+        for ch in self.chromosomes:
+            ch.cen_A.count_plugged()
+            ch.cen_B.count_plugged()
+        self.time_point = state['time_point']
+        self.anaphase = state['anaphase']
+        self.simulation_done = state['simulation_done']
+
     cdef void _one_step(self, int time_point):
+        if self.profiler is not None:
+            self._one_step_profiled(time_point)
+            return
+        if self.params.version != self.params_version:
+            self.refresh_params()
         if not self.anaphase:
             self.plug_unplug(time_point)
         self.solve()
         self.position_update(time_point)
 
+    cdef _one_step_profiled(self, int time_point):
+        """
+        Same as `_one_step`, timing each phase with `self.profiler`
+        (see :class:`~kt_simul.utils.profiling.Profiler`)
+        """
+        prof = self.profiler
+        clock = prof.clock
+        cdef int i, before, after
+        cdef int attached = 0, detached = 0
+        cdef PlugSite plugsite
+        cdef list states
+        cdef np.ndarray[DTYPE_t, ndim = 1] X, C, pos_dep
+        cdef np.ndarray[DTYPE_t, ndim = 2] A
+
+        t0 = clock()
+        if self.params.version != self.params_version:
+            self.refresh_params()
+            t1 = clock()
+            prof.add('refresh_params', t0, t1)
+            prof.count('matrix_rebuilds')
+            t0 = t1
+
+        if not self.anaphase:
+            states = [plugsite.plug_state for plugsite in self.all_plugsites]
+            self.plug_unplug(time_point)
+            for i in range(len(states)):
+                before = states[i]
+                plugsite = self.all_plugsites[i]
+                after = plugsite.plug_state
+                if before == 0 and after != 0:
+                    attached += 1
+                elif before != 0 and after == 0:
+                    detached += 1
+            t1 = clock()
+            prof.add('plug_unplug', t0, t1)
+            prof.count('attach_events', attached)
+            prof.count('detach_events', detached)
+            t0 = t1
+
+        A = self._calc_step_A()
+        t1 = clock()
+        prof.add('calc_A', t0, t1)
+        t0 = t1
+
+        C = self._calc_C()
+        t1 = clock()
+        prof.add('calc_C', t0, t1)
+        t0 = t1
+
+        X = self.get_state_vector()
+        pos_dep = np.dot(self.B_mat, X) + C
+        self.speeds = np.linalg.solve(A, -pos_dep)
+        t1 = clock()
+        prof.add('solve', t0, t1)
+        prof.count('solves')
+        t0 = t1
+
+        self.position_update(time_point)
+        prof.add('position_update', t0, clock())
+        prof.count('steps')
+
+    def refresh_params(self):
+        """
+        Rebuilds the matrices depending on the parameters after they have
+        been changed with :meth:`SimuParams.set`
+        """
+        self.calc_B()
+        self.A0_mat = self.time_invariantA()
+        self._calc_A0_step()
+        self.params_version = self.params.version
+
+    cdef _calc_A0_step(self):
+        """
+        Time invariant part of the matrix solved at each step: `A0_mat`,
+        plus `Vk * dt * B_mat` with the implicit integrator
+        """
+        cdef double h = self.params.Vk * self.params.dt
+        if self.integrator == 'implicit':
+            self.A0_step = self.A0_mat + h * self.B_mat
+        else:
+            self.A0_step = self.A0_mat
+
+    cdef _calc_step_A(self):
+        """
+        :return: the matrix of the speeds solved at each step, `calc_A()`
+            for the explicit integrator
+        """
+        self.time_dependentA()
+        return self.A0_step + self.At_mat
+
     cdef solve(self):
         cdef np.ndarray[DTYPE_t, ndim = 1] X, C, pos_dep
         cdef np.ndarray[DTYPE_t, ndim = 2] A, B
         X = self.get_state_vector()
-        A = self.calc_A()
+        A = self._calc_step_A()
         B = self.B_mat
         C = self.calc_C()
         pos_dep = np.dot(B, X) + C
@@ -149,9 +451,9 @@ cdef class KinetoDynamics(object):
         """
         :return: a vector of the positions of each components
         """
-        cdef int N, M, n, m
-        N = int(self.params['N'])
-        Mk = int(self.params['Mk'])
+        cdef int N, Mk, n, m
+        N = self.params.N
+        Mk = self.params.Mk
         cdef np.ndarray[DTYPE_t, ndim=1] X
         X = np.zeros(1 + 2*N * ( Mk + 1 ))
         X[0] = self.spbR.pos
@@ -183,20 +485,20 @@ cdef class KinetoDynamics(object):
         return A
 
     cpdef time_invariantA(self):
-        cdef int N = int(self.params['N'])
-        cdef int Mk = int(self.params['Mk'])
-        cdef float muc = self.params['muc']
-        cdef float muk = self.params['muk']
-        cdef float mus = self.params['mus']
-        cdef float Vmz = self.params['Vmz']
-        cdef float Fmz = self.params['Fmz']
-        cdef float muco = self.params['muco']
+        cdef int N = self.params.N
+        cdef int Mk = self.params.Mk
+        cdef float muc = self.params.muc
+        cdef float muk = self.params.muk
+        cdef float mus = self.params.mus
+        cdef float Vmz = self.params.Vmz
+        cdef float Fmz = self.params.Fmz
+        cdef float muco = self.params.muco
         cdef int dims = 1 + 2 * N * ( Mk + 1 )
         cdef np.ndarray[DTYPE_t, ndim=2] A0
         cdef int delta2
         A0 = np.zeros((dims, dims))
         A0[0, 0] = - 2 * mus - 4 * Fmz / Vmz
-        cdef int n, m
+        cdef int n, m, an, bn, anm, bnm
         cdef Chromosome ch
         for n in range(N):
             ch = self.chromosomes[n]
@@ -217,8 +519,8 @@ cdef class KinetoDynamics(object):
         return A0
 
     cdef time_dependentA(self):
-        cdef int N = int(self.params['N'])
-        cdef int Mk = int(self.params['Mk'])
+        cdef int N = self.params.N
+        cdef int Mk = self.params.Mk
         cdef float pi_nmA, pi_nmB
         cdef int pluggedA, pluggedB
         cdef int n, m, anm, bnm
@@ -263,17 +565,17 @@ cdef class KinetoDynamics(object):
 
     cdef _calc_B(self):
         cdef float kappa_c, kappa_k
-        kappa_k = self.params['kappa_k']
-        kappa_c = self.params['kappa_c']
+        kappa_k = self.params.kappa_k
+        kappa_c = self.params.kappa_c
         cdef np.ndarray[DTYPE_t, ndim=2] Bk, Bc
         Bk = self.kinetochore_B()
         Bc = self.cohesin_B()
         self.B_mat = kappa_k * Bk + kappa_c * Bc
 
     cdef kinetochore_B(self):
-        cdef N, Mk, n, m
-        Mk = int(self.params['Mk'])
-        N = int(self.params['N'])
+        cdef int N, Mk, n, m
+        Mk = self.params.Mk
+        N = self.params.N
         cdef int dim = 1 + N * (1 + Mk) * 2
         cdef int an, bn, anm, bnm
         cdef np.ndarray[DTYPE_t, ndim = 2] Bk
@@ -295,9 +597,9 @@ cdef class KinetoDynamics(object):
         return Bk
 
     cdef cohesin_B(self):
-        cdef N, Mk
-        Mk = int(self.params['Mk'])
-        N = int(self.params['N'])
+        cdef int N, Mk, n
+        Mk = self.params.Mk
+        N = self.params.N
         cdef int dim = 1 + N * (1 + Mk) * 2
         cdef np.ndarray[DTYPE_t, ndim = 2] Bc
         Bc = np.zeros((dim, dim), dtype=float)
@@ -318,18 +620,18 @@ cdef class KinetoDynamics(object):
         return self._calc_C()
 
     cdef _calc_C(self):
-        cdef int N = int(self.params['N'])
-        cdef int Mk = int(self.params['Mk'])
-        cdef float Fmz = self.params['Fmz']
-        cdef float d0 = self.params['d0']
-        cdef float kappa_c = self.params['kappa_c']
+        cdef int N = self.params.N
+        cdef int Mk = self.params.Mk
+        cdef float Fmz = self.params.Fmz
+        cdef float d0 = self.params.d0
+        cdef float kappa_c = self.params.kappa_c
         cdef float pi_nmA, pi_nmB
         cdef np.ndarray C
         cdef PlugSite plugsite_A, plugsite_B
 
         C = np.zeros(1 + N * (1 + Mk) * 2, dtype="float")
         C[0] = 2 * Fmz
-        cdef int n, m, delta1, an, bn
+        cdef int n, m, delta1, an, bn, anm, bnm
         cdef int pluggedA, pluggedB
         cdef Chromosome ch
         for n in range(N):
@@ -367,6 +669,12 @@ cdef class KinetoDynamics(object):
         Let's play dices ...
         """
         cdef PlugSite plugsite
+        cdef Chromosome ch
+        if self.attachment == 'tau_leap':
+            for ch in self.chromosomes:
+                ch.cen_A.plug_unplug_leap(time_point, self.leap_tolerance)
+                ch.cen_B.plug_unplug_leap(time_point, self.leap_tolerance)
+            return
         for plugsite in self.all_plugsites:
             plugsite.plug_unplug(time_point)
 
@@ -374,10 +682,10 @@ cdef class KinetoDynamics(object):
         """
         Given the speeds obtained by solving A\ot.x = btot and caclulated switch events
         """
-        cdef int Mk = int(self.params['Mk'])
-        cdef int N = int(self.params['N'])
-        cdef double dt = self.params['dt']
-        cdef double Vk = self.params['Vk']
+        cdef int Mk = self.params.Mk
+        cdef int N = self.params.N
+        cdef double dt = self.params.dt
+        cdef double Vk = self.params.Vk
         cdef np.ndarray[DTYPE_t] speeds
         speeds = self.speeds
         speeds *= Vk * dt # Back to real space
@@ -411,8 +719,8 @@ cdef class KinetoDynamics(object):
         self.spbR.pos = self.spbR.traj[0]
         self.spbL.pos = self.spbL.traj[0]
 
-        cdef int Mk = int(self.params['Mk'])
-        cdef int N = int(self.params['N'])
+        cdef int Mk = self.params.Mk
+        cdef int N = self.params.N
         cdef int n, m, an, anm, bn, bnm
         cdef float new_pos
         cdef Chromosome ch
@@ -1,5 +1,15 @@
 """
 """
 
-from .widgets import InteractiveCellWidget
-from .animate import Animator
+__all__ = ["InteractiveCellWidget", "Animator"]
+
+
+def __getattr__(name):
+    # PyQt4 is only imported when the widgets are used
+    if name == 'InteractiveCellWidget':
+        from .widgets import InteractiveCellWidget
+        return InteractiveCellWidget
+    elif name == 'Animator':
+        from .animate import Animator
+        return Animator
+    raise AttributeError("module %s has no attribute %s" % (__name__, name))
@@ -12,19 +12,28 @@ import logging
 
 from PyQt4 import QtGui, QtCore
 
-from kt_simul.gui.animation import InteractiveCellWidget
+from kt_simul.gui.animation.widgets import InteractiveCellWidget
+from kt_simul.gui.animation.widgets import StreamingCellWidget
 
 log = logging.getLogger(__name__)
 
 
 class Animator:
     """
+    Parameters
+    ----------
+    step : int or None
+        Play one time point every `step`, for long simulations
+    max_frames : int or None
+        Maximum number of frames, `step` is increased accordingly
     """
 
-    def __init__(self, meta_instance):
+    def __init__(self, meta_instance, step=None, max_frames=None):
         """
         """
         self.meta = meta_instance
+        self.step = step
+        self.max_frames = max_frames
 
     def play(self,):
         """
@@ -34,9 +43,30 @@ class Animator:
 
         self._init_qt()
         QtCore.qsrand(QtCore.QTime(0, 0, 0).secsTo(QtCore.QTime.currentTime()))
-        widget = InteractiveCellWidget(self.meta)
+        widget = InteractiveCellWidget(self.meta, step=self.step,
+                                       max_frames=self.max_frames)
         self._create_window(widget)
 
+    def play_live(self, **simul_kwargs):
+        """
+        Runs the simulation in a background thread and shows it while it
+        runs. `simul_kwargs` are passed to :meth:`Metaphase.simul`.
+
+        Returns
+        -------
+        :class:`~kt_simul.gui.stream.SimulationStream`
+        """
+        from kt_simul.gui.stream import SimulationStream
+
+        log.info("Playing live simulation")
+
+        self._init_qt()
+        stream = SimulationStream(self.meta, **simul_kwargs)
+        widget = StreamingCellWidget(stream)
+        stream.start()
+        self._create_window(widget)
+        return stream
+
     def _init_qt(self):
         """
         """
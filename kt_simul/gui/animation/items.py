@@ -9,6 +9,9 @@ from PyQt4 import QtCore, QtGui
 
 import numpy as np
 
+from kt_simul.gui.frames import FrameBuffer, UNPLUGGED, CORRECT, ERRONEOUS
+from kt_simul.gui.frames import centromere_y, plugsite_y
+
 CELL_BORDER = 2
 
 SPB_WIDTH = 0.5
@@ -29,18 +32,33 @@ GOOD_PLUGSITE_COLOR = QtGui.QColor(0, 250, 20, alpha=200)  # Green
 BAD_PLUGSITE_COLOR = QtGui.QColor(255, 0, 0, alpha=255)  # Red
 UNPLUGED_COLOR = QtGui.QColor(0, 20, 250, alpha=200)  # Blue
 
+PLUGSITE_COLORS = {UNPLUGGED: UNPLUGED_COLOR,
+                   CORRECT: GOOD_PLUGSITE_COLOR,
+                   ERRONEOUS: BAD_PLUGSITE_COLOR}
+
 
 class CellItem(QtGui.QGraphicsItem):
     """
     This is the parent item containing all the objects within the cell
+
+    Positions and colors of all the items are computed once in a
+    :class:`~kt_simul.gui.frames.FrameBuffer`, keeping one time point
+    every `step`. Another frame source with the same attributes can be
+    given with `frames` (e.g. :class:`~kt_simul.gui.stream.LiveFrames`).
     """
 
-    def __init__(self, metaphase, parent=None):
+    def __init__(self, metaphase, parent=None, step=None, max_frames=None,
+                 frames=None):
         QtGui.QGraphicsItem.__init__(self, parent=parent)
 
         self.N = int(metaphase.KD.params['N'])
         self.Mk = int(metaphase.KD.params['Mk'])
         self.mt = metaphase  # Metaphase instance
+        if frames is None:
+            frames = FrameBuffer(metaphase, step=step, max_frames=max_frames)
+        self.frames = frames
+        self.brushes = dict((state, QtGui.QBrush(color))
+                            for state, color in PLUGSITE_COLORS.items())
 
         self.spbR = SPBItem(-1, parent=self)
         self.spbL = SPBItem(1, parent=self)
@@ -53,29 +71,31 @@ class CellItem(QtGui.QGraphicsItem):
             self.cens_B.append(CentromereItem(n, 1, parent=self))
 
         self.height = np.abs(self.N * ( self.Mk * PLUGSITE_HEIGHT) * 5) + CELL_BORDER
-        self.width = np.abs(self.mt.KD.spbR.traj.max() * 6 + CELL_BORDER)
+        self.width = np.abs(self.frames.spbs.max() * 6 + CELL_BORDER)
 
-        self.time_point = -1
-        self.gotoTime(0)
+        self.frame = -1
+        self.time_point = 0
+        self.gotoFrame(0)
 
     def advance(self):
-        self.time_point += 1
-        return self.gotoTime(self.time_point)
+        return self.gotoFrame(self.frame + 1)
 
     def gotoTime(self, time_point):
-        if time_point >= self.mt.KD.num_steps - 1:
+        return self.gotoFrame(self.frames.frame_index(time_point))
+
+    def gotoFrame(self, frame):
+        if frame >= len(self.frames):
             return False
-        self.time_point = time_point
+        self.frame = frame
+        self.time_point = self.frames.time_points[frame]
 
-        self.spbR.gotoTime(self.time_point)
-        self.spbL.gotoTime(self.time_point)
+        self.spbR.gotoFrame(frame)
+        self.spbL.gotoFrame(frame)
 
         for n in range(self.N):
-            cen_A = self.cens_A[n]
-            cen_B = self.cens_B[n]
-
-            cen_A.gotoTime(self.time_point)
-            cen_B.gotoTime(self.time_point)
+            self.cens_A[n].gotoFrame(frame)
+            self.cens_B[n].gotoFrame(frame)
+        return True
 
     def boundingRect(self):
         """
@@ -99,18 +119,18 @@ class CentromereItem(QtGui.QGraphicsItem):
         self.graphcell = parent
         self.setFlag(QtGui.QGraphicsItem.ItemIsMovable)
 
-        N = int(self.graphcell.mt.KD.params['N'])
-        Mk = int(self.graphcell.mt.KD.params['Mk'])
+        N = self.graphcell.N
+        Mk = self.graphcell.Mk
+        frames = self.graphcell.frames
 
         self.n = n
         self.side = side
-        self.ch = self.graphcell.mt.KD.chromosomes[n]
-        if side == -1:
-            self.traj = self.ch.cen_A.traj
-        else:
-            self.traj = self.ch.cen_B.traj
+        side_idx = 0 if side == -1 else 1
+        self.xs = frames.centromeres[:, n, side_idx]
+        self.sac_active = frames.sac_active[:, n]
+        self.frame = 0
 
-        self.y = (n - (N - 1) / 2.) * 0.55
+        self.y = centromere_y(n, N)
 
         self.width = PLUGSITE_WIDTH * 2
         self.height = Mk * PLUGSITE_HEIGHT + (Mk -1) * PLUGSITE_OFFSET
@@ -118,23 +138,15 @@ class CentromereItem(QtGui.QGraphicsItem):
 
         self.plugsites = []
         for m in range(Mk):
-            if side == -1:
-                plugsite = self.ch.cen_A.plugsites[m]
-            else:
-                plugsite = self.ch.cen_B.plugsites[m]
-            self.plugsites.append(PlugSiteItem(m, plugsite, self, parent))
+            self.plugsites.append(PlugSiteItem(m, side_idx, self, parent))
 
-    def gotoTime(self, time_point):
-        try:
-            x = self.traj[time_point]
-        except IndexError:
-            x = self.traj[-1]
-        pos = QtCore.QPointF(x, self.y)
-        self.setPos(pos)
+    def gotoFrame(self, frame):
+        self.frame = frame
+        self.setPos(QtCore.QPointF(self.xs[frame], self.y))
 
         # Move PlugSite
         for p in self.plugsites:
-            p.gotoTime(time_point)
+            p.gotoFrame(frame)
 
     def shape(self):
         self.path = QtGui.QPainterPath()
@@ -143,7 +155,7 @@ class CentromereItem(QtGui.QGraphicsItem):
         return self.path
 
     def paint(self, painter, option, widget):
-        if self.ch.cen_A.is_attached() and self.ch.cen_B.is_attached():
+        if not self.sac_active[self.frame]:
             brush = QtGui.QBrush(CH_COLOR)
         else:
             brush = QtGui.QBrush(ACTIVE_SAC_COLOR)
@@ -160,51 +172,30 @@ class CentromereItem(QtGui.QGraphicsItem):
 
 class PlugSiteItem(QtGui.QGraphicsItem):
 
-    def __init__(self, m, plugsite, kineto, parent=None):
+    def __init__(self, m, side_idx, kineto, parent=None):
 
         QtGui.QGraphicsItem.__init__(self, parent=parent)
         self.kineto = kineto
 
-        Mk = int(self.kineto.graphcell.mt.KD.params['Mk'])
+        graphcell = self.kineto.graphcell
         self.m = m
-        self.sim = plugsite
+        self.xs = graphcell.frames.plugsites[:, kineto.n, side_idx, m]
+        self.states = graphcell.frames.plug_states[:, kineto.n, side_idx, m]
+        self.brushes = graphcell.brushes
 
         self.width = PLUGSITE_WIDTH
         self.height = PLUGSITE_HEIGHT
 
-        self.y = self.kineto.y + (m - (Mk - 1) / 2.) * 0.11
+        self.y = plugsite_y(kineto.n, m, graphcell.N, graphcell.Mk)
         self.setZValue(self.kineto.n * (1 + m))
 
-        self.gotoTime(0)
+        self.gotoFrame(0)
 
-    def gotoTime(self, time_point):
-        try:
-            x = self.sim.traj[time_point]
-        except IndexError:
-            x = self.sim.traj[-1]
-        pos = QtCore.QPointF(x, self.y)
-        self.setPos(pos)
+    def gotoFrame(self, frame):
+        self.setPos(QtCore.QPointF(self.xs[frame], self.y))
 
         # Change color according to state
-        self.setState(time_point)
-
-    def setState(self, time_point=0):
-        """
-        Change color according to state at specific time_point
-        """
-        if self.kineto.side == 0:
-            good_side = -1
-        else:
-            good_side = 1
-
-
-        if self.sim.state_hist[time_point] == 0:
-            brush = QtGui.QBrush(UNPLUGED_COLOR)
-        elif self.sim.is_correct(time_point):
-            brush = QtGui.QBrush(GOOD_PLUGSITE_COLOR)
-        else:
-            brush = QtGui.QBrush(BAD_PLUGSITE_COLOR)
-        self.color = brush
+        self.color = self.brushes[self.states[frame]]
 
     def shape(self):
         self.path = QtGui.QPainterPath()
@@ -232,21 +223,15 @@ class SPBItem(QtGui.QGraphicsItem):
         self.graphcell = parent
         self.setFlag(QtGui.QGraphicsItem.ItemIsMovable)
         if side == -1:
-            self.traj = self.graphcell.mt.KD.spbL.traj
+            self.xs = self.graphcell.frames.spbs[:, 0]
         else:
-            self.traj = self.graphcell.mt.KD.spbR.traj
+            self.xs = self.graphcell.frames.spbs[:, 1]
 
         self.width = SPB_WIDTH
         self.height = SPB_HEIGHT
 
-    def gotoTime(self, time_point):
-        try:
-            x = self.traj[time_point]
-        except IndexError:
-            x = self.traj[-1]
-        y = 0.
-        pos = QtCore.QPointF(x, y)
-        self.setPos(pos)
+    def gotoFrame(self, frame):
+        self.setPos(QtCore.QPointF(self.xs[frame], 0.))
 
     def shape(self):
         self.path = QtGui.QPainterPath()
@@ -17,9 +17,15 @@ VIEW_BORDER = 0.15 # 15%
 
 class InteractiveCellWidget(QtGui.QWidget):
     """
+    Parameters
+    ----------
+    step : int or None
+        Play one time point every `step`
+    max_frames : int or None
+        Maximum number of frames, `step` is increased accordingly
     """
 
-    def __init__(self, metaphase):
+    def __init__(self, metaphase, step=None, max_frames=None):
         """
         """
         super(InteractiveCellWidget, self).__init__()
@@ -29,11 +35,12 @@ class InteractiveCellWidget(QtGui.QWidget):
 
         self.setWindowTitle("Kinetochore simulation")
 
-        self.ccw = ControlCellWidget(metaphase)
-
         # This widget will contain self.view and self.textArea
         self.mainWidget = QtGui.QWidget()
-        self.view = ViewCellWidget(metaphase)
+        self.view = ViewCellWidget(metaphase, step=step,
+                                   max_frames=max_frames)
+        self.ccw = ControlCellWidget(metaphase,
+                                     step=self.view.cell.frames.step)
         self.textArea = QtGui.QPlainTextEdit()
         self.textArea.setReadOnly(True)
 
@@ -100,18 +107,65 @@ class InteractiveCellWidget(QtGui.QWidget):
             self.timerId = 0
 
 
+class StreamingCellWidget(QtGui.QWidget):
+    """
+    Shows a simulation while it runs. At `FRAME_RATE`, the latest
+    snapshot of a :class:`~kt_simul.gui.stream.SimulationStream` is
+    displayed; snapshots published in between are dropped.
+    """
+
+    def __init__(self, stream):
+        super(StreamingCellWidget, self).__init__()
+
+        from kt_simul.gui.stream import LiveFrames
+
+        self.stream = stream
+        self.frames = LiveFrames(stream.meta)
+        self.last_time_point = -1
+
+        self.setWindowTitle("Kinetochore simulation (live)")
+        self.view = ViewCellWidget(stream.meta, frames=self.frames)
+        self.label = QtGui.QLabel()
+
+        vbox = QtGui.QVBoxLayout()
+        vbox.setSpacing(5)
+        vbox.addWidget(self.view)
+        vbox.addWidget(self.label)
+        self.setLayout(vbox)
+
+        self.timerId = self.startTimer(1000 / FRAME_RATE)
+
+    def timerEvent(self, event):
+        done = self.stream.done
+        snap = self.stream.latest()
+        if snap is not None and snap['time_point'] != self.last_time_point:
+            self.last_time_point = snap['time_point']
+            self.frames.update(snap)
+            self.view.cell.gotoFrame(0)
+            self.view.updateScene([self.view.cell.boundingRect()])
+            self.label.setText("t = %.1f s" % (self.last_time_point *
+                                               self.frames.dt))
+        elif done:
+            # Last snapshot shown
+            self.killTimer(self.timerId)
+            self.timerId = 0
+            if self.stream.error is not None:
+                self.label.setText("Simulation failed: %s" %
+                                   self.stream.error)
+
+
 class ControlCellWidget(QtGui.QWidget):
 
-    def __init__(self, metaphase, parent=None):
+    def __init__(self, metaphase, parent=None, step=1):
         super(ControlCellWidget, self).__init__(parent)
-        numsteps = int(metaphase.KD.params['span'] / metaphase.KD.params['dt'])
+        numsteps = len(metaphase.KD.spbR.traj)
 
         orientation = QtCore.Qt.Horizontal
         self.slider = QtGui.QSlider(orientation)
         self.slider.setFocusPolicy(QtCore.Qt.StrongFocus)
         self.slider.setTickPosition(QtGui.QSlider.TicksBothSides)
         self.slider.setTickInterval(10)
-        self.slider.setSingleStep(1)
+        self.slider.setSingleStep(step)
 
         self.slider.setMinimum(0)
         self.slider.setMaximum(numsteps - 1)
@@ -137,13 +191,14 @@ class ControlCellWidget(QtGui.QWidget):
 
 class ViewCellWidget(QtGui.QGraphicsView):
 
-    def __init__(self, metaphase):
+    def __init__(self, metaphase, step=None, max_frames=None, frames=None):
         super(ViewCellWidget, self).__init__()
 
         self.setRenderHint(QtGui.QPainter.Antialiasing)
 
         self.timerId = 0
-        self.cell = CellItem(metaphase)
+        self.cell = CellItem(metaphase, step=step, max_frames=max_frames,
+                             frames=frames)
         scene = QtGui.QGraphicsScene(self)
 
         self.setCacheMode(QtGui.QGraphicsView.CacheBackground)
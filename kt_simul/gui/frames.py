@@ -0,0 +1,163 @@
+"""
+Per-frame positions and states of a simulation, computed once with numpy
+so that animations only need to index arrays. This module doesn't depend
+on Qt and is shared by the animation widgets and the video export.
+"""
+
+from __future__ import unicode_literals
+from __future__ import division
+from __future__ import absolute_import
+from __future__ import print_function
+
+import numpy as np
+
+__all__ = ["FrameBuffer", "UNPLUGGED", "CORRECT", "ERRONEOUS",
+           "centromere_y", "plugsite_y", "classify_states"]
+
+# Plugsite states in FrameBuffer.plug_states
+UNPLUGGED = 0
+CORRECT = 1
+ERRONEOUS = 2
+
+CH_SPACING = 0.55  # Vertical distance between chromosomes
+PLUGSITE_SPACING = 0.11  # Vertical distance between attachment sites
+
+
+def centromere_y(n, N):
+    """
+    Vertical position of the centromeres of chromosome `n` out of `N` in
+    the cell view.
+    """
+    return (n - (N - 1) / 2.) * CH_SPACING
+
+
+def plugsite_y(n, m, N, Mk):
+    """
+    Vertical position of the plugsite `m` of chromosome `n` in the cell view.
+    """
+    return centromere_y(n, N) + (m - (Mk - 1) / 2.) * PLUGSITE_SPACING
+
+
+def classify_states(states):
+    """
+    Classifies raw plug states (-1, 0 or 1) with the same majority rule as
+    :meth:`~kt_simul.core.components.Chromosome.calc_correct_history`.
+
+    Parameters
+    ----------
+    states : int array of shape (N, 2, Mk, ...)
+        Plug states of the plugsites of centromeres A and B of each
+        chromosome, trailing axes being e.g. time.
+
+    Returns
+    -------
+    plug_states : int8 array of shape (N, 2, Mk, ...)
+        One of `UNPLUGGED`, `CORRECT` or `ERRONEOUS`
+    sac_active : bool array of shape (N, ...)
+        True if at least one centromere of the chromosome is not attached
+    """
+    left = (states < 0).sum(axis=2)
+    right = (states > 0).sum(axis=2)
+    # Majority of attachments: centromere A faces the left pole
+    a_left = left[:, 0] + right[:, 1] > right[:, 0] + left[:, 1]
+    good_state = np.empty(left.shape, dtype=int)
+    good_state[:, 0] = np.where(a_left, -1, 1)
+    good_state[:, 1] = - good_state[:, 0]
+
+    plug_states = np.where(states == good_state[:, :, None],
+                           CORRECT, ERRONEOUS).astype(np.int8)
+    plug_states[states == 0] = UNPLUGGED
+
+    attached = (states != 0).any(axis=2)
+    return plug_states, ~(attached[:, 0] & attached[:, 1])
+
+
+class FrameBuffer(object):
+    """
+    Positions and states of all the spindle components for each frame of
+    an animation.
+
+    The correct/erroneous state of a plugsite is evaluated at each time
+    point with the same majority rule as
+    :meth:`~kt_simul.core.components.Chromosome.calc_correct_history`.
+
+    Parameters
+    ----------
+    meta : :class:`~kt_simul.core.simul_spindle.Metaphase`
+        A simulated metaphase
+    step : int or None
+        Keep one time point every `step`, for long simulations.
+    max_frames : int or None
+        If given, `step` is chosen so that there are at most `max_frames`
+        frames.
+
+    Attributes
+    ----------
+    time_points : array of shape (F,)
+        Time point of each frame
+    spbs : array of shape (F, 2)
+        Left and right SPB positions
+    centromeres : array of shape (F, N, 2)
+        Positions of centromeres A and B of each chromosome
+    plugsites : array of shape (F, N, 2, Mk)
+        Plugsite positions
+    plug_states : array of shape (F, N, 2, Mk)
+        One of `UNPLUGGED`, `CORRECT` or `ERRONEOUS`
+    sac_active : array of shape (F, N)
+        True if at least one centromere of the chromosome is not attached
+    """
+
+    def __init__(self, meta, step=None, max_frames=None):
+
+        KD = meta.KD
+        n_steps = len(KD.spbR.traj)
+        if max_frames is not None:
+            step = max(step or 1, int(np.ceil(n_steps / max_frames)))
+        self.step = step or 1
+        self.N = int(KD.params.N)
+        self.Mk = int(KD.params.Mk)
+        # Time between two recorded time points
+        self.dt = KD.dt * KD.record_every
+
+        idx = np.arange(0, n_steps, self.step)
+        self.time_points = idx
+
+        chromosomes = KD.chromosomes
+        cens = [(ch.cen_A, ch.cen_B) for ch in chromosomes]
+
+        self.spbs = np.array([KD.spbL.traj[idx], KD.spbR.traj[idx]]).T
+        self.centromeres = np.array([[cen.traj[idx] for cen in pair]
+                                     for pair in cens]).transpose(2, 0, 1)
+        self.plugsites = np.array([[[p.traj[idx] for p in cen.plugsites]
+                                    for cen in pair]
+                                   for pair in cens]).transpose(3, 0, 1, 2)
+
+        # (N, 2, Mk, F)
+        states = np.array([[[p.state_hist[idx] for p in cen.plugsites]
+                            for cen in pair] for pair in cens])
+        plug_states, sac_active = classify_states(states)
+        self.plug_states = plug_states.transpose(3, 0, 1, 2)
+        self.sac_active = sac_active.T
+
+    def __len__(self):
+        return len(self.time_points)
+
+    def frame_index(self, time_point):
+        """
+        Returns the frame showing `time_point`.
+        """
+        return min(max(int(time_point) // self.step, 0), len(self) - 1)
+
+    def correct_counts(self):
+        """
+        Number of correctly attached plugsites of each centromere, array of
+        shape (F, N, 2).
+        """
+        return (self.plug_states == CORRECT).sum(axis=-1)
+
+    def erroneous_counts(self):
+        """
+        Number of erroneously attached plugsites of each centromere, array
+        of shape (F, N, 2).
+        """
+        return (self.plug_states == ERRONEOUS).sum(axis=-1)
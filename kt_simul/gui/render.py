@@ -0,0 +1,356 @@
+"""
+Headless rendering of simulations.
+
+Nothing here needs a display: figures are drawn with the matplotlib Agg
+canvas and thumbnails are rasterized directly with numpy, so whole pools
+can be summarised on compute nodes::
+
+    from kt_simul.gui.render import render_simulation, render_pool
+
+    render_simulation(meta, "simu.png")
+    render_pool(pool, "pool.png", n_workers=8)
+
+A thumbnail shows the kymograph (SPBs in black, centromeres coloured by
+chromosome) above one strip per chromosome where green is the fraction of
+correct attachments and red the fraction of erroneous ones.
+"""
+
+from __future__ import unicode_literals
+from __future__ import division
+from __future__ import absolute_import
+from __future__ import print_function
+
+import os
+import logging
+import multiprocessing
+
+import numpy as np
+
+log = logging.getLogger(__name__)
+
+__all__ = ["kymo_data", "draw_kymo", "draw_attachment", "render_simulation",
+           "rasterize", "contact_sheet", "kymo_density", "render_density",
+           "render_pool", "render_multipool"]
+
+DEFAULT_LIMS = (-3, 3)
+
+
+def kymo_data(meta):
+    """
+    Extracts the arrays needed for rendering from a simulated
+    :class:`~kt_simul.core.simul_spindle.Metaphase`.
+
+    Returns
+    -------
+    dict
+        'times' (T,), 'spbs' (2, T), 'centromeres' (N, 2, T),
+        'correct' and 'erroneous' (N, T) total number of correct and
+        erroneous attachments of each chromosome, 'Mk' and 't_A'.
+    """
+    KD = meta.KD
+    chromosomes = KD.chromosomes
+    n_steps = len(KD.spbR.traj)
+    return {'times': np.arange(n_steps) * KD.dt * KD.record_every,
+            'spbs': np.array([KD.spbL.traj, KD.spbR.traj]),
+            'centromeres': np.array([[ch.cen_A.traj, ch.cen_B.traj]
+                                     for ch in chromosomes]),
+            'correct': np.array([np.asarray(ch.correct_history).sum(axis=1)
+                                 for ch in chromosomes]),
+            'erroneous': np.array([np.asarray(ch.erroneous_history).sum(axis=1)
+                                   for ch in chromosomes]),
+            'Mk': int(KD.params.Mk),
+            't_A': float(KD.params.t_A)}
+
+
+def _chrom_colors(n):
+    import matplotlib.colors as colors
+    import matplotlib.cm as cmx
+
+    if n == 3:
+        # Same colors as Metaphase.chrom_colors
+        return [colors.to_rgb(c) for c in ("red", "green", "blue")]
+    cmap = cmx.get_cmap('gist_rainbow')
+    return [cmap(i / n)[:3] for i in range(n)]
+
+
+def draw_kymo(ax, data, lims=DEFAULT_LIMS):
+    """
+    Draws the kymograph of `data` (see :func:`kymo_data`) on a matplotlib
+    axis with two line collections.
+    """
+    from matplotlib.collections import LineCollection
+
+    times = data['times']
+    spbs = data['spbs']
+    cens = data['centromeres']
+    n_chrom = cens.shape[0]
+
+    def segments(trajs):
+        return np.dstack([np.broadcast_to(times, trajs.shape), trajs])
+
+    ax.add_collection(LineCollection(segments(spbs), colors='black'))
+    colors = np.repeat(_chrom_colors(n_chrom), 2, axis=0)
+    ax.add_collection(LineCollection(segments(cens.reshape(-1, len(times))),
+                                     colors=colors, alpha=0.8))
+    ax.set_xlim(times[0], times[-1])
+    ax.axvline(data['t_A'], color='black')
+    if lims:
+        ax.set_ylim(*lims)
+    else:
+        ax.autoscale_view(scalex=False)
+    ax.grid()
+    return ax
+
+
+def draw_attachment(ax, data):
+    """
+    Draws the attachment histories as an image: one row per chromosome,
+    green for correct and red for erroneous attachments.
+    """
+    times = data['times']
+    ax.imshow(_attachment_image(data['correct'], data['erroneous'],
+                                data['Mk']),
+              aspect='auto', interpolation='nearest',
+              extent=(times[0], times[-1], data['correct'].shape[0], 0))
+    ax.set_yticks(np.arange(data['correct'].shape[0]) + 0.5)
+    ax.set_yticklabels(np.arange(data['correct'].shape[0]))
+    ax.set_ylabel('Chromosome')
+    return ax
+
+
+def _attachment_image(correct, erroneous, Mk):
+    image = np.zeros(correct.shape + (3,))
+    image[..., 0] = erroneous / (2. * Mk)
+    image[..., 1] = correct / (2. * Mk)
+    return np.clip(image, 0, 1)
+
+
+def render_simulation(meta, fname, lims=DEFAULT_LIMS, figsize=(12, 6),
+                      dpi=100):
+    """
+    Saves a kymograph and the attachment histories of a simulation to
+    `fname`, without a display.
+
+    Parameters
+    ----------
+    meta : :class:`~kt_simul.core.simul_spindle.Metaphase` or dict
+        A simulation or its :func:`kymo_data`
+    """
+    from matplotlib.figure import Figure
+    from matplotlib.backends.backend_agg import FigureCanvasAgg
+
+    data = meta if isinstance(meta, dict) else kymo_data(meta)
+
+    fig = Figure(figsize=figsize)
+    FigureCanvasAgg(fig)
+    kymo_ax = fig.add_axes([0.08, 0.35, 0.9, 0.6])
+    att_ax = fig.add_axes([0.08, 0.08, 0.9, 0.2], sharex=kymo_ax)
+    draw_kymo(kymo_ax, data, lims=lims)
+    draw_attachment(att_ax, data)
+    kymo_ax.set_ylabel('Distance from center (um)')
+    att_ax.set_xlabel('Time (s)')
+    fig.savefig(fname, dpi=dpi)
+
+
+def _bins(n_steps, width):
+    # Indices of the first time point of each column
+    return (np.arange(width) * n_steps) // width
+
+
+def _rows(trajs, lims, height):
+    """
+    Min and max pixel rows covered by each trajectory in each column.
+    """
+    lo_lim, hi_lim = lims
+    scale = (height - 1) / (hi_lim - lo_lim)
+    return np.clip(np.rint((hi_lim - trajs) * scale), 0, height - 1)
+
+
+def rasterize(data, size=(64, 96), lims=DEFAULT_LIMS, strip_height=3):
+    """
+    Rasterizes the kymograph and the attachment strips of a simulation.
+
+    Parameters
+    ----------
+    data : dict
+        See :func:`kymo_data`
+    size : (int, int)
+        Height and width in pixels of the kymograph part
+    strip_height : int
+        Height in pixels of the attachment strip of each chromosome
+
+    Returns
+    -------
+    array of shape (height + N * strip_height, width, 3) and dtype uint8
+    """
+    height, width = size
+    cens = data['centromeres']
+    n_chrom = cens.shape[0]
+    n_steps = cens.shape[-1]
+    starts = _bins(n_steps, width)
+    # Each column also covers the first point of the next one so that
+    # lines stay connected
+    ends = np.append(starts[1:], n_steps - 1)
+
+    trajs = np.concatenate([data['spbs'], cens.reshape(-1, n_steps)])
+    rows = _rows(trajs, lims, height)
+    lo = np.minimum(np.minimum.reduceat(rows, starts, axis=1),
+                    rows[:, ends])
+    hi = np.maximum(np.maximum.reduceat(rows, starts, axis=1),
+                    rows[:, ends])
+
+    colors = np.concatenate([np.zeros((2, 3)),
+                             np.repeat(_chrom_colors(n_chrom), 2, axis=0)])
+    kymo = np.ones((height, width, 3))
+    pixel_rows = np.arange(height)[:, None]
+    # Draw centromeres first, then SPBs on top
+    for i in list(range(2, len(trajs))) + [0, 1]:
+        mask = (pixel_rows >= lo[i]) & (pixel_rows <= hi[i])
+        kymo[mask] = colors[i]
+
+    # Attachment strips, averaged over each column
+    counts = np.diff(np.append(starts, n_steps))
+    correct = np.add.reduceat(data['correct'], starts, axis=1) / counts
+    erroneous = np.add.reduceat(data['erroneous'], starts, axis=1) / counts
+    strips = _attachment_image(correct, erroneous, data['Mk'])
+    strips = np.repeat(strips, strip_height, axis=0)
+
+    return (np.concatenate([kymo, strips]) * 255).astype(np.uint8)
+
+
+def contact_sheet(thumbnails, ncols=None, pad=2):
+    """
+    Tiles equally sized thumbnails in a grid.
+
+    Returns
+    -------
+    array of dtype uint8
+    """
+    n = len(thumbnails)
+    if ncols is None:
+        ncols = int(np.ceil(np.sqrt(n)))
+    nrows = int(np.ceil(n / ncols))
+    h, w = thumbnails[0].shape[:2]
+    sheet = np.full((nrows * (h + pad) + pad, ncols * (w + pad) + pad, 3),
+                    127, dtype=np.uint8)
+    for i, thumb in enumerate(thumbnails):
+        r, c = divmod(i, ncols)
+        y, x = pad + r * (h + pad), pad + c * (w + pad)
+        sheet[y:y + h, x:x + w] = thumb
+    return sheet
+
+
+def kymo_density(datas, size=(200, 400), lims=DEFAULT_LIMS):
+    """
+    Histogram of the centromere positions over time of many simulations.
+
+    Returns
+    -------
+    array of shape `size`
+        Number of centromere positions falling in each pixel, rows going
+        from `lims[1]` (top) to `lims[0]` (bottom).
+    """
+    height, width = size
+    density = np.zeros(size)
+    for data in datas:
+        cens = data['centromeres']
+        n_steps = cens.shape[-1]
+        rows = _rows(cens.reshape(-1, n_steps), lims, height).astype(int)
+        cols = np.broadcast_to((np.arange(n_steps) * width) // n_steps,
+                               rows.shape)
+        np.add.at(density, (rows.ravel(), cols.ravel()), 1)
+    return density
+
+
+def render_density(datas, fname, size=(200, 400), lims=DEFAULT_LIMS,
+                   figsize=(12, 5), dpi=100):
+    """
+    Saves the (log scaled) density of centromere positions of many
+    simulations to `fname`.
+    """
+    from matplotlib.figure import Figure
+    from matplotlib.backends.backend_agg import FigureCanvasAgg
+
+    datas = list(datas)
+    density = kymo_density(datas, size=size, lims=lims)
+    times = datas[0]['times']
+
+    fig = Figure(figsize=figsize)
+    FigureCanvasAgg(fig)
+    ax = fig.add_subplot(111)
+    ax.imshow(np.log1p(density), aspect='auto', cmap='gray_r',
+              extent=(times[0], times[-1], lims[0], lims[1]))
+    ax.set_xlabel('Time (s)')
+    ax.set_ylabel('Distance from center (um)')
+    ax.set_title('%i simulations' % len(datas))
+    fig.savefig(fname, dpi=dpi)
+
+
+def _save_image(image, fname):
+    import matplotlib.image
+
+    matplotlib.image.imsave(fname, image)
+
+
+def _thumbnail_from_file(args):
+    fpath, paramtree, measuretree, size, lims = args
+    from kt_simul.io.simuio import SimuIO
+
+    meta = SimuIO().read(fpath, paramtree=paramtree, measuretree=measuretree)
+    return rasterize(kymo_data(meta), size=size, lims=lims)
+
+
+def _thumbnails(pool, size, lims, n_workers):
+    arguments = [(fpath, pool.paramtree, pool.measuretree, size, lims)
+                 for fpath in pool.metaphases_path]
+    if n_workers == 1:
+        return list(map(_thumbnail_from_file, arguments))
+    workers = multiprocessing.Pool(processes=n_workers)
+    try:
+        return workers.map(_thumbnail_from_file, arguments)
+    finally:
+        workers.close()
+        workers.join()
+
+
+def render_pool(pool, fname, size=(64, 96), lims=DEFAULT_LIMS, ncols=None,
+                n_workers=None):
+    """
+    Writes a contact sheet of all the simulations of a
+    :class:`~kt_simul.pool.Pool`. Simulations are read and rasterized in
+    parallel.
+
+    Parameters
+    ----------
+    n_workers : int or None
+        Number of processes. Defaults to the number of cpus.
+    """
+    n_workers = n_workers or multiprocessing.cpu_count()
+    thumbnails = _thumbnails(pool, size, lims, n_workers)
+    _save_image(contact_sheet(thumbnails, ncols=ncols), fname)
+    log.info("Contact sheet of %i simulations saved to %s" %
+             (len(thumbnails), fname))
+
+
+def render_multipool(multipool, folder, size=(64, 96), lims=DEFAULT_LIMS,
+                     ncols=None, n_workers=None):
+    """
+    Writes one contact sheet per parameter set of a
+    :class:`~kt_simul.pool.MultiPool` in `folder`.
+
+    Returns
+    -------
+    list of str
+        Paths of the contact sheets
+    """
+    if not os.path.isdir(folder):
+        os.makedirs(folder)
+    fnames = []
+    for pool in multipool.pools:
+        relpath = os.path.relpath(pool.simu_path, multipool.multi_pool_path)
+        name = relpath.replace(os.sep, '_')
+        fname = os.path.join(folder, "%s.png" % name)
+        render_pool(pool, fname, size=size, lims=lims, ncols=ncols,
+                    n_workers=n_workers)
+        fnames.append(fname)
+    return fnames
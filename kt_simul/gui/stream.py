@@ -0,0 +1,229 @@
+"""
+Live streaming of a running simulation.
+
+:class:`SimulationStream` runs :meth:`Metaphase.simul` in a background
+thread. At most `max_rate` times per second, a snapshot of the spindle
+state is pushed to a bounded :class:`RingBuffer`: the simulation never
+waits for the viewer and old snapshots are dropped when nobody reads
+them::
+
+    stream = SimulationStream(meta)
+    stream.start()
+    while not stream.done:
+        snapshot = stream.latest()
+        ...
+    stream.join()
+
+:class:`LiveFrames` exposes the latest snapshot with the same attributes
+as a one-frame :class:`~kt_simul.gui.frames.FrameBuffer`, so the animation
+items can display it (see `Animator.play_live`).
+"""
+
+from __future__ import unicode_literals
+from __future__ import division
+from __future__ import absolute_import
+from __future__ import print_function
+
+import time
+import logging
+import threading
+import collections
+
+import numpy as np
+
+from kt_simul.gui.frames import classify_states
+
+log = logging.getLogger(__name__)
+
+__all__ = ["RingBuffer", "snapshot", "SimulationStream", "LiveFrames"]
+
+_clock = getattr(time, 'perf_counter', time.time)
+
+
+class RingBuffer(object):
+    """
+    Thread-safe bounded buffer. Putting an item never blocks: when the
+    buffer is full the oldest item is dropped.
+
+    Parameters
+    ----------
+    capacity : int
+    """
+
+    def __init__(self, capacity=8):
+        self._items = collections.deque(maxlen=capacity)
+        self._lock = threading.Lock()
+        self.n_put = 0
+
+    def put(self, item):
+        with self._lock:
+            self._items.append(item)
+            self.n_put += 1
+
+    def latest(self):
+        """
+        Returns the most recent item or None if the buffer is empty.
+        """
+        with self._lock:
+            return self._items[-1] if self._items else None
+
+    def drain(self):
+        """
+        Returns and removes all the buffered items, oldest first.
+        """
+        with self._lock:
+            items = list(self._items)
+            self._items.clear()
+        return items
+
+    def __len__(self):
+        return len(self._items)
+
+
+def snapshot(meta, time_point):
+    """
+    Returns the state of a running simulation at `time_point`.
+
+    Returns
+    -------
+    dict
+        'time_point', 'spbs' (2,), 'centromeres' (N, 2), 'plugsites' and
+        'states' (N, 2, Mk) positions and raw plug states of the plugsites
+    """
+    KD = meta.KD
+    N = len(KD.chromosomes)
+    plugsites = KD.all_plugsites
+    if KD.simulation_done:
+        # KD resets the current positions after the last step
+        def pos(organite):
+            return organite.traj[-1]
+    else:
+        def pos(organite):
+            return organite.pos
+    return {'time_point': time_point,
+            'spbs': np.array([pos(KD.spbL), pos(KD.spbR)]),
+            'centromeres': np.array([[pos(ch.cen_A), pos(ch.cen_B)]
+                                     for ch in KD.chromosomes]),
+            'plugsites': np.array([pos(p)
+                                   for p in plugsites]).reshape(N, 2, -1),
+            'states': np.array([p.plug_state
+                                for p in plugsites]).reshape(N, 2, -1)}
+
+
+class SimulationStream(object):
+    """
+    Runs a simulation in a background thread and publishes snapshots of
+    its state.
+
+    Parameters
+    ----------
+    meta : :class:`~kt_simul.core.simul_spindle.Metaphase`
+        A metaphase which has not been simulated yet
+    capacity : int
+        Number of snapshots kept in the ring buffer
+    max_rate : float
+        Maximum number of snapshots per second. Snapshots are only taken
+        when a viewer can show them, between chunks of steps run without
+        the GIL (see the `publish` argument of :meth:`Metaphase.simul`),
+        which keeps the simulation overhead negligible.
+    simul_kwargs : dict
+        Passed to :meth:`Metaphase.simul`
+    """
+
+    def __init__(self, meta, capacity=8, max_rate=50., **simul_kwargs):
+        self.meta = meta
+        self.buffer = RingBuffer(capacity)
+        self.min_interval = 1. / max_rate
+        self.simul_kwargs = simul_kwargs
+        self.error = None
+        self._last = None
+        self._done = threading.Event()
+        self._thread = threading.Thread(target=self._run)
+        self._thread.daemon = True
+
+    def start(self):
+        self._last = _clock() - self.min_interval
+        self._thread.start()
+        return self
+
+    def _run(self):
+        try:
+            self.meta.simul(publish=self._publish, **self.simul_kwargs)
+        except Exception as e:
+            log.error("Streamed simulation failed: %s" % e)
+            self.error = e
+        finally:
+            self._done.set()
+
+    def _publish(self, meta, time_point):
+        now = _clock()
+        if (now - self._last < self.min_interval and
+                time_point < meta.num_steps - 1):
+            return
+        self._last = now
+        self.buffer.put(snapshot(meta, time_point))
+
+    def latest(self):
+        """
+        Returns the most recent snapshot or None.
+        """
+        return self.buffer.latest()
+
+    @property
+    def done(self):
+        return self._done.is_set()
+
+    def join(self, timeout=None):
+        """
+        Waits for the end of the simulation.
+
+        Returns
+        -------
+        :class:`~kt_simul.core.simul_spindle.Metaphase`
+            The simulated metaphase
+        """
+        self._thread.join(timeout)
+        if self.error is not None:
+            raise self.error
+        return self.meta
+
+
+class LiveFrames(object):
+    """
+    One-frame :class:`~kt_simul.gui.frames.FrameBuffer` updated in place
+    from snapshots, so views on its arrays stay valid.
+
+    Parameters
+    ----------
+    meta : :class:`~kt_simul.core.simul_spindle.Metaphase`
+    """
+
+    step = 1
+
+    def __init__(self, meta):
+        KD = meta.KD
+        self.N = N = int(KD.params.N)
+        self.Mk = Mk = int(KD.params.Mk)
+        self.dt = KD.dt
+        self.time_points = np.zeros(1, dtype=int)
+        self.spbs = np.zeros((1, 2))
+        self.centromeres = np.zeros((1, N, 2))
+        self.plugsites = np.zeros((1, N, 2, Mk))
+        self.plug_states = np.zeros((1, N, 2, Mk), dtype=np.int8)
+        self.sac_active = np.zeros((1, N), dtype=bool)
+        self.update(snapshot(meta, 0))
+
+    def update(self, snap):
+        plug_states, sac_active = classify_states(snap['states'])
+        self.time_points[0] = snap['time_point']
+        self.spbs[0] = snap['spbs']
+        self.centromeres[0] = snap['centromeres']
+        self.plugsites[0] = snap['plugsites']
+        self.plug_states[0] = plug_states
+        self.sac_active[0] = sac_active
+
+    def __len__(self):
+        return 1
+
+    def frame_index(self, time_point):
+        return 0
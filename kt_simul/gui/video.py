@@ -0,0 +1,361 @@
+"""
+Offscreen export of simulation movies.
+
+Frames show the same cell view as the animation items (SPBs,
+centromeres, and plugsites coloured by their correct, erroneous or
+unplugged state). They are drawn with the matplotlib Agg canvas from a
+:class:`~kt_simul.gui.frames.FrameBuffer`, so no display is needed::
+
+    from kt_simul.gui.video import export_video, export_pool_videos
+
+    export_video(meta, "simu.mp4", max_frames=1000, n_workers=4)
+    export_video(meta, "frames/frame_%05d.png")
+    export_pool_videos(pool, "movies", n_workers=16)
+
+MP4 and other video formats are written through an `ffmpeg` pipe. GIFs
+fall back to Pillow when ffmpeg is not installed.
+"""
+
+from __future__ import unicode_literals
+from __future__ import division
+from __future__ import absolute_import
+from __future__ import print_function
+
+import os
+import logging
+import subprocess
+import multiprocessing
+
+import numpy as np
+
+from kt_simul.gui.frames import FrameBuffer, UNPLUGGED, CORRECT, ERRONEOUS
+from kt_simul.gui.frames import centromere_y, plugsite_y
+
+log = logging.getLogger(__name__)
+
+__all__ = ["CellRenderer", "write_frames", "export_video",
+           "export_pool_videos"]
+
+# Same geometry and colours as kt_simul.gui.animation.items
+CELL_BORDER = 2
+VIEW_BORDER = 0.15
+SPB_WIDTH = 0.5
+SPB_HEIGHT = 0.7
+PLUGSITE_WIDTH = 0.1
+PLUGSITE_HEIGHT = 0.1
+PLUGSITE_OFFSET = 0.05
+
+SPB_COLOR = (1., 0., 0., 1.)
+CH_COLOR = (0., 100 / 255., 100 / 255., 200 / 255.)
+ACTIVE_SAC_COLOR = (100 / 255., 10 / 255., 100 / 255., 200 / 255.)
+PLUGSITE_COLORS = np.zeros((3, 4))
+PLUGSITE_COLORS[UNPLUGGED] = (0., 20 / 255., 250 / 255., 200 / 255.)
+PLUGSITE_COLORS[CORRECT] = (0., 250 / 255., 20 / 255., 200 / 255.)
+PLUGSITE_COLORS[ERRONEOUS] = (1., 0., 0., 1.)
+
+
+class CellRenderer(object):
+    """
+    Draws the frames of a :class:`~kt_simul.gui.frames.FrameBuffer`
+    offscreen. The figure is built once, each frame only moves and
+    recolours the ellipse collections.
+
+    Parameters
+    ----------
+    frames : :class:`~kt_simul.gui.frames.FrameBuffer`
+    size : (int, int)
+        Width and height of the frames in pixels
+    fit_spindle : bool
+        If True, the view is fitted to the spindle, otherwise the whole
+        cell is shown as in the animation widget.
+    """
+
+    def __init__(self, frames, size=(640, 360), dpi=100, fit_spindle=True):
+        from matplotlib.figure import Figure
+        from matplotlib.backends.backend_agg import FigureCanvasAgg
+        from matplotlib.collections import EllipseCollection
+        from matplotlib.patches import FancyBboxPatch
+
+        self.frames = frames
+        N, Mk = frames.N, frames.Mk
+
+        width, height = size
+        self.fig = Figure(figsize=(width / dpi, height / dpi), dpi=dpi)
+        self.canvas = FigureCanvasAgg(self.fig)
+        ax = self.fig.add_axes([0, 0, 1, 1])
+        ax.set_axis_off()
+        self.ax = ax
+
+        cell_height = N * Mk * PLUGSITE_HEIGHT * 5 + CELL_BORDER
+        cell_width = np.abs(frames.spbs.max() * 6 + CELL_BORDER)
+        if fit_spindle:
+            view_width = 2 * (np.abs(frames.spbs).max() + SPB_WIDTH)
+            view_height = 2 * (abs(plugsite_y(0, 0, N, Mk)) + SPB_HEIGHT)
+        else:
+            view_width, view_height = cell_width, cell_height
+        ax.set_xlim(-view_width * (1 + VIEW_BORDER) / 2,
+                    view_width * (1 + VIEW_BORDER) / 2)
+        ax.set_ylim(-view_height * (1 + VIEW_BORDER) / 2,
+                    view_height * (1 + VIEW_BORDER) / 2)
+        ax.add_patch(FancyBboxPatch((-cell_width / 2, -cell_height / 2),
+                                    cell_width, cell_height,
+                                    boxstyle="round,pad=0,rounding_size=%f"
+                                    % (cell_height / 2),
+                                    facecolor='white', edgecolor='black'))
+        ax.set_aspect('equal', adjustable='datalim')
+
+        def ellipses(n, w, h, zorder):
+            collection = EllipseCollection(np.full(n, 2 * w),
+                                           np.full(n, 2 * h),
+                                           np.zeros(n), units='xy',
+                                           offsets=np.zeros((n, 2)),
+                                           transOffset=ax.transData,
+                                           edgecolors='black',
+                                           linewidths=0.3, zorder=zorder)
+            ax.add_collection(collection)
+            return collection
+
+        cen_height = Mk * PLUGSITE_HEIGHT + (Mk - 1) * PLUGSITE_OFFSET
+        self.spb_items = ellipses(2, SPB_WIDTH / 2, SPB_HEIGHT / 2, 2)
+        self.spb_items.set_facecolor(SPB_COLOR)
+        self.cen_items = ellipses(2 * N, PLUGSITE_WIDTH, cen_height / 2, 3)
+        self.plugsite_items = ellipses(2 * N * Mk, PLUGSITE_WIDTH / 2,
+                                       PLUGSITE_HEIGHT / 2, 4)
+
+        self.cen_y = np.repeat([centromere_y(n, N) for n in range(N)], 2)
+        self.plugsite_y = np.array([plugsite_y(n, m, N, Mk)
+                                    for n in range(N)
+                                    for side in range(2)
+                                    for m in range(Mk)])
+        self.label = ax.text(0.02, 0.95, "", transform=ax.transAxes)
+
+    def render(self, frame):
+        """
+        Returns
+        -------
+        array of shape (height, width, 3) and dtype uint8
+        """
+        frames = self.frames
+
+        self.spb_items.set_offsets(np.column_stack([frames.spbs[frame],
+                                                    np.zeros(2)]))
+        self.cen_items.set_offsets(np.column_stack(
+            [frames.centromeres[frame].ravel(), self.cen_y]))
+        self.cen_items.set_facecolor(
+            np.where(np.repeat(frames.sac_active[frame], 2)[:, None],
+                     ACTIVE_SAC_COLOR, CH_COLOR))
+        self.plugsite_items.set_offsets(np.column_stack(
+            [frames.plugsites[frame].ravel(), self.plugsite_y]))
+        self.plugsite_items.set_facecolor(
+            PLUGSITE_COLORS[frames.plug_states[frame].ravel()])
+        self.label.set_text("t = %.1f s" % (frames.time_points[frame] *
+                                            frames.dt))
+
+        self.canvas.draw()
+        return np.asarray(self.canvas.buffer_rgba())[..., :3].copy()
+
+    def __iter__(self):
+        for frame in range(len(self.frames)):
+            yield self.render(frame)
+
+
+def _has_ffmpeg():
+    try:
+        with open(os.devnull, 'w') as devnull:
+            subprocess.check_call(['ffmpeg', '-version'], stdout=devnull,
+                                  stderr=devnull)
+        return True
+    except (OSError, subprocess.CalledProcessError):
+        return False
+
+
+def write_frames(images, fname, fps=25):
+    """
+    Writes an iterable of RGB images.
+
+    Parameters
+    ----------
+    images : iterable of arrays of shape (height, width, 3)
+    fname : str
+        If it contains a '%' format (e.g. 'frames/frame_%05d.png'), a
+        numbered image sequence is written. Otherwise the extension gives
+        the video format, encoded with ffmpeg ('.mp4', '.gif', '.webm',
+        ...).
+
+    Returns
+    -------
+    int
+        Number of written frames
+    """
+    dirname = os.path.dirname(os.path.abspath(fname))
+    if not os.path.isdir(dirname):
+        os.makedirs(dirname)
+
+    if '%' in fname:
+        import matplotlib.image
+
+        n = 0
+        for n, image in enumerate(images, 1):
+            matplotlib.image.imsave(fname % (n - 1), image)
+        return n
+
+    if _has_ffmpeg():
+        return _write_ffmpeg(images, fname, fps)
+    elif fname.lower().endswith('.gif'):
+        return _write_gif(images, fname, fps)
+    raise RuntimeError("ffmpeg is needed to write %s" % fname)
+
+
+def _write_ffmpeg(images, fname, fps):
+    images = iter(images)
+    first = next(images)
+    height, width = first.shape[:2]
+    cmd = ['ffmpeg', '-y', '-loglevel', 'error',
+           '-f', 'rawvideo', '-pix_fmt', 'rgb24',
+           '-s', '%ix%i' % (width, height), '-r', str(fps), '-i', '-']
+    if fname.lower().endswith('.mp4'):
+        # yuv420p needs even dimensions
+        cmd += ['-vf', 'pad=ceil(iw/2)*2:ceil(ih/2)*2',
+                '-pix_fmt', 'yuv420p', '-vcodec', 'libx264']
+    cmd.append(fname)
+
+    process = subprocess.Popen(cmd, stdin=subprocess.PIPE)
+    try:
+        process.stdin.write(first.tobytes())
+        n = 1
+        for image in images:
+            process.stdin.write(image.tobytes())
+            n += 1
+    finally:
+        process.stdin.close()
+        if process.wait() != 0:
+            raise RuntimeError("ffmpeg failed to write %s" % fname)
+    return n
+
+
+def _write_gif(images, fname, fps):
+    from PIL import Image
+
+    frames = [Image.fromarray(image) for image in images]
+    frames[0].save(fname, save_all=True, append_images=frames[1:],
+                   duration=int(1000 / fps), loop=0)
+    return len(frames)
+
+
+# Per worker process renderer, see _init_worker
+_RENDERER = None
+
+
+def _init_worker(frames, size):
+    global _RENDERER
+    _RENDERER = CellRenderer(frames, size=size)
+
+
+def _render_chunk(bounds):
+    start, stop = bounds
+    return [_RENDERER.render(frame) for frame in range(start, stop)]
+
+
+def _render_parallel(frames, size, n_workers, chunk_size=25):
+    n_frames = len(frames)
+    chunks = [(start, min(start + chunk_size, n_frames))
+              for start in range(0, n_frames, chunk_size)]
+    workers = multiprocessing.Pool(processes=n_workers,
+                                   initializer=_init_worker,
+                                   initargs=(frames, size))
+    try:
+        # Chunks come back in order while later ones are being rendered
+        for images in workers.imap(_render_chunk, chunks):
+            for image in images:
+                yield image
+    finally:
+        workers.terminate()
+        workers.join()
+
+
+def export_video(meta, fname, fps=25, step=None, max_frames=None,
+                 size=(640, 360), n_workers=1):
+    """
+    Renders the cell view of a simulated metaphase to a movie or an image
+    sequence (see :func:`write_frames`).
+
+    Parameters
+    ----------
+    meta : :class:`~kt_simul.core.simul_spindle.Metaphase` or
+           :class:`~kt_simul.gui.frames.FrameBuffer`
+    step, max_frames : int or None
+        Decimation of the time points, see
+        :class:`~kt_simul.gui.frames.FrameBuffer`
+    size : (int, int)
+        Width and height of the frames in pixels
+    n_workers : int
+        Number of processes rendering frames
+
+    Returns
+    -------
+    int
+        Number of written frames
+    """
+    if isinstance(meta, FrameBuffer):
+        frames = meta
+    else:
+        frames = FrameBuffer(meta, step=step, max_frames=max_frames)
+
+    if n_workers > 1:
+        images = _render_parallel(frames, size, n_workers)
+    else:
+        images = iter(CellRenderer(frames, size=size))
+    n = write_frames(images, fname, fps=fps)
+    log.info("%i frames written to %s" % (n, fname))
+    return n
+
+
+def _export_member(args):
+    fpath, paramtree, measuretree, fname, kwargs = args
+    from kt_simul.io.simuio import SimuIO
+
+    meta = SimuIO().read(fpath, paramtree=paramtree, measuretree=measuretree)
+    export_video(meta, fname, **kwargs)
+    return fname
+
+
+def export_pool_videos(pool, folder, ext='mp4', n_workers=None, **kwargs):
+    """
+    Renders one movie per simulation of a :class:`~kt_simul.pool.Pool`,
+    the simulations being spread over worker processes.
+
+    Parameters
+    ----------
+    folder : str
+        Output folder, movies are named after the simulation files
+    ext : str
+        Movie format
+    n_workers : int or None
+        Defaults to the number of cpus
+    kwargs : dict
+        Passed to :func:`export_video`
+
+    Returns
+    -------
+    list of str
+        Paths of the movies
+    """
+    if not os.path.isdir(folder):
+        os.makedirs(folder)
+
+    arguments = []
+    for fpath in pool.metaphases_path:
+        name = os.path.splitext(os.path.basename(fpath))[0]
+        fname = os.path.join(folder, "%s.%s" % (name, ext))
+        arguments.append((fpath, pool.paramtree, pool.measuretree, fname,
+                          kwargs))
+
+    n_workers = n_workers or multiprocessing.cpu_count()
+    if n_workers == 1:
+        return list(map(_export_member, arguments))
+    workers = multiprocessing.Pool(processes=n_workers)
+    try:
+        return workers.map(_export_member, arguments)
+    finally:
+        workers.close()
+        workers.join()
@@ -0,0 +1,268 @@
+"""
+Local on-disk cache of simulation results.
+
+A simulation is fully determined by its (reduced) parameters, its initial
+attachment state, its random seed, its recording decimation, the arguments
+of :meth:`~kt_simul.core.simul_spindle.Metaphase.simul` (e.g. an ablation)
+and the code that runs it. Results are stored under a hash of those inputs
+so identical runs are read back from disk instead of being simulated again.
+"""
+
+from __future__ import unicode_literals
+from __future__ import division
+from __future__ import absolute_import
+from __future__ import print_function
+
+import os
+import shutil
+import hashlib
+import logging
+
+import kt_simul
+from kt_simul.utils.size import get_folder_size
+
+log = logging.getLogger(__name__)
+
+__all__ = ["SimuCache"]
+
+# Arguments of Metaphase.simul which don't change the results
+NEUTRAL_SIMUL_ARGS = ('checkpoint', )
+# Arguments of Metaphase.simul whose runs are never cached: a callback can
+# do anything, as can `publish`, and `until` leaves the simulation unfinished
+UNCACHEABLE_SIMUL_ARGS = ('callback', 'publish', 'until')
+
+
+class SimuCache(object):
+    """
+    Content-addressed cache of :class:`~kt_simul.core.simul_spindle.Metaphase`
+    results. Entries are HDF5 files written by
+    :class:`~kt_simul.io.simuio.SimuIO`.
+
+    Only seeded simulations can be cached: without a seed a run is not
+    reproducible and is never looked up nor stored. Neither are runs with a
+    `callback`, `publish` or `until` argument to `simul`.
+
+    Use it from a notebook::
+
+        cache = SimuCache("~/.kt_simul_cache", max_size=500)
+        meta = Metaphase(paramtree=paramtree, measuretree=measuretree, seed=42)
+        meta = cache.simul(meta)
+
+    Parameters
+    ----------
+    cache_path : str
+        Folder where results are stored. Created if it does not exist.
+    max_size : float or None
+        Maximum total size of the cache in MBytes. When it is exceeded, least
+        recently used entries are removed. None means no limit.
+
+    """
+
+    def __init__(self, cache_path, max_size=1024):
+
+        self.cache_path = os.path.abspath(os.path.expanduser(cache_path))
+        self.max_size = max_size
+
+        if not os.path.isdir(self.cache_path):
+            os.makedirs(self.cache_path)
+
+    @staticmethod
+    def key(paramtree, initial_plug, seed, rng='legacy', integrator='euler',
+            model='full', attachment='exact', record_every=1,
+            simul_args=None):
+        """
+        Returns the hash identifying a simulation.
+
+        Parameters
+        ----------
+        paramtree : :class:`~kt_simul.io.xml_handler.ParamTree`
+            Parameters as they are *after* `reduce_params`.
+        initial_plug : str
+        seed : int
+        rng : str
+            Kind of random number generator, see
+            :class:`~kt_simul.core.random_source.RandomSource`
+        integrator, model, attachment : str
+            See :class:`~kt_simul.core.spindle_dynamics.KinetoDynamics`
+        record_every : int
+            Recording decimation, see
+            :class:`~kt_simul.core.simul_spindle.Metaphase`
+        simul_args : dict or None
+            Arguments of :meth:`~kt_simul.core.simul_spindle.Metaphase.simul`
+            changing the results, e.g. `ablat` and `ablat_pos`
+
+        Returns
+        -------
+        str
+        """
+
+        items = sorted(paramtree.relative_dic.items())
+        content = "|".join("%s=%r" % (name, float(value))
+                           for name, value in items)
+        content += "|initial_plug=%s" % initial_plug
+        content += "|seed=%s" % seed
+        if rng != 'legacy':
+            # Keys of the results of legacy generators are unchanged
+            content += "|rng=%s" % rng
+        if integrator != 'euler':
+            content += "|integrator=%s" % integrator
+        if model != 'full':
+            content += "|model=%s" % model
+        if attachment != 'exact':
+            content += "|attachment=%s" % attachment
+        if record_every != 1:
+            content += "|record_every=%i" % record_every
+        for name, value in sorted((simul_args or {}).items()):
+            content += "|simul.%s=%r" % (name, value)
+        content += "|version=%s" % kt_simul.__version__
+
+        return hashlib.sha1(content.encode('utf-8')).hexdigest()
+
+    @staticmethod
+    def simul_args(kwargs):
+        """
+        Returns the arguments of
+        :meth:`~kt_simul.core.simul_spindle.Metaphase.simul` which change
+        the results, the ones left to their default removed, or None if a
+        run with `kwargs` can't be cached.
+        """
+        if any(kwargs.get(name) is not None
+               for name in UNCACHEABLE_SIMUL_ARGS):
+            return None
+        args = dict((name, value) for name, value in kwargs.items()
+                    if name not in NEUTRAL_SIMUL_ARGS + UNCACHEABLE_SIMUL_ARGS)
+        if args.get('ablat') is None:
+            # The ablation position is unused without ablation
+            args.pop('ablat', None)
+            args.pop('ablat_pos', None)
+        return args
+
+    def path(self, meta, record_every=None, **kwargs):
+        """
+        Returns the cache entry path of a
+        :class:`~kt_simul.core.simul_spindle.Metaphase` instance simulated
+        with the arguments `kwargs` of `simul`, or None if it can't be
+        cached. `record_every` defaults to the decimation of `meta`.
+        """
+        simul_args = self.simul_args(kwargs)
+        if meta.seed is None or simul_args is None:
+            return None
+        if record_every is None:
+            record_every = meta.KD.record_every
+        key = self.key(meta.paramtree, meta.initial_plug, meta.seed,
+                       getattr(meta, 'rng', 'legacy'),
+                       getattr(meta, 'integrator', 'euler'),
+                       getattr(meta, 'model', 'full'),
+                       getattr(meta, 'attachment', 'exact'),
+                       record_every, simul_args)
+        return os.path.join(self.cache_path, "%s.h5" % key)
+
+    def lookup(self, meta, record_every=None, **kwargs):
+        """
+        Returns the path of the cached results of `meta` or None if they
+        are not cached. A hit marks the entry as recently used. The
+        arguments are the ones of :meth:`path`.
+        """
+        path = self.path(meta, record_every, **kwargs)
+        if path is None or not os.path.isfile(path):
+            return None
+        try:
+            os.utime(path, None)
+        except OSError:
+            # Evicted by another process in the meantime
+            return None
+        return path
+
+    def load(self, meta, **kwargs):
+        """
+        Returns a :class:`~kt_simul.core.simul_spindle.Metaphase` read from
+        the cache or None on cache miss. `kwargs` are the arguments of
+        `simul`, see :meth:`path`.
+        """
+        from kt_simul.io.simuio import SimuIO
+
+        path = self.lookup(meta, **kwargs)
+        if path is None:
+            return None
+        log.info("Simulation read from cache %s" % path)
+        return SimuIO().read(path, paramtree=meta.paramtree,
+                             measuretree=meta.measuretree)
+
+    def store(self, meta, simufname=None, **kwargs):
+        """
+        Stores the results of `meta`, simulated with the arguments `kwargs`
+        of `simul`. If `simufname` is provided, the already saved HDF5 file
+        is copied instead of saving `meta` again.
+
+        Returns
+        -------
+        str or None
+            Path of the cache entry.
+        """
+        from kt_simul.io.simuio import SimuIO
+
+        path = self.path(meta, **kwargs)
+        if path is None:
+            return None
+
+        # Write then rename so concurrent readers never see partial files
+        tmp_path = "%s.%i.tmp" % (path, os.getpid())
+        if simufname is not None:
+            shutil.copyfile(simufname, tmp_path)
+        else:
+            SimuIO(meta).save(tmp_path)
+        os.rename(tmp_path, path)
+
+        self.evict()
+        return path
+
+    def simul(self, meta, **kwargs):
+        """
+        Returns a simulated :class:`~kt_simul.core.simul_spindle.Metaphase`:
+        read from the cache if available, otherwise `meta.simul(**kwargs)` is
+        run and its results are stored.
+        """
+        cached = self.load(meta, **kwargs)
+        if cached is not None:
+            return cached
+        meta.simul(**kwargs)
+        self.store(meta, **kwargs)
+        return meta
+
+    def evict(self):
+        """
+        Removes least recently used entries until the cache size is below
+        `max_size`.
+        """
+        if self.max_size is None:
+            return
+
+        entries = []
+        for fname in os.listdir(self.cache_path):
+            if not fname.endswith(".h5"):
+                continue
+            fpath = os.path.join(self.cache_path, fname)
+            try:
+                entries.append((os.path.getmtime(fpath), fpath))
+            except OSError:
+                continue
+        entries.sort()
+
+        size = get_folder_size(self.cache_path)
+        while entries and size > self.max_size:
+            mtime, fpath = entries.pop(0)
+            try:
+                fsize = os.path.getsize(fpath)
+                os.remove(fpath)
+            except OSError:
+                continue
+            size -= fsize / (1024 * 1024.0)
+            log.info("Evicted %s from cache" % fpath)
+
+    def clear(self):
+        """
+        Removes all entries.
+        """
+        for fname in os.listdir(self.cache_path):
+            if fname.endswith(".h5"):
+                os.remove(os.path.join(self.cache_path, fname))
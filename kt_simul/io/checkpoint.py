@@ -0,0 +1,145 @@
+"""
+Periodic checkpoints of running simulations.
+
+Long simulations can save their state every `interval` seconds, and be
+resumed from the last checkpoint after an interruption, with the same
+results as an uninterrupted run::
+
+    meta = Metaphase(paramtree=paramtree, measuretree=measuretree, seed=42)
+    meta.simul(checkpoint="long_run.ckpt")
+    # after a crash or a preemption
+    meta = Metaphase.resume("long_run.ckpt")
+
+A checkpoint is a pickled :class:`~kt_simul.core.snapshot.Snapshot` with
+the arguments of :meth:`~kt_simul.core.simul_spindle.Metaphase.simul`.
+The state is copied between two steps and written by a background
+thread, first to a temporary file which then replaces the checkpoint, so
+the checkpoint on disk is always complete.
+"""
+
+from __future__ import unicode_literals
+from __future__ import division
+from __future__ import absolute_import
+from __future__ import print_function
+
+import os
+import time
+import pickle
+import logging
+import threading
+
+import kt_simul
+
+log = logging.getLogger(__name__)
+
+__all__ = ["Checkpointer", "load_checkpoint"]
+
+
+class Checkpointer(object):
+    """
+    Writes the checkpoints of a simulation to a file.
+
+    Parameters
+    ----------
+    path : str
+        File of the checkpoint, replaced by each new checkpoint
+    interval : float
+        Minimum time between two checkpoints, in seconds of wall clock
+
+    Attributes
+    ----------
+    n_saved : int
+        Number of checkpoints written
+    error : Exception or None
+        Last error raised while writing a checkpoint. A failed checkpoint
+        doesn't stop the simulation.
+    """
+
+    def __init__(self, path, interval=600.):
+        self.path = os.path.abspath(os.path.expanduser(path))
+        self.interval = interval
+        self.n_saved = 0
+        self.error = None
+        self._last = time.time()
+        self._thread = None
+
+    @property
+    def busy(self):
+        """
+        True while a checkpoint is being written
+        """
+        return self._thread is not None and self._thread.is_alive()
+
+    def due(self):
+        """
+        Returns True if `interval` has elapsed since the last checkpoint
+        and the previous one has been written.
+        """
+        return (time.time() - self._last >= self.interval and
+                not self.busy)
+
+    def save(self, meta, **simul_args):
+        """
+        Takes a snapshot of `meta` and writes it in the background.
+
+        Parameters
+        ----------
+        meta : :class:`~kt_simul.core.simul_spindle.Metaphase`
+            Simulation stopped between two steps
+        simul_args :
+            Arguments of `meta.simul`, given again on resume
+        """
+        data = {'version': kt_simul.__version__,
+                'snapshot': meta.snapshot(),
+                'simul_args': simul_args,
+                'interval': self.interval}
+        self.close()
+        self._last = time.time()
+        self._thread = threading.Thread(target=self._write, args=(data,),
+                                        name='checkpoint')
+        self._thread.daemon = True
+        self._thread.start()
+
+    def _write(self, data):
+        tmp_path = "%s.%i.tmp" % (self.path, os.getpid())
+        try:
+            with open(tmp_path, 'wb') as f:
+                pickle.dump(data, f, protocol=pickle.HIGHEST_PROTOCOL)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp_path, self.path)
+        except Exception as e:
+            log.error("Checkpoint %s failed: %s" % (self.path, e))
+            self.error = e
+            return
+        self.n_saved += 1
+        log.info("Checkpoint at time point %i written to %s" %
+                 (data['snapshot'].time_point, self.path))
+
+    def close(self):
+        """
+        Waits for the checkpoint being written, if any.
+        """
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+
+def load_checkpoint(path):
+    """
+    Reads a checkpoint written by :class:`Checkpointer`.
+
+    Returns
+    -------
+    snapshot : :class:`~kt_simul.core.snapshot.Snapshot`
+    simul_args : dict
+        Arguments of :meth:`~kt_simul.core.simul_spindle.Metaphase.simul`
+    interval : float
+        Interval between the checkpoints
+    """
+    with open(os.path.expanduser(path), 'rb') as f:
+        data = pickle.load(f)
+    if data['version'] != kt_simul.__version__:
+        log.warning("Checkpoint written by kt_simul %s, resumed with %s" %
+                    (data['version'], kt_simul.__version__))
+    return data['snapshot'], data['simul_args'], data['interval']
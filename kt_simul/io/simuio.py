@@ -15,7 +15,6 @@ import zipfile
 import xml.etree.ElementTree as ET
 
 import numpy as np
-import pandas as pd
 
 from kt_simul.core.simul_spindle import Metaphase
 from kt_simul.core.spindle_dynamics import KinetoDynamics
@@ -41,7 +40,8 @@ class SimuIO():
             self.paramtree = self.meta.paramtree
             self.measuretree = self.meta.measuretree
 
-    def save(self, simufname, metadata=None, save_tree=True, verbose=False):
+    def save(self, simufname, metadata=None, save_tree=True, decimate=1,
+             verbose=False):
         """
         Save :class:`~kt_simul.core.simul_spindle.Metaphase` instance to
         HDF5 file. Each of the following element will be stored via
@@ -53,10 +53,14 @@ class SimuIO():
             Filename to save HDF5 file.
         metadata : dict
             Will be stored as a :class:`pandas.Series`. (Not implemented)
+        decimate : int
+            Only record one time point every `decimate` to reduce the size
+            of the file.
         verbose : bool
             Enable verbose mode.
 
         """
+        import pandas as pd
 
         KD = self.meta.KD
         paramtree = self.meta.paramtree
@@ -64,6 +68,10 @@ class SimuIO():
         timelapse = self.meta.timelapse
         chromosomes = self.KD.chromosomes
 
+        decimate = max(int(decimate), 1)
+        keep = slice(None, None, decimate)
+        timelapse = timelapse[keep]
+
         time_index = pd.MultiIndex.from_arrays([timelapse], names=['t'])
 
         """
@@ -82,11 +90,13 @@ class SimuIO():
         2.0 spb   A     0.166934
             spbL  B    -0.166934
         """
-        spbR = pd.DataFrame(KD.spbR.traj, columns=['x'], index=time_index)
-        spbL = pd.DataFrame(KD.spbL.traj, columns=['x'],index=time_index)
+        spbR = pd.DataFrame(KD.spbR.traj[keep], columns=['x'],
+                            index=time_index)
+        spbL = pd.DataFrame(KD.spbL.traj[keep], columns=['x'],
+                            index=time_index)
 
         spbs = pd.concat({('spb', 'A'): spbL, ('spb', 'B'): spbR}, names=['label', 'side'])
-        spbs = spbs.reorder_levels([2, 0, 1]).sort()
+        spbs = spbs.reorder_levels([2, 0, 1]).sort_index()
 
         """
         kts DataFrame look like that:
@@ -140,24 +150,26 @@ class SimuIO():
             ktA = chromosome.cen_A
             ktB = chromosome.cen_B
 
-            chromosomes_dic[(i, 'kt', 'A')] = pd.DataFrame(ktA.traj, columns=['x'], index=time_index)
-            chromosomes_dic[(i, 'kt', 'B')] = pd.DataFrame(ktB.traj, columns=['x'], index=time_index)
+            chromosomes_dic[(i, 'kt', 'A')] = pd.DataFrame(ktA.traj[keep], columns=['x'], index=time_index)
+            chromosomes_dic[(i, 'kt', 'B')] = pd.DataFrame(ktB.traj[keep], columns=['x'], index=time_index)
 
             for j, (psA, psB) in enumerate(zip(ktA.plugsites, ktB.plugsites)):
-                psA_df = pd.DataFrame.from_dict({'x': psA.traj, 'state_hist': psA.state_hist})
+                psA_df = pd.DataFrame.from_dict({'x': psA.traj[keep],
+                                                'state_hist': psA.state_hist[keep]})
                 psA_df.index = time_index
                 plugsites_dic[(i, 'kt', 'A', j)] = psA_df
 
-                psB_df = pd.DataFrame.from_dict({'x': psB.traj, 'state_hist': psB.state_hist})
+                psB_df = pd.DataFrame.from_dict({'x': psB.traj[keep],
+                                                'state_hist': psB.state_hist[keep]})
                 psB_df.index = time_index
                 plugsites_dic[(i, 'kt', 'B', j)] = psB_df
 
         kts = pd.concat(chromosomes_dic, names=['id', 'label', 'side'])
-        kts = kts.reorder_levels([3, 0, 1, 2]).sort()
+        kts = kts.reorder_levels([3, 0, 1, 2]).sort_index()
 
         plug_sites = pd.concat(plugsites_dic, names=['id', 'label', 'side', 'plug_id'])
-        plug_sites = plug_sites.reorder_levels([4, 0, 1, 2, 3]).sort()
-        plug_sites = plug_sites.reindex_axis(['x', 'state_hist'], axis=1)
+        plug_sites = plug_sites.reorder_levels([4, 0, 1, 2, 3]).sort_index()
+        plug_sites = plug_sites.reindex(columns=['x', 'state_hist'])
 
         df_to_save = ['spbs', 'kts', 'plug_sites']
         if save_tree:
@@ -195,23 +207,30 @@ class SimuIO():
         :class:`~kt_simul.core.simul_spindle.Metaphase`
 
         """
+        import pandas as pd
 
         store = pd.HDFStore(simufname)
 
         if not paramtree:
             param_root = build_tree(store['params'])
             paramtree = ParamTree(root=param_root)
-        params = paramtree.relative_dic
 
         if not measuretree:
             measure_root = build_tree(store['measures'])
             measuretree = ParamTree(root=measure_root,
                                     adimentionalized=False)
 
-        meta = Metaphase(paramtree=paramtree, measuretree=measuretree, verbose=False)
-        KD = KinetoDynamics(params)
+        # The saved parameters are already reduced
+        meta = Metaphase(paramtree=paramtree, measuretree=measuretree,
+                         reduce_p=False, verbose=False, memory_guard=False)
+        KD = KinetoDynamics(meta.KD.params)
 
         spbs = store['spbs']
+        # Files saved with `decimate` only hold some of the time points
+        meta.timelapse = np.unique(spbs.index.get_level_values('t'))
+        if len(meta.timelapse) > 1:
+            KD.record_every = int(round((meta.timelapse[1] -
+                                         meta.timelapse[0]) / KD.dt))
 
         KD.spbL.traj = spbs.xs('A', level='side').values.T[0]
         KD.spbR.traj = spbs.xs('B', level='side').values.T[0]
@@ -240,8 +259,8 @@ class SimuIO():
                 plugsite.plug_state = plugsite.state_hist[-1]
                 plugsite.tag = 'B'
 
-            ch.cen_A.calc_plug_vector()
-            ch.cen_B.calc_plug_vector()
+            ch.cen_A.count_plugged()
+            ch.cen_B.count_plugged()
 
             ch.calc_erroneous_history()
             ch.calc_correct_history()
@@ -271,7 +290,7 @@ def build_tree(df):
     for i, p in df.iterrows():
         et = ET.SubElement(root, "param")
 
-        for key, value in list(p.iteritems()):
+        for key, value in list(p.items()):
             if key not in tags:
                 et.set(key, value)
             else:
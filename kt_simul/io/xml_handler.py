@@ -8,12 +8,15 @@ from __future__ import division
 from __future__ import absolute_import
 from __future__ import print_function
 
+import os
 import logging
 import io
-from xml.etree.ElementTree import parse, tostring
+import collections
+import functools
+from xml.etree.ElementTree import (parse, tostring, Element, SubElement,
+                                   ElementTree)
 
 import numpy as np
-import pandas as pd
 
 from ..utils.format import isstr
 
@@ -25,6 +28,9 @@ FREQ_UNIT = u'Hz'
 FORCE_UNIT = u'pN'
 SPEED_UNIT = u'µm/s'
 
+# Changing one of those requires to adimentionalize every parameter
+UNIT_PARAMS = set(['Vk', 'Fk', 'dt'])
+
 __all__ = ["ParamTree", "indent", "ResultTree"]
 
 log = logging.getLogger(__name__)
@@ -51,47 +57,90 @@ def indent(elem, level=0):
 class ParamTree(object):
     """
     This class defines the container for the simulation parameters.
-    It wraps an ElementTree instance whose elements contains the
-    name, value (as a string), description and unit of each parameter and a
-    dictionnary that is used during the simulation.
+    It holds an indexed in-memory model of the parameters (name, value,
+    bounds, description and unit of each parameter) and the dictionnaries
+    that are used during the simulation. The xml tree is only a
+    serialization format: it is parsed once and rebuilt on demand by
+    :attr:`root`.
 
     The `value` attribute of the tree is not modified by adimentionalization,
     whereas the value in the dictionnary is changed.
+
+    Updating a parameter with :meth:`change_dic` or :meth:`update` is O(1) in
+    the number of parameters (unless the unit parameters `Vk`, `Fk` or `dt`
+    are changed) and :meth:`copy` is cheap, so trees can be cloned for
+    parameter sweeps.
     """
 
     def __init__(self, xmlfile=None, root=None, adimentionalized=True):
 
-        if xmlfile is not None:
-
-            if isinstance(xmlfile, io.IOBase) or isinstance(xmlfile, io.StringIO):
-                self.tree = parse(xmlfile)
-            elif isstr(xmlfile):
-                source = open(xmlfile, "r")
-                self.tree = parse(source)
-                source.close()
+        self._tree = None
 
-            self.root = self.tree.getroot()
-
-        elif root is not None:
-            self.root = root
+        if xmlfile is not None and isstr(xmlfile):
+            # The xml is rebuilt on demand from the model
+            self._load_model(*_parse_file(xmlfile))
+            self._root = None
         else:
-            log.error('A etree root or a xmlfile should be provided')
-
-        list = []
-        a = self.root.findall("param")
-        for i in a:
-            n = i.get("name")
-            v = i.get("value")
-            if '.' in v or 'e' in v:
-                v = float(v)
-            else:
-                v = int(v)
-            list.append((n, v))
-        self.absolute_dic = dict(list)
-        self.relative_dic = dict(list)
+            if xmlfile is not None:
+                self._tree = parse(xmlfile)
+                root = self._tree.getroot()
+            elif root is None:
+                log.error('A etree root or a xmlfile should be provided')
+            self._load_root(root)
+
+        self.absolute_dic = dict((name, _parse_value(param['attrib']['value']))
+                                 for name, param in self._params.items())
+        self.relative_dic = dict(self.absolute_dic)
         if adimentionalized:
             self.adimentionalize()
 
+    def _load_root(self, root):
+        """
+        Builds the in-memory model from an xml root element
+        """
+        self._load_model(root.tag, [_param_model(el)
+                                    for el in root.findall("param")])
+        self._root = root
+
+    def _load_model(self, root_tag, params):
+        """
+        Builds the in-memory model from the tag of the root element and
+        the parameters as returned by :func:`_param_model`
+        """
+        self._root_tag = root_tag
+        self._params = collections.OrderedDict()
+        self._units = {}
+        for name, attrib, children, unit in params:
+            self._params[name] = {'attrib': dict(attrib),
+                                  'children': children}
+            self._units[name] = unit
+
+    @property
+    def tree(self):
+        """
+        The xml tree, rebuilt from the in-memory model unless it was read
+        from a file object.
+        """
+        if self._tree is not None:
+            return self._tree
+        return ElementTree(self.root)
+
+    @property
+    def root(self):
+        """
+        The xml root element, rebuilt from the in-memory model if parameters
+        have been changed since the tree was parsed.
+        """
+        if self._root is None:
+            root = Element(self._root_tag)
+            for param in self._params.values():
+                el = SubElement(root, "param", param['attrib'])
+                for tag, text in param['children']:
+                    child = SubElement(el, tag)
+                    child.text = text
+            self._root = root
+        return self._root
+
     def has_unit(self, param, UNIT):
 
         unit_str = param.find("unit").text
@@ -100,7 +149,24 @@ class ParamTree(object):
         else:
             return False
 
-    def adimentionalize(self):
+    def _relative_value(self, key, val):
+        """
+        Returns the adimentionalized value of parameter `key`.
+        """
+        unit = self._units.get(key)
+        if unit == SPRING_UNIT:
+            return val / self.absolute_dic["Fk"]
+        elif unit == DRAG_UNIT:
+            return val * self.absolute_dic["Vk"] / self.absolute_dic["Fk"]
+        elif unit == SPEED_UNIT:
+            return val / self.absolute_dic["Vk"]
+        elif unit == FREQ_UNIT:
+            return val * self.absolute_dic["dt"]
+        elif unit == FORCE_UNIT:
+            return val / self.absolute_dic["Fk"]
+        return val
+
+    def adimentionalize(self, keys=None):
         """
         This function scales everything taking dt as unit time, Vk as
         unit speed, and Fk as unit force. It relies on a correct
@@ -110,27 +176,21 @@ class ParamTree(object):
         Note that the "value" attribute of the ElementTree instance are
         NOT modified. Also, applying this function on an already
         adimentionalized  dictionnary won"t change any thing
+
+        Parameters
+        ----------
+        keys : iterable or None
+            Only adimentionalize those parameters. All of them if None.
         """
 
-        Vk = self.absolute_dic["Vk"]
-        Fk = self.absolute_dic["Fk"]
-        dt = self.absolute_dic["dt"]
-        params = self.root.findall("param")
-
-        for param in params:
-            key = param.get("name")
-            val = self.absolute_dic[key]
-            if self.has_unit(param, SPRING_UNIT):
-                val /= Fk
-            elif self.has_unit(param, DRAG_UNIT):
-                val *= Vk / Fk
-            elif self.has_unit(param, SPEED_UNIT):
-                val /= Vk
-            elif self.has_unit(param, FREQ_UNIT):
-                val *= dt
-            elif self.has_unit(param, FORCE_UNIT):
-                val /= Fk
-            self.relative_dic[key] = val
+        # Fail early on trees without unit parameters (e.g. measures)
+        self.absolute_dic["Vk"], self.absolute_dic["Fk"], self.absolute_dic["dt"]
+
+        if keys is None:
+            keys = self._params.keys()
+        for key in keys:
+            self.relative_dic[key] = self._relative_value(
+                key, self.absolute_dic[key])
 
     def change_dic(self, key, new_value, verbose=True):
         """
@@ -140,27 +200,70 @@ class ParamTree(object):
 
         new_value is absolute - it has units
         """
+        try:
+            self.update(**{key: new_value})
+        except KeyError:
+            log.error("Couldn't find the parameter %s" % key)
+            return 0
 
-        if self.absolute_dic is None:
-            self.create_dic()
-        a = self.root.findall('param')
-        for item in a:
-            if item.attrib['name'] == key:
-                item.attrib['value'] = str(new_value)
-                try:
-                    self.absolute_dic[key] = new_value
-                except KeyError:
-                    log.error("Couldn't find the parameter %s" % key)
-                    return 0
-                break
+    def update(self, **kwargs):
+        """
+        Changes several parameters at once. Values are absolute - they have
+        units. The relative dictionnary is updated once for all the
+        changed parameters.
+
+        Raises
+        ------
+        KeyError
+            If one of the parameters doesn't exist. The tree is then left
+            unchanged.
+        """
+
+        unknown = [key for key in kwargs if key not in self._params]
+        if unknown:
+            raise KeyError("Couldn't find the parameters %s" %
+                           ', '.join(sorted(unknown)))
+
+        for key, new_value in kwargs.items():
+            self._params[key]['attrib']['value'] = str(new_value)
+            self.absolute_dic[key] = new_value
+        self._root = None
+
+        if UNIT_PARAMS.intersection(kwargs):
+            keys = None
+        else:
+            keys = kwargs.keys()
         try:
-            self.adimentionalize()
+            self.adimentionalize(keys)
         except KeyError:
             if 'metaph_rate' in self.absolute_dic.keys():
-                self.relative_dic = self.absolute_dic
+                for key in kwargs:
+                    self.relative_dic[key] = self.absolute_dic[key]
             else:
                 log.error('Oooups')
-                raise()
+                raise
+
+    def copy(self):
+        """
+        Returns an independent copy of the tree. Cheap: the xml is not
+        copied nor parsed again.
+        """
+        new = self.__class__.__new__(self.__class__)
+        new.__dict__.update(self.__dict__)
+        new._params = collections.OrderedDict(
+            (name, {'attrib': dict(param['attrib']),
+                    'children': param['children']})
+            for name, param in self._params.items())
+        new.absolute_dic = dict(self.absolute_dic)
+        new.relative_dic = dict(self.relative_dic)
+        return new
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        # The xml is rebuilt on demand from the model
+        state['_tree'] = None
+        state['_root'] = None
+        return state
 
     def save(self, path):
         """
@@ -180,36 +283,81 @@ class ParamTree(object):
         :class:`pandas.DataFrame`
         """
 
-        import codecs
-        c = codecs.lookup('utf-8')
+        import pandas as pd
 
         attributs = {'name': [], 'value': [], 'min': [], 'max': [], 'step': []}
         tags = {'unit': [], 'description': []}
 
-        for el in self.root.findall("param"):
+        for param in self._params.values():
 
             for name in attributs:
-                value = el.get(name)
+                value = param['attrib'].get(name)
                 attributs[name].append(value)
+            children = dict(param['children'])
             for name in tags:
-                value = el.find(name).text
+                value = children.get(name)
                 tags[name].append(value)
 
         attributs.update(tags)
         df = pd.DataFrame.from_dict(attributs)
         cols_ordered = ['name', 'value', 'unit', 'description', 'min', 'max', 'step']
-        df = df.reindex_axis(cols_ordered, axis=1)
+        df = df.reindex(columns=cols_ordered)
 
         return df
 
 
+def _parse_file(path):
+    """
+    Returns the tag of the root element and the parameters of a xml file.
+    The parsed models of the last files are kept in memory (and re-parsed
+    if modified on disk) so building many trees from the same file is
+    cheap. They are immutable, each tree building its own model from them.
+    """
+    path = os.path.abspath(path)
+    return _parse_model(path, os.path.getmtime(path))
+
+
+@functools.lru_cache(maxsize=32)
+def _parse_model(path, mtime):
+    source = open(path, "r")
+    root = parse(source).getroot()
+    source.close()
+    return root.tag, tuple(_param_model(el) for el in root.findall("param"))
+
+
+def _param_model(el):
+    """
+    Returns the name, attributes, children and unit of a `param` element
+    """
+    unit = el.find("unit")
+    return (el.get("name"), tuple(el.attrib.items()),
+            tuple((child.tag, child.text) for child in el),
+            unit.text if unit is not None else None)
+
+
+def _parse_value(value):
+    """
+    Parameter values are stored as strings in the xml files.
+    """
+    if '.' in value or 'e' in value:
+        return float(value)
+    return int(value)
+
+
 class ResultTree(ParamTree):
 
     def __init__(self, xmlfile, datafile):
 
-        ParamTree.__init__(self, xmlfile=xmlfile, adimentionalized=False)
+        # The trajectories are not part of the cached parameter models
+        tree = parse(xmlfile)
+        ParamTree.__init__(self, root=tree.getroot(), adimentionalized=False)
+        self._tree = tree
         self.data = np.load(datafile)
 
+    def __getstate__(self):
+        # Trajectories are only stored in the xml tree
+        return self.__dict__.copy()
+
     def get_spb_trajs(self):
         Rcol = None
         Lcol = None
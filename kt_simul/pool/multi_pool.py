@@ -14,11 +14,10 @@ import logging
 import itertools
 import gc
 
-import pandas as pd
 import numpy as np
 
 from kt_simul.io.simuio import build_tree
-from kt_simul.utils.progress import pprogress
+from kt_simul.utils.progress import Progress, TerminalSink
 from kt_simul.io.xml_handler import ParamTree
 from kt_simul.core import parameters
 from kt_simul.pool import Pool
@@ -42,6 +41,18 @@ class MultiPool:
     MultiPool
 
     TODO: Add doc
+
+    Parameters
+    ----------
+    progress : list of callables or None
+        Sinks receiving the progress events of :meth:`run`, one unit being
+        a parameter set (see :mod:`kt_simul.utils.progress`). If None, a
+        progress bar is drawn when verbose is True.
+    seed, rng, n_workers, decimate, memory_budget, threads :
+        Passed to each :class:`~kt_simul.pool.Pool`, so the memory guard
+        plans each parameter set on its own
+    integrator, model, attachment :
+        Passed to each :class:`~kt_simul.pool.Pool`
     """
 
     def __init__(self, multi_pool_path,
@@ -53,7 +64,19 @@ class MultiPool:
                  n_simu=10,
                  initial_plug='random',
                  parallel=True,
-                 verbose=True):
+                 verbose=True,
+                 progress=None,
+                 seed=None,
+                 n_workers=None,
+                 decimate=1,
+                 memory_budget=None,
+                 threads=False,
+                 rng='pcg64',
+                 integrator='euler',
+                 model='full',
+                 attachment='exact'):
+
+        import pandas as pd
 
         self.verbose = verbose
         if not self.verbose:
@@ -62,6 +85,12 @@ class MultiPool:
             log.disabled = False
 
         self.multi_pool_path = multi_pool_path
+        if progress is None:
+            progress = [TerminalSink()] if verbose else []
+        self.progress_sinks = progress
+        self.n_workers = n_workers
+        self.memory_budget = memory_budget
+        self.threads = threads
 
         if not load:
             # Create a folder. Raise an exeception if it exists.
@@ -77,6 +106,12 @@ class MultiPool:
             self.parallel = parallel
             self.initial_plug = initial_plug
             self.trees = trees
+            self.seed = seed
+            self.rng = rng
+            self.integrator = integrator
+            self.model = model
+            self.attachment = attachment
+            self.decimate = decimate
 
             self.simus_run = False
 
@@ -87,10 +122,19 @@ class MultiPool:
             store['simus_path'] = self.simus_path
             store['params'] = paramtree.to_df()
             store['measures'] = measuretree.to_df()
+            # Trees of the scanned parameters, needed to resume
+            store['trees'] = pd.Series(list(trees),
+                                       index=[p[0] for p in parameters])
 
             metadata = pd.Series({'n_simu': self.n_simu,
                                   'parallel': self.parallel,
                                   'initial_plug': initial_plug,
+                                  'seed': -1 if seed is None else seed,
+                                  'decimate': decimate,
+                                  'rng': rng,
+                                  'integrator': integrator,
+                                  'model': model,
+                                  'attachment': attachment,
                                   'datetime': str(datetime.datetime.now())})
             store['metadata'] = metadata
             store.close()
@@ -111,6 +155,20 @@ class MultiPool:
             self.n_simu = store['metadata']['n_simu']
             self.parallel = store['metadata']['parallel']
             self.initial_plug = store['metadata']['initial_plug']
+            seed = store['metadata'].get('seed', -1)
+            self.seed = None if seed < 0 else int(seed)
+            self.decimate = int(store['metadata'].get('decimate', 1))
+            self.rng = store['metadata'].get('rng', 'legacy')
+            self.integrator = store['metadata'].get('integrator', 'euler')
+            self.model = store['metadata'].get('model', 'full')
+            self.attachment = store['metadata'].get('attachment', 'exact')
+            if '/trees' in store.keys():
+                trees = store['trees']
+                self.parameters = [(name, None, None) for name in trees.index]
+                self.trees = list(trees.values)
+            else:
+                self.parameters = None
+                self.trees = None
             store.close()
 
             self.load_pools()
@@ -128,55 +186,106 @@ class MultiPool:
         log.info('Run simulations for %i different set of parameters' % n)
         log.info('Each set of parameters runs %s simulations' % self.n_simu)
 
-        sys.stdout.flush()
-        for i, (parameters, rows) in enumerate(self.simus_path.iterrows()):
-            if self.verbose:
-                pprogress((i) / n * 100)
-                sys.stdout.flush()
-
-            paramtree = self.paramtree
-            measuretree = self.measuretree
-
-            if isinstance(parameters, np.ndarray):
-                parameters = parameters.tolist()
+        progress = Progress(n, name='multipool', unit='pools',
+                            sinks=self.progress_sinks)
+        for i, (values, rows) in enumerate(self.simus_path.iterrows()):
+            progress.update(i)
+            self._run_pool(values, rows)
+            gc.collect()
 
-            names = list(map(lambda x: x[0], self.parameters))
-            for i, parameter in enumerate(parameters):
-                if self.trees[i] == 'paramtree':
-                    paramtree.change_dic(names[i], parameter)
-                elif self.trees[i] == 'measuretree':
-                    measuretree.change_dic(names[i], parameter)
+        progress.finish()
 
-            simu_path = os.path.join(self.multi_pool_path, rows['relpath'])
+        self.load_pools()
+        log.info("Simulations are done")
+        self.simus_run = True
 
-            pool_params = {'load': False,
-                           'paramtree': paramtree,
-                           'measuretree': measuretree,
-                           'n_simu': self.n_simu,
-                           'simu_path': simu_path,
-                           'parallel': self.parallel,
-                           'verbose': False
-                           }
+    def resume(self):
+        """
+        Completes an interrupted multipool: pools which have been started
+        are resumed (see :meth:`Pool.resume`) and the others are run.
 
-            pool = Pool(**pool_params)
-            pool.run()
+        Returns
+        -------
+        int
+            Number of pools which were not complete
+        """
+        if self.trees is None:
+            raise ValueError("This multipool was created without the trees "
+                             "of its parameters and can't be resumed.")
 
-            del pool
+        n_resumed = 0
+        for values, rows in self.simus_path.iterrows():
+            simu_path = os.path.join(self.multi_pool_path, rows['relpath'])
+            if os.path.isfile(os.path.join(simu_path, "metadata.h5")):
+                pool = Pool(load=True, simu_path=simu_path, verbose=False,
+                            n_workers=self.n_workers,
+                            memory_budget=self.memory_budget,
+                            threads=self.threads)
+                if pool.resume():
+                    n_resumed += 1
+            else:
+                if os.path.isdir(simu_path):
+                    # Interrupted before the pool metadata was written
+                    os.rmdir(simu_path)
+                self._run_pool(values, rows)
+                n_resumed += 1
             gc.collect()
 
-        if self.verbose:
-            pprogress(-1)
-
         self.load_pools()
-        log.info("Simulations are done")
         self.simus_run = True
+        return n_resumed
+
+    def _run_pool(self, values, rows):
+
+        paramtree = self.paramtree
+        measuretree = self.measuretree
+
+        if isinstance(values, np.ndarray):
+            values = values.tolist()
+        elif not isinstance(values, (list, tuple)):
+            values = [values]
+
+        names = list(map(lambda x: x[0], self.parameters))
+        for i, parameter in enumerate(values):
+            if self.trees[i] == 'paramtree':
+                paramtree.change_dic(names[i], parameter)
+            elif self.trees[i] == 'measuretree':
+                measuretree.change_dic(names[i], parameter)
+
+        simu_path = os.path.join(self.multi_pool_path, rows['relpath'])
+
+        pool_params = {'load': False,
+                       'paramtree': paramtree,
+                       'measuretree': measuretree,
+                       'n_simu': self.n_simu,
+                       'simu_path': simu_path,
+                       'parallel': self.parallel,
+                       'initial_plug': self.initial_plug,
+                       'seed': self.seed,
+                       'rng': self.rng,
+                       'integrator': self.integrator,
+                       'model': self.model,
+                       'attachment': self.attachment,
+                       'n_workers': self.n_workers,
+                       'decimate': self.decimate,
+                       'memory_budget': self.memory_budget,
+                       'threads': self.threads,
+                       'verbose': False
+                       }
+
+        pool = Pool(**pool_params)
+        pool.run()
 
     def load_pools(self):
         """
+        Pools which have not been started (see :meth:`resume`) are skipped.
         """
         self.pools = []
         for dalpha, pool_path in self.simus_path.iterrows():
             simu_path = os.path.join(self.multi_pool_path, pool_path['relpath'])
+            if not os.path.isfile(os.path.join(simu_path, "metadata.h5")):
+                log.warning("Pool %s has not been run" % simu_path)
+                continue
             pool_params = {'load': True,
                            'simu_path': simu_path,
                            'verbose': True
@@ -185,6 +294,8 @@ class MultiPool:
         return self.pools
 
     def _build_path(self):
+        import pandas as pd
+
         names_set = itertools.repeat(list(map(lambda x: x[0], self.parameters)))
         values_set = list(
             itertools.product(*map(lambda x: x[1], self.parameters)))
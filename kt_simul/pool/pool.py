@@ -13,18 +13,26 @@ import sys
 import datetime
 import math
 import multiprocessing
+import multiprocessing.pool
+import threading
 import itertools
-
-import pandas as pd
+import shutil
 
 from kt_simul.core.simul_spindle import Metaphase
+from kt_simul.core import parameters
 from kt_simul.io.simuio import SimuIO
 from kt_simul.io.simuio import build_tree
 from kt_simul.io.xml_handler import ParamTree
-from kt_simul.utils.progress import pprogress
+from kt_simul.utils.progress import Progress, TerminalSink
+from kt_simul.utils.profiling import merge_reports
+from kt_simul.utils.memory import (estimate_memory, plan_memory, peak_rss,
+                                   MB)
 
 log = logging.getLogger(__name__)
 
+# HDF5 files are read and written by one thread at a time
+_IO_LOCK = threading.Lock()
+
 
 class FolderExistException(Exception):
     pass
@@ -34,10 +42,64 @@ class FolderNotExistException(Exception):
     pass
 
 
+class CanceledByUserException(Exception):
+    pass
+
+
 class Pool:
 
     """
     Pool launchs a pool of simulation with same parameters.
+
+    Parameters
+    ----------
+    seed : int or None
+        If not None, simulation `i` of the pool is run with seed `seed + i`
+        so the pool can be reproduced.
+    rng : {'pcg64', 'philox', 'legacy'}
+        Kind of random number generator of the simulations (see
+        :class:`~kt_simul.core.random_source.RandomSource`). Pools saved
+        before it was recorded are loaded as 'legacy'.
+    integrator : {'euler', 'implicit'}
+        Time integration of the simulations (see
+        :class:`~kt_simul.core.spindle_dynamics.KinetoDynamics`)
+    model : {'full', 'reduced'}
+    attachment : {'exact', 'tau_leap'}
+        Model and attachment draws of the simulations (see
+        :class:`~kt_simul.core.simul_spindle.Metaphase`)
+    cache : :class:`~kt_simul.io.cache.SimuCache` or None
+        Results of seeded simulations already present in the cache are
+        copied from it instead of being simulated again. New results are
+        added to the cache.
+    n_workers : int or None
+        Number of worker processes in parallel mode. Defaults to the
+        number of cpus + 1.
+    profile : bool or str
+        If True or 'trace', each simulation is profiled (see the `profile`
+        argument of :class:`~kt_simul.core.simul_spindle.Metaphase`) and
+        the reports of all workers are merged in `self.profile_report`
+        after :meth:`run`.
+    progress : list of callables or None
+        Sinks receiving the progress events of :meth:`run`, one unit being
+        a completed simulation (see :mod:`kt_simul.utils.progress`). If
+        None, a progress bar is drawn when verbose is True.
+    decimate : int
+        Only record one time point every `decimate` (see the
+        `record_every` argument of
+        :class:`~kt_simul.core.simul_spindle.Metaphase`).
+    memory_budget : float, 'auto' or None
+        Memory in MBytes the concurrent simulations may use, or 'auto' for
+        a fraction of the available memory. The number of workers is
+        reduced and, if a single simulation doesn't fit, the recording is
+        decimated (see :func:`~kt_simul.utils.memory.plan_memory`). None
+        (default) disables the guard. The estimate and the peak memory are
+        in `self.memory_report` after :meth:`run`.
+    threads : bool
+        If True, the parallel simulations run in threads of this process
+        instead of worker processes. Their steps don't hold the GIL (see the
+        `nogil` argument of :class:`~kt_simul.core.simul_spindle.Metaphase`),
+        the parameters are shared instead of being pickled and the memory
+        of the interpreter is only paid once.
     """
 
     def __init__(self, simu_path,
@@ -47,7 +109,19 @@ class Pool:
                  n_simu=100,
                  initial_plug='random',
                  parallel=True,
-                 verbose=True):
+                 verbose=True,
+                 seed=None,
+                 cache=None,
+                 n_workers=None,
+                 profile=False,
+                 progress=None,
+                 decimate=1,
+                 memory_budget=None,
+                 threads=False,
+                 rng='pcg64',
+                 integrator='euler',
+                 model='full',
+                 attachment='exact'):
 
         self.verbose = verbose
         if not self.verbose:
@@ -56,6 +130,16 @@ class Pool:
             log.disabled = False
 
         self.simu_path = simu_path
+        self.cache = cache
+        self.n_workers = n_workers
+        self.profile = profile
+        self.profile_report = None
+        self.memory_budget = memory_budget
+        self.memory_report = None
+        self.threads = threads
+        if progress is None:
+            progress = [TerminalSink()] if verbose else []
+        self.progress_sinks = progress
 
         if not load:
             self.paramtree = paramtree
@@ -63,6 +147,18 @@ class Pool:
             self.initial_plug = initial_plug
             self.parallel = parallel
             self.n_simu = n_simu
+            self.seed = seed
+            self.rng = rng
+            self.integrator = integrator
+            self.model = model
+            self.attachment = attachment
+            self.decimate = decimate
+            if memory_budget is not None:
+                plan = self._plan_memory()
+                if plan.record_every != decimate:
+                    log.warning("Recording one time point every %i to fit "
+                                "in memory" % plan.record_every)
+                self.decimate = plan.record_every
 
             # Create a folder. Raise an exeception if it exists.
             if os.path.isdir(self.simu_path):
@@ -78,6 +174,7 @@ class Pool:
             # with paramtree, measuretree, intial_plug,
             # parallel, date/time, n_simu
 
+            import pandas as pd
             store = pd.HDFStore(os.path.join(self.simu_path, "metadata.h5"))
             store['params'] = paramtree.to_df()
             store['measures'] = measuretree.to_df()
@@ -85,6 +182,12 @@ class Pool:
             metadata = pd.Series({'n_simu': self.n_simu,
                                   'parallel': self.parallel,
                                   'initial_plug': initial_plug,
+                                  'seed': -1 if seed is None else seed,
+                                  'decimate': self.decimate,
+                                  'rng': rng,
+                                  'integrator': integrator,
+                                  'model': model,
+                                  'attachment': attachment,
                                   'datetime': str(datetime.datetime.now())})
             store['metadata'] = metadata
             store.close()
@@ -94,6 +197,7 @@ class Pool:
                 raise FolderNotExistException(
                     "%s does not exists." % self.simu_path)
 
+            import pandas as pd
             store = pd.HDFStore(os.path.join(self.simu_path, "metadata.h5"))
             self.paramtree = ParamTree(root=build_tree(store['params']))
             self.measuretree = ParamTree(root=build_tree(store['measures']),
@@ -102,6 +206,13 @@ class Pool:
             self.n_simu = store['metadata']['n_simu']
             self.parallel = store['metadata']['parallel']
             self.initial_plug = store['metadata']['initial_plug']
+            seed = store['metadata'].get('seed', -1)
+            self.seed = None if seed < 0 else int(seed)
+            self.decimate = int(store['metadata'].get('decimate', 1))
+            self.rng = store['metadata'].get('rng', 'legacy')
+            self.integrator = store['metadata'].get('integrator', 'euler')
+            self.model = store['metadata'].get('model', 'full')
+            self.attachment = store['metadata'].get('attachment', 'exact')
             store.close()
 
             self.metaphases_path = []
@@ -123,30 +234,107 @@ class Pool:
             log.error('Pool has already been simulated.')
             return False
 
+        self._run(range(self.n_simu))
+
+        for i in range(self.n_simu):
+            fname = "simu_%s.h5" % (str(i).zfill(self.digits))
+            self.metaphases_path.append(
+                os.path.join(self.simu_path, fname))
+
+        log.info("Pool simulations are done")
+        self.simus_run = True
+
+    def missing(self):
+        """
+        Returns the indexes of the simulations whose result file is missing,
+        e.g. because the pool has been interrupted.
+        """
+        return [i for i, fpath in enumerate(self.metaphases_path)
+                if not os.path.isfile(fpath)]
+
+    def resume(self):
+        """
+        Runs the missing simulations of a loaded pool. Seeded pools give
+        the same results as an uninterrupted run.
+
+        Returns
+        -------
+        list of int
+            Indexes of the simulations which have been run
+        """
+        missing = self.missing()
+        if missing:
+            log.info('Resume pool: %i simulations to run' % len(missing))
+            self._run(missing)
+        return missing
+
+    def _plan_memory(self):
         if self.parallel:
+            n_workers = self.n_workers or multiprocessing.cpu_count() + 1
+        else:
+            n_workers = 1
+        budget = self.memory_budget
+        if budget == 'auto':
+            budget = None
+        else:
+            budget *= MB
+        return plan_memory(self.paramtree, n_workers, budget,
+                           record_every=self.decimate,
+                           threads=self.parallel and self.threads)
+
+    def _run(self, indexes):
+
+        indexes = list(indexes)
+        ncore = self.n_workers or multiprocessing.cpu_count() + 1
+        estimate = estimate_memory(self.paramtree, self.decimate)['total']
+        budget = None
+        if self.memory_budget is not None:
+            plan = self._plan_memory()
+            budget = plan.budget
+            if self.parallel and plan.n_workers < ncore:
+                log.warning("%i workers instead of %i to fit in memory" %
+                            (plan.n_workers, ncore))
+                ncore = plan.n_workers
+        if not self.parallel:
+            ncore = 1
+
+        if self.parallel and self.threads:
+            log.info('Parallel mode enabled: %i threads will be used to run %i simulations' %
+                       (ncore, len(indexes)))
+            pool = multiprocessing.pool.ThreadPool(processes=ncore)
+        elif self.parallel:
             def init_worker():
                 import signal
                 signal.signal(signal.SIGINT, signal.SIG_IGN)
 
-            ncore = multiprocessing.cpu_count() + 1
             log.info('Parallel mode enabled: %i cores will be used to run %i simulations' %
-                       (ncore, self.n_simu))
+                       (ncore, len(indexes)))
             pool = multiprocessing.Pool(
                 processes=ncore, initializer=init_worker)
 
-        i = 0
+        # Parameters are reduced once for the whole pool
+        paramtree = parameters.reduced_params(self.paramtree,
+                                              self.measuretree)
 
         # Build arguments list
-        simu_parameters = {'paramtree': self.paramtree,
+        simu_parameters = {'paramtree': paramtree,
                            'measuretree': self.measuretree,
                            'initial_plug': self.initial_plug,
                            'verbose': False,
-                           'reduce_p': True}
+                           'reduce_p': False,
+                           'profile': self.profile,
+                           'record_every': self.decimate,
+                           'rng': self.rng,
+                           'integrator': self.integrator,
+                           'model': self.model,
+                           'attachment': self.attachment}
 
         arguments = zip(itertools.repeat(simu_parameters),
                         itertools.repeat(self.simu_path),
-                        range(self.n_simu),
-                        itertools.repeat(self.digits))
+                        indexes,
+                        itertools.repeat(self.digits),
+                        itertools.repeat(self.seed),
+                        itertools.repeat(self.cache))
 
         try:
             # Launch simulation
@@ -156,28 +344,50 @@ class Pool:
                 results = map(_run_one_simulation, arguments)
 
             # Get unordered results and log progress
-            for i in range(self.n_simu):
+            progress = Progress(len(indexes), name='pool', unit='runs',
+                                sinks=self.progress_sinks)
+            reports = []
+            peaks = {}
+            for i in range(len(indexes)):
                 result = next(results)
-                if self.verbose:
-                    pprogress((i + 1) / self.n_simu * 100, "(%i / %i)" %
-                              (i + 1, self.n_simu))
-
-            if self.verbose:
-                pprogress(-1)
+                if result[2] is not None:
+                    reports.append(result[2])
+                pid, rss = result[3]
+                if rss is not None:
+                    peaks[pid] = max(rss, peaks.get(pid, 0))
+                progress.update(i + 1)
+            progress.finish()
 
         except KeyboardInterrupt:
-            pool.terminate()
-            pool.join()
+            if self.parallel:
+                pool.terminate()
+                pool.join()
             raise CanceledByUserException(
                 'Simulation has been canceled by user')
 
-        for i in range(self.n_simu):
-            fname = "simu_%s.h5" % (str(i).zfill(self.digits))
-            self.metaphases_path.append(
-                os.path.join(self.simu_path, fname))
+        if self.parallel:
+            pool.close()
+            pool.join()
 
-        log.info("Pool simulations are done")
-        self.simus_run = True
+        if reports:
+            self.profile_report = merge_reports(reports)
+
+        # Worker processes report their own peak, simulations run in this
+        # process (threads or serial) the peak of the whole process
+        scope = 'worker' if self.parallel and not self.threads else 'process'
+        self.memory_report = {'estimate': estimate,
+                              'budget': budget,
+                              'n_workers': ncore,
+                              'record_every': self.decimate,
+                              'peak_rss': peaks,
+                              'peak_rss_scope': scope}
+        if peaks and scope == 'worker':
+            log.info("Peak memory per worker: %.0f MB (estimated %.0f MB)" %
+                     (max(peaks.values()) / MB, estimate / MB))
+        elif peaks:
+            log.info("Peak memory of the process, for %i concurrent "
+                     "simulations: %.0f MB (estimated %.0f MB each)" %
+                     (ncore, max(peaks.values()) / MB, estimate / MB))
 
     def load_metaphases(self):
         """
@@ -191,11 +401,43 @@ class Pool:
 def _run_one_simulation(args):
     """
     """
-    simu_parameters, simu_path, i, digits = args
+    simu_parameters, simu_path, i, digits, seed, cache = args
+    decimate = simu_parameters['record_every']
 
     fname = "simu_%s.h5" % (str(i).zfill(digits))
     fpath = os.path.join(simu_path, fname)
+    # Results are written under a temporary name and renamed once complete,
+    # so an interrupted pool never leaves a partial file behind
+    tmp_path = fpath + ".tmp"
+    if seed is not None:
+        simu_parameters = dict(simu_parameters, seed=seed + i)
     meta = Metaphase(**simu_parameters)
+
+    if cache is not None:
+        # Complete recordings are decimated below
+        cached_path = cache.lookup(meta, record_every=1)
+        if cached_path is not None:
+            with _IO_LOCK:
+                if decimate > 1:
+                    # The cache holds complete trajectories
+                    cached = SimuIO().read(cached_path,
+                                           paramtree=meta.paramtree,
+                                           measuretree=meta.measuretree)
+                    SimuIO(cached).save(tmp_path, save_tree=False,
+                                        decimate=decimate)
+                else:
+                    shutil.copyfile(cached_path, tmp_path)
+            os.replace(tmp_path, fpath)
+            return (i, fname, None, (os.getpid(), peak_rss()))
+
+    if meta.profiler is not None:
+        meta.profiler.tid = i
     meta.simul()
-    SimuIO(meta).save(fpath, save_tree=False)
-    return (i, fname)
+    with _IO_LOCK:
+        # The recording is already decimated
+        SimuIO(meta).save(tmp_path, save_tree=False)
+        os.replace(tmp_path, fpath)
+        if cache is not None and decimate == 1:
+            cache.store(meta, simufname=fpath)
+    report = meta.profiler.report() if meta.profiler is not None else None
+    return (i, fname, report, (os.getpid(), peak_rss()))
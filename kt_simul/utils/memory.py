@@ -0,0 +1,191 @@
+"""
+Memory budget of simulations.
+
+The memory used by a :class:`~kt_simul.core.simul_spindle.Metaphase` is
+dominated by its trajectories and attachment histories, which grow with
+the number of recorded time points and the number of attachment sites,
+and by the dense matrices of the dynamics, which grow with the square of
+the number of degrees of freedom. :func:`estimate_memory` predicts it from
+the parameters and :func:`plan_memory` chooses a number of workers and a
+recording decimation fitting a memory budget::
+
+    plan = plan_memory(paramtree, n_workers=8)
+    pool = Pool(..., n_workers=plan.n_workers, decimate=plan.record_every)
+
+:class:`~kt_simul.pool.Pool` does it when given a memory budget (see its
+`memory_budget` argument).
+"""
+
+from __future__ import unicode_literals
+from __future__ import division
+from __future__ import absolute_import
+from __future__ import print_function
+
+import os
+import sys
+import collections
+
+__all__ = ["estimate_memory", "plan_memory", "available_memory",
+           "peak_rss", "MemoryPlan"]
+
+MB = 1024 ** 2
+
+# Resident memory of a worker before it simulates (interpreter, numpy,
+# pandas and the simulation modules)
+BASE_MEMORY = 80 * MB
+# Number of dim x dim float arrays alive at the same time: B, A0 and At,
+# plus the temporaries of their construction and of the solver
+MATRIX_COPIES = 8
+# Bytes per plugsite and recorded time point when the results are saved:
+# the pandas frames of SimuIO.save (values, multi-index and the copies
+# made by concat and sort)
+SAVE_BYTES_PER_RECORD = 180
+# Fraction of the available memory used when no budget is given
+SAFETY = 0.8
+
+MemoryPlan = collections.namedtuple(
+    'MemoryPlan', ['n_workers', 'record_every', 'per_simulation', 'budget'])
+
+
+def _sizes(params):
+    if hasattr(params, 'absolute_dic'):
+        params = params.absolute_dic
+    num_steps = int(float(params['span']) / float(params['dt']))
+    return num_steps, int(params['N']), int(params['Mk'])
+
+
+def estimate_memory(params, record_every=1, save=True):
+    """
+    Predicts the peak memory of a simulation.
+
+    Parameters
+    ----------
+    params : :class:`~kt_simul.io.xml_handler.ParamTree` or dict
+        Parameters with units (only span, dt, N and Mk are used)
+    record_every : int
+        Recording decimation (see `Metaphase`)
+    save : bool
+        Include the memory needed to save the results to HDF5
+
+    Returns
+    -------
+    dict
+        Bytes used by the 'trajectories', the attachment 'histories', the
+        'matrices', 'save' and the 'base' process, and their 'total'
+    """
+    num_steps, N, Mk = _sizes(params)
+    record_every = max(int(record_every), 1)
+    num_records = (num_steps + record_every - 1) // record_every
+    dim = 1 + 2 * N * (Mk + 1)
+
+    # Poles, chromosomes, centromeres and plugsites
+    n_traj = 2 + 3 * N + 2 * N * Mk
+    estimate = {
+        'trajectories': 8 * n_traj * num_records,
+        # Plugsite states and correct/erroneous counts per centromere
+        'histories': 8 * (2 * N * Mk + 4 * N) * num_records,
+        'matrices': 8 * MATRIX_COPIES * dim ** 2,
+        'save': (SAVE_BYTES_PER_RECORD * 2 * N * Mk * num_records
+                 if save else 0),
+        'base': BASE_MEMORY}
+    estimate['total'] = sum(estimate.values())
+    return estimate
+
+
+def available_memory():
+    """
+    Returns the memory available to new processes in bytes, or None if it
+    can't be determined.
+    """
+    try:
+        with open('/proc/meminfo') as f:
+            for line in f:
+                if line.startswith('MemAvailable:'):
+                    return int(line.split()[1]) * 1024
+    except (IOError, OSError, ValueError):
+        pass
+    try:
+        return os.sysconf('SC_AVPHYS_PAGES') * os.sysconf('SC_PAGE_SIZE')
+    except (AttributeError, ValueError, OSError):
+        return None
+
+
+def peak_rss():
+    """
+    Returns the peak resident memory of the current process in bytes, or
+    None if it can't be determined. It covers the whole process, so all
+    the threads running in it.
+    """
+    try:
+        import resource
+    except ImportError:
+        return None
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Kilobytes on Linux, bytes on macOS
+    return rss if sys.platform == 'darwin' else rss * 1024
+
+
+def plan_memory(params, n_workers=1, budget=None, record_every=1,
+                save=True, threads=False):
+    """
+    Chooses the number of concurrent simulations and the recording
+    decimation so that they fit in `budget`. The number of workers is
+    reduced first; the recording is only decimated when a single
+    simulation doesn't fit.
+
+    Parameters
+    ----------
+    params : :class:`~kt_simul.io.xml_handler.ParamTree` or dict
+    n_workers : int
+        Requested number of concurrent simulations
+    budget : float or None
+        Memory budget in bytes. Defaults to a fraction of the available
+        memory; if that is unknown, the request is returned unchanged.
+    record_every : int
+        Requested recording decimation. A larger one is a multiple of it.
+    threads : bool
+        If True, the simulations run in threads of one process, whose base
+        memory is only counted once. `per_simulation` then excludes it.
+
+    Returns
+    -------
+    :class:`MemoryPlan`
+
+    Raises
+    ------
+    MemoryError
+        If a simulation doesn't fit in `budget` whatever the decimation.
+    """
+    record_every = max(int(record_every), 1)
+    shared = BASE_MEMORY if threads else 0
+    per_simulation = estimate_memory(params, record_every,
+                                     save)['total'] - shared
+    if budget is None:
+        available = available_memory()
+        if available is None:
+            return MemoryPlan(n_workers, record_every, per_simulation, None)
+        budget = SAFETY * available
+    free = budget - shared
+
+    if per_simulation * n_workers <= free:
+        return MemoryPlan(n_workers, record_every, per_simulation, budget)
+    if per_simulation <= free:
+        return MemoryPlan(int(free // per_simulation), record_every,
+                          per_simulation, budget)
+
+    # Memory which doesn't depend on the recording
+    fixed = estimate_memory(params, record_every=sys.maxsize,
+                            save=save)['total'] - shared
+    per_record = (estimate_memory(params, save=save)['total'] - shared -
+                  fixed) / _sizes(params)[0]
+    if fixed >= free:
+        raise MemoryError("A simulation needs at least %.0f MB, more than "
+                          "the budget of %.0f MB" % ((fixed + shared) / MB,
+                                                     budget / MB))
+    num_records = int((free - fixed) // per_record)
+    factor = -(-_sizes(params)[0] // max(num_records, 1))
+    # Round up to a multiple of the requested decimation
+    record_every *= -(-factor // record_every)
+    per_simulation = estimate_memory(params, record_every,
+                                     save)['total'] - shared
+    return MemoryPlan(1, record_every, per_simulation, budget)
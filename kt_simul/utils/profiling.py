@@ -0,0 +1,162 @@
+"""
+Opt-in instrumentation of the simulation.
+
+A :class:`Profiler` accumulates timers and counters. It is attached to a
+:class:`~kt_simul.core.simul_spindle.Metaphase` with the `profile`
+argument::
+
+    meta = Metaphase(paramtree=paramtree, profile=True)
+    meta.simul()
+    meta.profiler.report()
+
+The profiled simulation runs the same code as an unprofiled one. The
+phases of the steps are timed under the same names on the object code and
+on the nogil code, which accumulates them with a C clock; only the object
+code records them as trace events. When no profiler is attached, the
+simulation loop only checks for it once per step.
+"""
+
+from __future__ import unicode_literals
+from __future__ import division
+from __future__ import absolute_import
+from __future__ import print_function
+
+import os
+import json
+import time
+import contextlib
+
+__all__ = ["Profiler", "merge_reports", "save_chrome_trace"]
+
+_clock = getattr(time, 'perf_counter', time.time)
+
+
+class Profiler(object):
+    """
+    Timers and counters of one simulation.
+
+    Parameters
+    ----------
+    trace : bool
+        Also record every timed phase as an event, so it can be exported to
+        the Chrome trace format (chrome://tracing). This adds one event per
+        phase and per step.
+    tid : int
+        Thread id of the trace events, used to tell simulations of a pool
+        apart.
+    """
+
+    clock = staticmethod(_clock)
+
+    def __init__(self, trace=False, tid=0):
+        self.trace = trace
+        self.tid = tid
+        self.pid = os.getpid()
+        self.timers = {}
+        self.counters = {}
+        self.events = []
+        self._t0 = _clock()
+
+    def add(self, name, start, stop):
+        """
+        Adds the duration `stop - start` (as returned by :attr:`clock`) to
+        the timer `name`.
+        """
+        timer = self.timers.get(name)
+        if timer is None:
+            self.timers[name] = [stop - start, 1]
+        else:
+            timer[0] += stop - start
+            timer[1] += 1
+        if self.trace:
+            self.events.append((name, start, stop))
+
+    def add_total(self, name, total, count):
+        """
+        Adds `count` calls lasting `total` seconds to the timer `name`, as
+        measured by code which can't call :meth:`add` (e.g. without the
+        GIL). No trace event is recorded.
+        """
+        timer = self.timers.get(name)
+        if timer is None:
+            self.timers[name] = [total, count]
+        else:
+            timer[0] += total
+            timer[1] += count
+
+    def count(self, name, n=1):
+        """
+        Increments the counter `name` by `n`.
+        """
+        self.counters[name] = self.counters.get(name, 0) + n
+
+    @contextlib.contextmanager
+    def timed(self, name):
+        """
+        Context manager timing its block with the timer `name`.
+        """
+        start = _clock()
+        try:
+            yield
+        finally:
+            self.add(name, start, _clock())
+
+    def report(self):
+        """
+        Returns
+        -------
+        dict
+            'timers' maps a phase to its total time (s), number of calls
+            and mean time, 'counters' maps a counter to its value. If
+            tracing is on, 'trace' holds the Chrome trace events.
+        """
+        report = {'n_simulations': 1,
+                  'timers': dict((name, {'total': total, 'count': count,
+                                         'mean': total / count})
+                                 for name, (total, count)
+                                 in self.timers.items()),
+                  'counters': dict(self.counters)}
+        if self.trace:
+            report['trace'] = self.chrome_trace()['traceEvents']
+        return report
+
+    def chrome_trace(self):
+        """
+        Returns the recorded events as a Chrome trace document.
+        """
+        events = [{'name': name, 'ph': 'X', 'pid': self.pid, 'tid': self.tid,
+                   'ts': (start - self._t0) * 1e6,
+                   'dur': (stop - start) * 1e6}
+                  for name, start, stop in self.events]
+        return {'traceEvents': events}
+
+
+def merge_reports(reports):
+    """
+    Aggregates reports of several simulations (e.g. the workers of a
+    :class:`~kt_simul.pool.Pool`).
+    """
+    merged = {'n_simulations': 0, 'timers': {}, 'counters': {}}
+    for report in reports:
+        merged['n_simulations'] += report['n_simulations']
+        for name, timer in report['timers'].items():
+            total = merged['timers'].setdefault(name, {'total': 0.,
+                                                       'count': 0})
+            total['total'] += timer['total']
+            total['count'] += timer['count']
+        for name, value in report['counters'].items():
+            merged['counters'][name] = merged['counters'].get(name, 0) + value
+        if 'trace' in report:
+            merged.setdefault('trace', []).extend(report['trace'])
+    for timer in merged['timers'].values():
+        timer['mean'] = timer['total'] / timer['count']
+    return merged
+
+
+def save_chrome_trace(report, fname):
+    """
+    Writes the trace events of `report` to `fname`, to be opened with
+    chrome://tracing or https://ui.perfetto.dev.
+    """
+    with open(fname, 'w') as f:
+        json.dump({'traceEvents': report.get('trace', [])}, f)
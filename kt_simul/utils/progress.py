@@ -1,15 +1,234 @@
+"""
+Progress reporting.
+
+A :class:`Progress` instance turns the advancement of a task (simulation
+steps, simulations of a pool, parameter sets of a multipool) into a stream
+of event dictionaries sent to sinks::
+
+    {'event': 'progress', 'name': 'simul', 'unit': 'steps',
+     'done': 1200, 'total': 2000, 'percent': 60.0,
+     'elapsed': 0.31, 'rate': 3870.9, 'eta': 0.21,
+     'timestamp': 1414141414.1, 'pid': 4242}
+
+'progress' events are throttled in time. Other events ('start',
+'anaphase_onset', 'done', ...) are always sent.
+
+A sink is any callable taking an event. :class:`TerminalSink`,
+:class:`LogSink` and :class:`JSONLinesSink` are provided.
+"""
+
 from __future__ import unicode_literals
 from __future__ import division
 from __future__ import absolute_import
 from __future__ import print_function
 
+import os
 import sys
+import json
+import time
+import logging
+import multiprocessing
+
+__all__ = ["Progress", "TerminalSink", "LogSink", "JSONLinesSink",
+           "pprogress"]
+
+_clock = getattr(time, 'perf_counter', time.time)
+
+
+def _in_worker():
+    return multiprocessing.current_process().name != 'MainProcess'
+
+
+class Progress(object):
+    """
+    Tracks the advancement of a task and sends events to sinks.
+
+    Parameters
+    ----------
+    total : int
+        Number of units of work
+    name : str
+        Task name, copied in events
+    unit : str
+        Name of a unit of work ('steps', 'runs', ...)
+    sinks : list of callables
+        Each sink is called with every emitted event
+    min_interval : float
+        Minimum time between two 'progress' events, in seconds
+    """
+
+    def __init__(self, total, name='', unit='', sinks=(), min_interval=0.2):
+        self.total = total
+        self.name = name
+        self.unit = unit
+        self.sinks = list(sinks)
+        self.min_interval = min_interval
+
+        self.done = 0
+        self._start = _clock()
+        self._last = self._start
+        # `update` is called on every step of a simulation: time is only
+        # checked once the number of units done reaches `_next_check`
+        self._next_check = 1
+        self.event('start')
+
+    def update(self, done):
+        """
+        Sets the number of units done, emitting a 'progress' event if
+        `min_interval` has elapsed since the last one.
+        """
+        self.done = done
+        if done < self._next_check:
+            return
+        now = _clock()
+        rate = done / (now - self._start)
+        wait = self.min_interval - (now - self._last)
+        if wait > 0:
+            # Check again when `min_interval` is expected to be elapsed.
+            # The rate is not reliable at the beginning: at most double
+            # the number of units done between two checks.
+            self._next_check = done + max(1, min(done, int(rate * wait)))
+            return
+        self._last = now
+        self._next_check = done + max(1, min(done, int(rate *
+                                                       self.min_interval)))
+        self.event('progress', _now=now)
+
+    def event(self, kind, _now=None, **data):
+        """
+        Sends an event of type `kind` to the sinks. Extra keyword arguments
+        are added to the event.
+        """
+        if not self.sinks:
+            return
+        now = _now if _now is not None else _clock()
+        elapsed = now - self._start
+        rate = self.done / elapsed if elapsed > 0 else 0.
+        remaining = self.total - self.done
+        event = {'event': kind,
+                 'name': self.name,
+                 'unit': self.unit,
+                 'done': self.done,
+                 'total': self.total,
+                 'percent': 100. * self.done / self.total if self.total else 0.,
+                 'elapsed': elapsed,
+                 'rate': rate,
+                 'eta': remaining / rate if rate > 0 else None,
+                 'timestamp': time.time(),
+                 'pid': os.getpid()}
+        event.update(data)
+        for sink in self.sinks:
+            sink(event)
+
+    def finish(self, **data):
+        """
+        Emits the 'done' event.
+        """
+        self.done = self.total
+        self.event('done', **data)
+
+
+class TerminalSink(object):
+    """
+    Draws a progress bar on a terminal. Nothing is written from worker
+    processes.
+
+    Parameters
+    ----------
+    stream : file-like or None
+        Defaults to `sys.stdout`
+    size : int
+        Width of the bar
+    """
+
+    def __init__(self, stream=None, size=50):
+        self.stream = stream
+        self.size = size
+
+    def __call__(self, event):
+        if _in_worker():
+            return
+        stream = self.stream or sys.stdout
+        if event['event'] == 'progress':
+            stream.write("\r" + self.format(event))
+        elif event['event'] in ('done', 'anaphase_onset'):
+            # Clear the bar so log messages are not garbled
+            stream.write("\r" + " " * 80 + "\r")
+        else:
+            return
+        stream.flush()
+
+    def format(self, event):
+        progress = int(event['percent'] * self.size / 100)
+        bar = "%3d%% [%s>%s]" % (event['percent'],
+                                 "=" * max(progress - 1, 0),
+                                 " " * (self.size - max(progress, 1)))
+        bar += "  %.1f %s/s" % (event['rate'], event['unit'])
+        if event['eta'] is not None:
+            bar += "  ETA %is" % event['eta']
+        return bar
+
+
+class LogSink(object):
+    """
+    Sends events to a logger.
+
+    Parameters
+    ----------
+    logger : :class:`logging.Logger` or None
+        Defaults to this module's logger
+    level : int
+    """
+
+    def __init__(self, logger=None, level=logging.INFO):
+        self.logger = logger or logging.getLogger(__name__)
+        self.level = level
+
+    def __call__(self, event):
+        if event['event'] == 'progress':
+            msg = "%s: %i / %i %s (%.1f %s/s)" % (
+                event['name'], event['done'], event['total'], event['unit'],
+                event['rate'], event['unit'])
+        else:
+            extra = dict((k, v) for k, v in event.items()
+                         if k not in _BASE_KEYS)
+            msg = "%s: %s %s" % (event['name'], event['event'],
+                                 extra if extra else "")
+        self.logger.log(self.level, msg.strip())
+
+
+class JSONLinesSink(object):
+    """
+    Appends events to a file, one JSON document per line. Several
+    processes can share the same file.
+
+    Parameters
+    ----------
+    fname : str
+    """
+
+    def __init__(self, fname):
+        self.fname = fname
+
+    def __call__(self, event):
+        line = json.dumps(event, sort_keys=True) + "\n"
+        with open(self.fname, 'a') as f:
+            f.write(line)
+
+
+_BASE_KEYS = set(['event', 'name', 'unit', 'done', 'total', 'percent',
+                  'elapsed', 'rate', 'eta', 'timestamp', 'pid'])
+
 
 def pprogress(percent, suffix_message=None, size=50):
     """
     Print a progress bar
     percent = -1 to end and remove the progress bar
+
+    Deprecated, use :class:`Progress` with a :class:`TerminalSink`.
     """
+    if _in_worker():
+        return
 
     # If process is finished
     if percent == -1:
@@ -18,16 +237,10 @@ def pprogress(percent, suffix_message=None, size=50):
         return
 
     # Compute current progress
-    progress = (percent + 1) * size / 100
+    progress = int((percent + 1) * size / 100)
 
     # Build progress bar
-    bar = "["
-    for i in range(int(progress) - 1):
-        bar += "="
-    bar += ">"
-    for i in range(size - int(progress)):
-        bar += " "
-    bar += "]"
+    bar = "[" + "=" * (progress - 1) + ">" + " " * (size - progress) + "]"
 
     if suffix_message:
         bar += "  " + suffix_message
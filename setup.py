@@ -26,6 +26,7 @@ def install_requirements(install_requires):
 
 install_requirements(install_requires)
 
+import numpy as np
 from Cython.Distutils import build_ext
 from Cython.Build import cythonize
 
@@ -53,9 +54,12 @@ setup(
     license="CeCILL",
     entry_points={
         'console_scripts': [
-            #'proclame-sm = sm_lib.core:proclamer',
+            'kt-simul = kt_simul.cli:main',
         ],
     },
     cmdclass={'build_ext': build_ext},
+    # Extensions are prebuilt so that no compilation happens at import.
+    # In a development checkout use `python setup.py build_ext --inplace`
     ext_modules=cythonize(["kt_simul/core/*.pyx"]),
+    include_dirs=[np.get_include()],
 )
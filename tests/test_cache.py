@@ -0,0 +1,45 @@
+from __future__ import division
+
+import numpy as np
+
+from kt_simul.core.simul_spindle import Metaphase
+from kt_simul.io.cache import SimuCache
+
+
+def _spindle(meta):
+    return np.asarray(meta.KD.spbR.traj)
+
+
+def test_hit_is_identical(tmpdir):
+    cache = SimuCache(str(tmpdir))
+    first = cache.simul(Metaphase(seed=3))
+    assert len(tmpdir.listdir()) == 1
+    second = cache.simul(Metaphase(seed=3))
+    assert np.array_equal(_spindle(first), _spindle(second))
+
+
+def test_ablation_has_its_own_entry(tmpdir):
+    cache = SimuCache(str(tmpdir))
+    ablated = cache.simul(Metaphase(seed=3), ablat=40, ablat_pos=0.2)
+    plain = cache.simul(Metaphase(seed=3))
+    assert len(tmpdir.listdir()) == 2
+    assert not np.array_equal(_spindle(ablated), _spindle(plain))
+    reference = Metaphase(seed=3)
+    reference.simul()
+    assert np.array_equal(_spindle(plain), _spindle(reference))
+
+
+def test_decimated_run_has_its_own_entry(tmpdir):
+    cache = SimuCache(str(tmpdir))
+    decimated = cache.simul(Metaphase(seed=3, record_every=5))
+    full = cache.simul(Metaphase(seed=3))
+    assert len(_spindle(full)) == 5 * len(_spindle(decimated))
+
+
+def test_unfinished_runs_are_not_cached(tmpdir):
+    cache = SimuCache(str(tmpdir))
+    meta = Metaphase(seed=3)
+    assert cache.path(meta, until=10) is None
+    assert cache.path(meta, callback=lambda meta, t: None) is None
+    assert cache.path(meta, checkpoint='ckpt') == cache.path(meta)
+    assert cache.path(Metaphase()) is None
@@ -0,0 +1,68 @@
+from __future__ import division
+
+import pickle
+
+import numpy as np
+import pytest
+
+from kt_simul.core.simul_spindle import Metaphase
+from kt_simul.io import checkpoint as checkpoint_module
+from kt_simul.io.checkpoint import Checkpointer, load_checkpoint
+
+VARIANTS = [{},
+            {'nogil': False},
+            {'rng': 'legacy'},
+            {'attachment': 'tau_leap'},
+            {'integrator': 'implicit'},
+            {'model': 'reduced'}]
+
+
+def _records(meta):
+    KD = meta.KD
+    organites = KD.organites()
+    return (np.array([organite.traj for organite in organites]),
+            np.array([plugsite.state_hist for plugsite in KD.all_plugsites]))
+
+
+@pytest.mark.parametrize('kwargs', VARIANTS)
+def test_resume_is_identical(tmpdir, kwargs):
+    path = str(tmpdir.join('run.ckpt'))
+    interrupted = Metaphase(seed=3, verbose=False, **kwargs)
+    interrupted.simul(until=30)
+    checkpointer = Checkpointer(path)
+    checkpointer.save(interrupted)
+    checkpointer.close()
+    assert load_checkpoint(path)[0].time_point == 30
+
+    resumed = Metaphase.resume(path, verbose=False)
+    reference = Metaphase(seed=3, verbose=False, **kwargs)
+    reference.simul()
+    for resumed_records, reference_records in zip(_records(resumed),
+                                                  _records(reference)):
+        assert np.array_equal(resumed_records, reference_records)
+    assert resumed.delay == reference.delay
+
+
+def test_interrupted_write_keeps_the_checkpoint(tmpdir, monkeypatch):
+    path = str(tmpdir.join('run.ckpt'))
+    meta = Metaphase(seed=3, verbose=False)
+    meta.simul(until=20)
+    checkpointer = Checkpointer(path, interval=0)
+    checkpointer.save(meta)
+    checkpointer.close()
+    with open(path, 'rb') as f:
+        saved = f.read()
+
+    def interrupted_dump(data, f, protocol=None):
+        f.write(pickle.dumps(data, protocol)[:100])
+        raise IOError("No space left on device")
+
+    meta.simul(until=40)
+    monkeypatch.setattr(checkpoint_module.pickle, 'dump', interrupted_dump)
+    checkpointer.save(meta)
+    checkpointer.close()
+    with open(path, 'rb') as f:
+        assert f.read() == saved
+    assert load_checkpoint(path)[0].time_point == 20
+    assert checkpointer.n_saved == 1
+    assert isinstance(checkpointer.error, IOError)
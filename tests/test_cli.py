@@ -0,0 +1,58 @@
+from __future__ import division
+
+import json
+
+import pytest
+
+from kt_simul import cli
+
+
+def _status(tmpdir, *argv):
+    status = str(tmpdir.join('status.json'))
+    code = cli.main(list(argv) + ['--status', status])
+    with open(status) as f:
+        document = json.load(f)
+    assert document['exit_code'] == code
+    return code, document
+
+
+def test_run_and_summarise(tmpdir, capsys):
+    output = str(tmpdir.join('simu.h5'))
+    code, status = _status(tmpdir, 'run', '-q', '-o', output, '--seed', '1',
+                           '--set', 'span=500', '--decimate', '2')
+    assert code == cli.EXIT_OK
+    assert status['ok'] and status['outputs'] == [output]
+
+    capsys.readouterr()
+    assert cli.main(['summarise', '-q', output, '--json']) == cli.EXIT_OK
+    summary = json.loads(capsys.readouterr().out)
+    assert summary['kind'] == 'simulation'
+
+    code, status = _status(tmpdir, 'run', '-q', '-o', output)
+    assert code == cli.EXIT_EXISTS
+    assert not status['ok'] and status['error']
+
+
+@pytest.mark.parametrize('argv, code', [
+    (['run', '--set', 'not_a_parameter=1'], cli.EXIT_USAGE),
+    (['run', '--set', 'span'], cli.EXIT_USAGE),
+    (['run', '--params', 'missing.xml'], cli.EXIT_NOT_FOUND),
+    (['summarise', 'missing.h5'], cli.EXIT_NOT_FOUND)])
+def test_exit_status(tmpdir, argv, code):
+    output = str(tmpdir.join('simu.h5'))
+    if argv[0] == 'run':
+        argv = argv + ['-o', output]
+    assert _status(tmpdir, *(argv + ['-q']))[0] == code
+    assert not tmpdir.join('simu.h5').check()
+
+
+def test_pool(tmpdir, capsys):
+    pool = str(tmpdir.join('pool'))
+    code, status = _status(tmpdir, 'pool', '-q', pool, '-n', '2', '--serial',
+                           '--seed', '0', '--set', 'span=500')
+    assert code == cli.EXIT_OK
+    capsys.readouterr()
+    assert cli.main(['summarise', '-q', pool, '--json']) == cli.EXIT_OK
+    summary = json.loads(capsys.readouterr().out)
+    assert summary['kind'] == 'pool'
+    assert not summary['missing']
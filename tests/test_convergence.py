@@ -0,0 +1,27 @@
+from __future__ import division
+
+import numpy as np
+import pytest
+
+from kt_simul.core.spindle_dynamics import INTEGRATORS
+from kt_simul.benchmarks.convergence import trajectory_convergence
+
+
+@pytest.mark.parametrize('integrator', INTEGRATORS)
+def test_first_order_convergence(integrator):
+    dts = (2, 1, 0.5, 0.25)
+    errors = trajectory_convergence(dts, integrator)
+    assert (np.diff(errors) < 0).all()
+    # Halving dt halves the error
+    ratios = errors[:-1] / errors[1:]
+    assert np.allclose(ratios, 2, atol=0.4)
+    assert errors[-1] < 0.01
+
+
+def test_euler_default_dt():
+    errors = {integrator: trajectory_convergence((10, ), integrator)[0]
+              for integrator in INTEGRATORS}
+    # Explicit Euler is much less accurate than the implicit integrator
+    # at the default time step, see the convergence module
+    assert errors['implicit'] < 0.01
+    assert errors['euler'] > 10 * errors['implicit']
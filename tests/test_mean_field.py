@@ -0,0 +1,61 @@
+from __future__ import division
+
+import numpy as np
+import pytest
+
+from kt_simul.core.mean_field import mean_field, mean_field_params
+from kt_simul.core.parameters import PARAMFILE
+from kt_simul.core.simul_spindle import Metaphase
+from kt_simul.io.xml_handler import ParamTree
+
+
+def _trees(**values):
+    """
+    Copies of the default tree, with each of the given values of one
+    parameter
+    """
+    (name, values), = values.items()
+    base = ParamTree(PARAMFILE)
+    trees = []
+    for value in values:
+        tree = base.copy()
+        tree.update(**{name: value})
+        trees.append(tree)
+    return trees
+
+
+def test_points_are_integrated_independently():
+    trees = _trees(Mk=[4, 8])
+    together = mean_field(mean_field_params(trees))
+    for i, tree in enumerate(trees):
+        alone = mean_field(mean_field_params([tree]))
+        for name, values in together.items():
+            assert values[i] == pytest.approx(alone[name][0])
+
+
+@pytest.mark.parametrize('initial_plug', ['null', 'amphitelic', 'random',
+                                          'merotelic', 'syntelic'])
+def test_fractions(initial_plug):
+    results = mean_field(mean_field_params(_trees(Mk=[2, 4, 8])),
+                         initial_plug=initial_plug)
+    assert np.allclose(results['attached'],
+                       results['correct'] + results['erroneous'])
+    assert ((results['erroneous'] >= 0) &
+            (results['correct'] >= results['erroneous']) &
+            (results['attached'] <= 1)).all()
+
+
+def test_ranks_points_as_the_simulations():
+    trees = _trees(Fmz=[50., 100., 150.])
+    predicted = mean_field(mean_field_params(trees))['spindle_length']
+    simulated = []
+    for tree in trees:
+        lengths = []
+        for seed in range(10):
+            meta = Metaphase(paramtree=tree.copy(), seed=seed, verbose=False)
+            meta.simul()
+            time_point = int(meta.KD.params.t_A / meta.KD.params.dt)
+            lengths.append(meta.KD.spbR.traj[time_point] -
+                           meta.KD.spbL.traj[time_point])
+        simulated.append(np.mean(lengths))
+    assert (np.argsort(predicted) == np.argsort(simulated)).all()
@@ -0,0 +1,34 @@
+from __future__ import division
+
+import pytest
+
+from kt_simul.core.parameters import PARAMFILE
+from kt_simul.io.xml_handler import ParamTree
+
+
+def test_update_matches_a_parsed_tree():
+    tree = ParamTree(PARAMFILE)
+    tree.update(dt=5., Mk=6, kappa_c=2.)
+    parsed = ParamTree(root=tree.root)
+    assert parsed.absolute_dic == tree.absolute_dic
+    assert parsed.relative_dic == pytest.approx(tree.relative_dic)
+
+
+def test_update_with_unknown_parameter():
+    tree = ParamTree(PARAMFILE)
+    absolute = dict(tree.absolute_dic)
+    relative = dict(tree.relative_dic)
+    with pytest.raises(KeyError):
+        tree.update(Mk=6, not_a_parameter=1)
+    assert tree.absolute_dic == absolute
+    assert tree.relative_dic == relative
+
+
+def test_copies_are_independent():
+    tree = ParamTree(PARAMFILE)
+    copy = tree.copy()
+    copy.update(Fk=2 * tree.absolute_dic['Fk'])
+    assert copy.relative_dic != tree.relative_dic
+    assert tree.relative_dic == ParamTree(PARAMFILE).relative_dic
+    assert (copy.root.find(".//param[@name='Fk']").get('value') !=
+            tree.root.find(".//param[@name='Fk']").get('value'))
@@ -0,0 +1,24 @@
+from __future__ import division
+
+import pytest
+
+from kt_simul.core.simul_spindle import Metaphase
+
+PHASES = ['plug_unplug', 'calc_A', 'calc_C', 'solve', 'position_update']
+
+
+def _profile(**kwargs):
+    meta = Metaphase(seed=3, verbose=False, profile=True, **kwargs)
+    meta.simul()
+    return meta.profiler.report()
+
+
+@pytest.mark.parametrize('attachment', ['exact', 'tau_leap'])
+def test_nogil_phases_match_object_code(attachment):
+    flat = _profile(nogil=True, attachment=attachment)
+    objects = _profile(nogil=False, attachment=attachment)
+    for phase in PHASES:
+        assert flat['timers'][phase]['count'] == \
+            objects['timers'][phase]['count']
+    assert flat['counters'] == objects['counters']
+    assert flat['counters']['attach_events'] > 0
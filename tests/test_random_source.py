@@ -0,0 +1,66 @@
+from __future__ import division
+
+import numpy as np
+import pytest
+
+from kt_simul.core.random_source import RandomSource
+from kt_simul.core.simul_spindle import Metaphase
+
+
+def _draws(generator, uniform):
+    """
+    Interleaved draws crossing the boundaries of a buffer of 5 numbers
+    """
+    return [uniform(3), generator.normal(size=2), uniform(7),
+            generator.choice(10, size=3), uniform(1), generator.normal(),
+            generator.choice(4, p=[0.1, 0.2, 0.3, 0.4]), uniform(11)]
+
+
+def test_legacy_reproduces_random_state():
+    source = RandomSource(seed=7, kind='legacy', buffer_size=5)
+    reference = np.random.RandomState(7)
+    draws = _draws(source, source.random)
+    expected = _draws(reference, reference.random_sample)
+    for drawn, value in zip(draws, expected):
+        assert np.array_equal(drawn, value)
+
+
+@pytest.mark.parametrize('kind, bit_generator', [('pcg64', np.random.PCG64),
+                                                 ('philox', np.random.Philox)])
+def test_generator_kinds(kind, bit_generator):
+    source = RandomSource(seed=7, kind=kind, buffer_size=5)
+    reference = np.random.Generator(bit_generator(7))
+    draws = _draws(source, source.random)
+    expected = _draws(reference, reference.random)
+    for drawn, value in zip(draws, expected):
+        assert np.array_equal(drawn, value)
+
+
+@pytest.mark.parametrize('kind', ['pcg64', 'legacy'])
+def test_state_round_trip(kind):
+    source = RandomSource(seed=7, kind=kind, buffer_size=5)
+    source.random(8)
+    state = source.state
+    first = source.random(12)
+    source.state = state
+    assert np.array_equal(source.random(12), first)
+
+    # The generator continues after the last consumed number
+    source.state = state
+    source.random(2)
+    source.sync()
+    assert source.generator.random() == first[2]
+
+
+@pytest.mark.parametrize('kwargs', [{}, {'rng': 'legacy'},
+                                    {'attachment': 'tau_leap'},
+                                    {'integrator': 'implicit'}])
+def test_nogil_matches_object_code(kwargs):
+    flat = Metaphase(seed=3, verbose=False, nogil=True, **kwargs)
+    flat.simul()
+    objects = Metaphase(seed=3, verbose=False, nogil=False, **kwargs)
+    objects.simul()
+    for a, b in zip(flat.KD.organites(), objects.KD.organites()):
+        assert np.array_equal(a.traj, b.traj)
+    for a, b in zip(flat.KD.all_plugsites, objects.KD.all_plugsites):
+        assert np.array_equal(a.state_hist, b.state_hist)
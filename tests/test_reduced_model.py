@@ -0,0 +1,49 @@
+from __future__ import division
+
+import numpy as np
+import pytest
+
+from kt_simul.core.simul_spindle import Metaphase
+from kt_simul.core.reduced_dynamics import ReducedModelBreakdown
+from kt_simul.io.xml_handler import ParamTree
+from kt_simul.core import parameters
+
+
+def _metaphase(Mk, seed, model):
+    paramtree = ParamTree(parameters.PARAMFILE)
+    paramtree.update(Mk=Mk)
+    return Metaphase(paramtree=paramtree, seed=seed, model=model)
+
+
+def _lengths(meta):
+    return meta.KD.spbR.traj - meta.KD.spbL.traj
+
+
+@pytest.mark.parametrize('seed', range(3))
+def test_collapsed_spindle_stays_in_place(seed):
+    # With many sites, the spindle of the full model collapses during the
+    # metaphase, then elongates in anaphase
+    lengths = {}
+    for model in ('full', 'reduced'):
+        meta = _metaphase(30, seed, model)
+        meta.simul()
+        lengths[model] = _lengths(meta)
+    metaphase = meta.timelapse < meta.KD.params.t_A
+    for model in ('full', 'reduced'):
+        assert (lengths[model][metaphase][10:] == 0).mean() > 0.9
+    assert abs(lengths['reduced'][-1] / lengths['full'][-1] - 1) < 0.1
+
+
+def test_breakdown_is_refused():
+    meta = _metaphase(100, 0, 'reduced')
+    with pytest.raises(ReducedModelBreakdown):
+        meta.simul()
+
+
+def test_validation_fails_on_breakdown():
+    from kt_simul.benchmarks.reduced_model import validate_reduced
+    paramtree = ParamTree(parameters.PARAMFILE)
+    paramtree.update(Mk=100)
+    records, speedup = validate_reduced(paramtree=paramtree, n_simu=2,
+                                        integrator='euler')
+    assert not any(r['agrees'] for r in records)
@@ -0,0 +1,38 @@
+from __future__ import division
+
+from kt_simul.core.parameters import (PARAMFILE, ReducedParamsCache,
+                                      get_measuretree, reduce_params)
+from kt_simul.io.xml_handler import ParamTree
+
+
+def test_memoized_reduction():
+    paramtree = ParamTree(PARAMFILE)
+    measuretree = get_measuretree()
+    # The shipped measures lack the cohesin friction, without which nothing
+    # is reduced
+    measuretree.absolute_dic['muco'] = paramtree.absolute_dic['muco']
+    original = dict(paramtree.absolute_dic)
+    cache = ReducedParamsCache(max_size=2)
+
+    reduced = cache.get(paramtree, measuretree)
+    assert paramtree.absolute_dic == original
+    expected = paramtree.copy()
+    reduce_params(expected, measuretree)
+    assert reduced.absolute_dic == expected.absolute_dic
+    assert reduced.relative_dic == expected.relative_dic
+    assert reduced.absolute_dic != original
+
+    # Cached, and the returned trees are independent
+    reduced.update(Mk=10)
+    again = cache.get(paramtree, measuretree)
+    assert len(cache) == 1
+    assert again.absolute_dic == expected.absolute_dic
+
+    # A changed parameter is a new entry, the oldest is dropped
+    for Mk in (5, 6):
+        paramtree.update(Mk=Mk)
+        cache.get(paramtree, measuretree)
+    assert len(cache) == 2
+    paramtree.update(Mk=original['Mk'])
+    cache.warm(paramtree, measuretree)
+    assert len(cache) == 2
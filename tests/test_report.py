@@ -0,0 +1,18 @@
+from __future__ import division
+
+from kt_simul.core.simul_spindle import Metaphase
+
+
+def _current_time(text):
+    for line in text.splitlines():
+        if "Current time" in line:
+            return int(line.split(':')[-1])
+
+
+def test_current_time_of_decimated_records():
+    meta = Metaphase(seed=3, verbose=False, record_every=5)
+    meta.simul()
+    dt = meta.KD.params.dt
+    assert _current_time(meta.get_report(10)) == int(50 * dt)
+    assert _current_time(meta.get_report(10)) == \
+        int(meta.report_engine.records([10])[0]['time'])
@@ -0,0 +1,31 @@
+from __future__ import division
+
+import numpy as np
+
+from kt_simul.core.simul_spindle import Metaphase
+
+
+def _assert_same_records(meta, reference):
+    for a, b in zip(meta.KD.organites(), reference.KD.organites()):
+        assert np.array_equal(a.traj, b.traj)
+    for a, b in zip(meta.KD.all_plugsites, reference.KD.all_plugsites):
+        assert np.array_equal(a.state_hist, b.state_hist)
+    assert meta.delay == reference.delay
+
+
+def test_forks():
+    meta = Metaphase(seed=3, verbose=False)
+    meta.simul(until=30)
+    snapshot = meta.snapshot()
+    unperturbed, ablated = snapshot.run_forks(
+        [{}, {'ablat': 50, 'ablat_pos': 0.2}], n_workers=2)
+
+    reference = Metaphase(seed=3, verbose=False)
+    reference.simul()
+    _assert_same_records(unperturbed.metaphase(), reference)
+
+    reference = Metaphase(seed=3, verbose=False)
+    reference.simul(ablat=50, ablat_pos=0.2)
+    _assert_same_records(ablated.metaphase(), reference)
+    assert not np.array_equal(ablated.metaphase().KD.spbR.traj,
+                              unperturbed.metaphase().KD.spbR.traj)
@@ -0,0 +1,21 @@
+from __future__ import division
+
+import numpy as np
+
+from kt_simul.core.simul_spindle import Metaphase
+from kt_simul.gui.stream import SimulationStream
+
+
+def test_stream_runs_without_the_gil():
+    meta = Metaphase(seed=3, verbose=False, profile=True)
+    stream = SimulationStream(meta, max_rate=1e6).start()
+    stream.join()
+    snapshots = stream.buffer.drain()
+    assert snapshots[-1]['time_point'] == meta.num_steps - 1
+    # The steps ran in nogil chunks, not one by one on the object code
+    assert 'run' in meta.profiler.report()['timers']
+
+    reference = Metaphase(seed=3, verbose=False)
+    reference.simul()
+    assert np.array_equal(meta.KD.spbR.traj, reference.KD.spbR.traj)
+    assert np.allclose(snapshots[-1]['spbs'][1], reference.KD.spbR.traj[-1])
@@ -0,0 +1,59 @@
+from __future__ import division
+
+import numpy as np
+import pytest
+
+from kt_simul.core.simul_spindle import Metaphase
+
+N_SEEDS = 100
+
+
+def _run(seed, leap_tolerance=None, **kwargs):
+    meta = Metaphase(seed=seed, verbose=False, profile=True, **kwargs)
+    if leap_tolerance is not None:
+        meta.KD.leap_tolerance = leap_tolerance
+    meta.simul()
+    return meta
+
+
+def _statistics(leap_tolerance=None, **kwargs):
+    """
+    Attached fraction, detachment and attachment probabilities per step of
+    each seed
+    """
+    statistics = []
+    for seed in range(N_SEEDS):
+        meta = _run(seed, leap_tolerance, **kwargs)
+        counters = meta.profiler.report()['counters']
+        hist = np.array([p.state_hist for p in meta.KD.all_plugsites])
+        attached = (hist[:, :-1] != 0).sum()
+        detached = (hist[:, :-1] == 0).sum()
+        statistics.append([(hist != 0).mean(),
+                           counters['detach_events'] / max(attached, 1),
+                           counters['attach_events'] / max(detached, 1)])
+    return np.array(statistics)
+
+
+@pytest.fixture(scope='module')
+def exact():
+    return _statistics()
+
+
+@pytest.mark.parametrize('leap_tolerance', [None, 0])
+def test_tau_leap_matches_exact(exact, leap_tolerance):
+    leap = _statistics(leap_tolerance, attachment='tau_leap')
+    sem = np.hypot(exact.std(axis=0), leap.std(axis=0)) / np.sqrt(N_SEEDS)
+    assert (np.abs(leap.mean(axis=0) - exact.mean(axis=0)) < 4 * sem).all()
+
+
+def test_zero_tolerance_takes_the_exact_fallback():
+    leaps = _run(3, attachment='tau_leap')
+    flat = _run(3, 0, attachment='tau_leap')
+    objects = _run(3, 0, attachment='tau_leap', nogil=False)
+    # The detachments are drawn site by site instead of in bulk...
+    assert not np.array_equal(flat.KD.spbR.traj, leaps.KD.spbR.traj)
+    # ...in the same way by the nogil and the object code
+    for a, b in zip(flat.KD.organites(), objects.KD.organites()):
+        assert np.array_equal(a.traj, b.traj)
+    for a, b in zip(flat.KD.all_plugsites, objects.KD.all_plugsites):
+        assert np.array_equal(a.state_hist, b.state_hist)